@@ -0,0 +1,160 @@
+"""
+Python port of the ABDKMath64x64 functions used by governance_rewarding.sol
+(contracts/ABDK/ABDKMath64x64.sol).
+Numbers are signed 64.64-bit fixed point values held in python ints as the raw
+int128 numerator, results are bit-exact with the solidity library and failed
+`require`s raise ArithmeticError.
+"""
+
+MIN_64x64 = -0x80000000000000000000000000000000
+MAX_64x64 = 0x7FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF
+
+_UINT256_MASK = (1 << 256) - 1
+_LN_2 = 0xB17217F7D1CF79ABC9E3B39803F2F6AF  # ln(2) as 0.128 fixed point
+
+# memo table for log_2, filled by the batch functions
+_LOG_2_TABLE = {}
+LOG_2_TABLE_MAX_SIZE = 1 << 20
+
+
+def _require(condition):
+    if not condition:
+        raise ArithmeticError("ABDKMath64x64: require failed")
+
+
+def _int128(x):  # solidity int128(...) truncation of a wider value
+    return ((x + (1 << 127)) & ((1 << 128) - 1)) - (1 << 127)
+
+
+def _div_toward_zero(x, y):  # solidity signed division
+    q = abs(x) // abs(y)
+    return q if (x < 0) == (y < 0) else -q
+
+
+# conversions
+def from_int(x):
+    _require(-0x8000000000000000 <= x <= 0x7FFFFFFFFFFFFFFF)
+    return x << 64
+
+
+def to_int(x):
+    return x >> 64
+
+
+def from_uint(x):
+    _require(0 <= x <= 0x7FFFFFFFFFFFFFFF)
+    return x << 64
+
+
+def to_uint(x):
+    _require(x >= 0)
+    return x >> 64
+
+
+# arithmetic
+def add(x, y):
+    result = x + y
+    _require(MIN_64x64 <= result <= MAX_64x64)
+    return result
+
+
+def sub(x, y):
+    result = x - y
+    _require(MIN_64x64 <= result <= MAX_64x64)
+    return result
+
+
+def mul(x, y):
+    result = x * y >> 64
+    _require(MIN_64x64 <= result <= MAX_64x64)
+    return result
+
+
+def div(x, y):
+    _require(y != 0)
+    result = _div_toward_zero(x << 64, y)
+    _require(MIN_64x64 <= result <= MAX_64x64)
+    return result
+
+
+# logarithms
+def log_2(x):
+    _require(x > 0)
+    msb = x.bit_length() - 1  # same as the binary search in solidity
+
+    result = msb - 64 << 64
+    ux = x << 127 - msb
+    bit = 0x8000000000000000
+    while bit > 0:
+        ux *= ux
+        b = ux >> 255
+        ux >>= 127 + b
+        result += bit * b
+        bit >>= 1
+    return _int128(result)
+
+
+def ln(x):
+    _require(x > 0)
+    # uint256(int256(log_2(x))) * ln2 wraps around in solidity for x < 1
+    product = ((log_2(x) & _UINT256_MASK) * _LN_2) & _UINT256_MASK
+    return _int128(product >> 128)
+
+
+# batch functions
+# each distinct input is computed once per batch and memoized in _LOG_2_TABLE,
+# so populations with many repeated balances cost one loop per distinct value
+def log_2_many(xs):
+    table = _LOG_2_TABLE
+    results = []
+    append = results.append
+    for x in xs:
+        result = table.get(x)
+        if result is None:
+            result = log_2(x)
+            if len(table) < LOG_2_TABLE_MAX_SIZE:
+                table[x] = result
+        append(result)
+    return results
+
+
+def ln_many(xs):
+    return [
+        _int128(((value & _UINT256_MASK) * _LN_2 & _UINT256_MASK) >> 128)
+        for value in log_2_many(xs)
+    ]
+
+
+def from_uint_many(xs):
+    return [from_uint(x) for x in xs]
+
+
+# governance_rewarding.sol reward formula
+# int128 count = (1 + log_2(int128(reputation_balance) + 1) / log_2(10) / 100);
+# reward = staking_balance * uint128(count);
+# note that the solidity expression works on the raw int128 values
+# (no fromUInt), so log_2 / log_2 is a plain truncating integer division
+_LOG_2_TEN = log_2(10)
+
+
+def governance_reward_count(reputation_balance):
+    count = 1 + _div_toward_zero(
+        _div_toward_zero(log_2(_int128(reputation_balance) + 1), _LOG_2_TEN), 100
+    )
+    return count & ((1 << 128) - 1)  # uint128(count)
+
+
+def governance_reward(staking_balance, reputation_balance):
+    return staking_balance * governance_reward_count(reputation_balance)
+
+
+def governance_rewards(staking_balances, reputation_balances):
+    logs = log_2_many([_int128(r) + 1 for r in reputation_balances])
+    return [
+        staking_balance
+        * (
+            (1 + _div_toward_zero(_div_toward_zero(value, _LOG_2_TEN), 100))
+            & ((1 << 128) - 1)
+        )
+        for staking_balance, value in zip(staking_balances, logs)
+    ]
@@ -0,0 +1,191 @@
+"""
+Minimal Ethereum ABI support for contract event logs and calls: keccak-256
+(for the event topics and function selectors, not SHA3-256 from hashlib) and
+encoding / decoding of logs, calldata and return values whose fields are
+static types (uint256, address, bool, bytes32).
+"""
+
+from dataclasses import dataclass, field
+
+_WORD = 32
+_MASK_64 = (1 << 64) - 1
+_RATE = 136  # bytes, keccak-256
+
+
+# keccak-f[1600]
+def _round_constants():
+    def bit(t):  # LFSR x^8 + x^6 + x^5 + x^4 + 1
+        r = 1
+        for _ in range(t % 255):
+            r <<= 1
+            if r & 0x100:
+                r ^= 0x171
+        return r & 1
+
+    return [
+        sum(bit(j + 7 * i) << ((1 << j) - 1) for j in range(7)) for i in range(24)
+    ]
+
+
+def _rotation_offsets():
+    offsets = [0] * 25  # lane x + 5 * y
+    x, y = 1, 0
+    for t in range(24):
+        offsets[x + 5 * y] = ((t + 1) * (t + 2) // 2) % 64
+        x, y = y, (2 * x + 3 * y) % 5
+    return offsets
+
+
+_ROUND_CONSTANTS = _round_constants()
+_ROTATIONS = _rotation_offsets()
+# pi step: lane x + 5 * y moves to lane y + 5 * ((2x + 3y) % 5)
+_PI = [y + 5 * ((2 * x + 3 * y) % 5) for y in range(5) for x in range(5)]
+
+
+def _rotl(lane, n):
+    return ((lane << n) | (lane >> (64 - n))) & _MASK_64 if n else lane
+
+
+def _keccak_f(state):
+    for round_constant in _ROUND_CONSTANTS:
+        c = [
+            state[x] ^ state[x + 5] ^ state[x + 10] ^ state[x + 15] ^ state[x + 20]
+            for x in range(5)
+        ]
+        d = [c[(x - 1) % 5] ^ _rotl(c[(x + 1) % 5], 1) for x in range(5)]
+        b = [0] * 25
+        for i in range(25):
+            b[_PI[i]] = _rotl(state[i] ^ d[i % 5], _ROTATIONS[i])
+        state = [
+            b[i] ^ (~b[(i + 1) % 5 + i - i % 5] & b[(i + 2) % 5 + i - i % 5])
+            for i in range(25)
+        ]
+        state[0] ^= round_constant
+    return state
+
+
+def keccak256(data):
+    padded = bytearray(data)
+    padded.append(0x01)  # original keccak padding, SHA3 uses 0x06
+    padded += bytes(-len(padded) % _RATE)
+    padded[-1] |= 0x80
+    state = [0] * 25
+    for start in range(0, len(padded), _RATE):
+        block = padded[start : start + _RATE]
+        for i in range(_RATE // 8):
+            state[i] ^= int.from_bytes(block[8 * i : 8 * i + 8], "little")
+        state = _keccak_f(state)
+    return b"".join(lane.to_bytes(8, "little") for lane in state[:4])
+
+
+# events
+@dataclass
+class EventAbi:
+    name: str
+    inputs: list  # [(name, type, indexed), ...], static types only
+
+    @property
+    def signature(self):
+        return f"{self.name}({','.join(type_ for _, type_, _ in self.inputs)})"
+
+    @property
+    def topic(self):  # topics[0] of the log, "0x..."
+        return "0x" + keccak256(self.signature.encode()).hex()
+
+    def decode(self, topics, data):
+        # {name: value} from the log topics (hex strings) and data (hex string)
+        data = bytes.fromhex(data[2:])
+        indexed = iter(topics[1:])
+        offset = 0
+        values = {}
+        for name, type_, is_indexed in self.inputs:
+            if is_indexed:
+                word = bytes.fromhex(next(indexed)[2:])
+            else:
+                word = data[offset : offset + _WORD]
+                offset += _WORD
+            if len(word) != _WORD:
+                raise ValueError(f"Truncated {self.name} log")
+            values[name] = _decode_word(type_, word)
+        return values
+
+    def encode(self, values):
+        # (topics, data) of a log with the given {name: value}
+        topics = [self.topic]
+        data = bytearray()
+        for name, type_, is_indexed in self.inputs:
+            word = _encode_word(type_, values[name])
+            if is_indexed:
+                topics.append("0x" + word.hex())
+            else:
+                data += word
+        return topics, "0x" + data.hex()
+
+
+# functions
+@dataclass
+class FunctionAbi:
+    name: str
+    inputs: list  # [type, ...], static types only
+    outputs: list = field(default_factory=list)
+
+    @property
+    def signature(self):
+        return f"{self.name}({','.join(self.inputs)})"
+
+    @property
+    def selector(self):  # first 4 bytes of the calldata, "0x..."
+        return "0x" + keccak256(self.signature.encode())[:4].hex()
+
+    def encode_call(self, *args):  # calldata, "0x..."
+        return self.selector + encode_arguments(self.inputs, args)[2:]
+
+    def decode_call(self, data):  # arguments from the calldata
+        if not data.startswith(self.selector):
+            raise ValueError(f"Not a {self.name} call")
+        return decode_arguments(self.inputs, "0x" + data[len(self.selector) :])
+
+    def decode_result(self, data):  # eth_call result, a tuple of the outputs
+        return decode_arguments(self.outputs, data)
+
+
+def encode_arguments(types, values):  # "0x..." (also constructor arguments)
+    if len(types) != len(values):
+        raise ValueError(f"Expected {len(types)} arguments, got {len(values)}")
+    return "0x" + b"".join(map(_encode_word, types, values)).hex()
+
+
+def decode_arguments(types, data):
+    data = bytes.fromhex(data[2:])
+    if len(data) < _WORD * len(types):
+        raise ValueError("Truncated ABI data")
+    return tuple(
+        _decode_word(type_, data[_WORD * i : _WORD * (i + 1)])
+        for i, type_ in enumerate(types)
+    )
+
+
+def _decode_word(type_, word):
+    if type_ == "bytes32":
+        return "0x" + word.hex()
+    value = int.from_bytes(word, "big")
+    if type_ == "address":
+        return f"0x{value:040x}"
+    if type_ == "bool":
+        return bool(value)
+    if type_.startswith("uint"):
+        return value
+    raise ValueError(f"Unsupported ABI type: {type_}")
+
+
+def _encode_word(type_, value):
+    if type_ == "bytes32":
+        word = value if isinstance(value, bytes) else bytes.fromhex(value[2:])
+        if len(word) != _WORD:
+            raise ValueError(f"Not a bytes32 value: {value!r}")
+        return word
+    if type_ == "address":
+        value = int(value, 16)
+    elif type_ != "bool" and not type_.startswith("uint"):
+        raise ValueError(f"Unsupported ABI type: {type_}")
+    return int(value).to_bytes(_WORD, "big")
@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+
+from prototyping.staking import EPOCH_IN_SECONDS
+
+
+class BalanceProvider(ABC):
+    """
+    Source of per-user token balances for GovernanceRewarding
+    (getStake() / BalanceOf calls in solidity).
+    balances_of() is the multicall-style bulk read; providers that can fetch
+    many balances at once should override it.
+    """
+
+    @abstractmethod
+    def balance_of(self, user_addr, token_addr):
+        pass
+
+    def balances_of(self, user_addrs, token_addr):
+        return [self.balance_of(user_addr, token_addr) for user_addr in user_addrs]
+
+
+class InMemoryBalanceProvider(BalanceProvider):
+    """
+    Balances from a `{user_addr: {token_addr: balance}}` ledger,
+    0.0 for unknown users or tokens and never negative.
+    """
+
+    def __init__(self, ledger=None):
+        self.ledger = ledger if ledger is not None else {}
+
+    def balance_of(self, user_addr, token_addr):
+        try:
+            return max(0.0, self.ledger[user_addr][token_addr])
+        except KeyError:
+            return 0.0  # return 0 if address not found
+
+    def balances_of(self, user_addrs, token_addr):
+        ledger = self.ledger
+        empty = {}
+        return [
+            max(0.0, ledger.get(user_addr, empty).get(token_addr, 0.0))
+            for user_addr in user_addrs
+        ]
+
+
+class StakingBalanceProvider(BalanceProvider):
+    """
+    Staked amounts read from a live Staking instance
+    (stakeAmount() in governance_rewarding.sol), the token address is ignored.
+    """
+
+    def __init__(self, staking):
+        self.staking = staking
+
+    def balance_of(self, user_addr, token_addr):
+        return self.staking.get_stake(user_addr).lock_amount
+
+    def balances_of(self, user_addrs, token_addr):
+        # read through get_stake(): indexing the book would copy rows into a
+        # fork's view (or mark them dirty in a mapped book)
+        get_stake = self.staking.get_stake
+        return [get_stake(user_addr).lock_amount for user_addr in user_addrs]
+
+
+class EpochCachedBalanceProvider(BalanceProvider):
+    """
+    Memoizes another provider for the current epoch.
+    `clock` returns the current block timestamp; the cache is dropped when the
+    epoch changes, and invalidate() drops it explicitly (e.g. after a stake
+    or a reputation update). Misses of a bulk read are fetched from the wrapped
+    provider in a single balances_of() call.
+    """
+
+    def __init__(self, provider, clock, epoch_in_seconds=EPOCH_IN_SECONDS):
+        self.provider = provider
+        self.clock = clock
+        self.epoch_in_seconds = epoch_in_seconds
+        self._epoch = None
+        self._cache = {}  # token_addr -> {user_addr: balance}
+
+    def _token_cache(self, token_addr):
+        epoch = self.clock() // self.epoch_in_seconds
+        if epoch != self._epoch:
+            self._epoch = epoch
+            self._cache.clear()
+        token_cache = self._cache.get(token_addr)
+        if token_cache is None:
+            token_cache = self._cache[token_addr] = {}
+        return token_cache
+
+    def balance_of(self, user_addr, token_addr):
+        token_cache = self._token_cache(token_addr)
+        if user_addr not in token_cache:
+            token_cache[user_addr] = self.provider.balance_of(user_addr, token_addr)
+        return token_cache[user_addr]
+
+    def balances_of(self, user_addrs, token_addr):
+        token_cache = self._token_cache(token_addr)
+        missing = [addr for addr in user_addrs if addr not in token_cache]
+        if missing:
+            token_cache.update(
+                zip(missing, self.provider.balances_of(missing, token_addr))
+            )
+        return [token_cache[user_addr] for user_addr in user_addrs]
+
+    def invalidate(self, user_addrs=None, token_addr=None):
+        if user_addrs is None:
+            if token_addr is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(token_addr, None)
+            return
+        token_caches = (
+            self._cache.values()
+            if token_addr is None
+            else [self._cache.get(token_addr, {})]
+        )
+        for token_cache in token_caches:
+            for user_addr in user_addrs:
+                token_cache.pop(user_addr, None)
@@ -0,0 +1,425 @@
+"""
+Scaling benchmarks for the staking and governance hot paths.
+
+Each benchmark prepares a population of `size` users and times `size` calls
+of one scalar function, or one batch call of `size` rows (ops/sec), then
+repeats the same run under tracemalloc for the peak memory and the net
+allocated blocks per call. Results are saved as JSON and compared against a
+stored baseline:
+
+    python -m prototyping.benchmarks --sizes 1000 100000 --output bench.json
+    python -m prototyping.benchmarks --baseline bench.json
+
+The second command exits with status 1 when a benchmark is more than
+`--tolerance` (default 20%) slower or heavier than in the baseline.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import InMemoryBalanceProvider
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import EPOCH_IN_SECONDS, STATUS_OK, BlockTimestamp, Staking
+from prototyping.stress import bank_run
+
+# Thursday, 2 May 2024 17:13:20 UTC (same as the tests)
+INITIAL_TIME = 1714670000
+DEFAULT_SIZES = [10**3, 10**4, 10**5]  # up to 10**7 from the command line
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_REPEAT = 3  # timing runs per benchmark, the fastest one is kept
+
+# absolute slack below which a memory increase is noise, not a regression
+_ABSOLUTE_SLACK = {"peak_memory": 64 * 1024, "allocations_per_op": 0.5}
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    size: int
+    seconds: float = field(default=0.0)
+    ops_per_sec: float = field(default=0.0)
+    # None when measured without the tracemalloc run
+    peak_memory: int = field(default=None)  # bytes allocated at peak during the run
+    allocations_per_op: float = field(default=None)  # net allocated blocks per call
+
+
+@dataclass
+class Regression:
+    name: str
+    size: int
+    metric: str
+    baseline: float
+    value: float
+
+    def message(self):
+        return (
+            f"{self.name} @ {self.size}: {self.metric} "
+            f"{self.baseline:.6g} -> {self.value:.6g}"
+        )
+
+
+# benchmarks
+# a benchmark is setup(size) -> (run, check): run() makes `size` calls and is
+# what gets measured, check() tells whether every call took the expected path
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _addresses(size):
+    return [f"0x{i:040x}" for i in range(size)]
+
+
+def _staking(addresses=None):
+    staking = Staking(
+        utility_token_addr="0x1111",
+        block_timestamp=BlockTimestamp(INITIAL_TIME),
+        event_sink=events.NullSink(),
+    )
+    if addresses is not None:
+        staking.stake_many(
+            addresses,
+            [1000 + i % 1000 for i in range(len(addresses))],
+            [EPOCH_IN_SECONDS * 4] * len(addresses),
+        )
+    return staking
+
+
+def _governance(addresses):
+    ledger = {
+        address: {"0x222": 100.0 + i % 100, "0x333": float(i % 1000)}
+        for i, address in enumerate(addresses)
+    }
+    governance_module.BLOCK_TIMESTAMP = INITIAL_TIME
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        staking_balances=InMemoryBalanceProvider(ledger),
+        reputation_balances=InMemoryBalanceProvider(ledger),
+    )
+    governance.distribute_epoch(addresses)  # registers everyone
+    return governance
+
+
+@benchmark("stake_new")
+def _stake_new(size):
+    addresses = _addresses(size)
+    staking = _staking()
+
+    def run():
+        stake = staking.stake
+        for address in addresses:
+            stake(address, 1000, EPOCH_IN_SECONDS * 4)
+
+    return run, lambda: len(staking.stakes) == size
+
+
+@benchmark("stake_top_up")
+def _stake_top_up(size):
+    addresses = _addresses(size)
+    staking = _staking(addresses)
+    staking.block_timestamp.set_timestamp(INITIAL_TIME + EPOCH_IN_SECONDS)
+
+    def run():
+        stake = staking.stake
+        for address in addresses:
+            stake(address, 500, EPOCH_IN_SECONDS)
+
+    return run, lambda: all(
+        staking.stakes[address].lock_amount >= 1500 for address in addresses
+    )
+
+
+@benchmark("unstake")
+def _unstake(size):
+    addresses = _addresses(size)
+    staking = _staking(addresses)
+    staking.block_timestamp.set_timestamp(INITIAL_TIME + EPOCH_IN_SECONDS * 6)
+
+    def run():
+        unstake = staking.unstake
+        for address in addresses:
+            unstake(address)
+
+    return run, lambda: len(staking.stakes) == 0
+
+
+@benchmark("unstake_emergency")
+def _unstake_emergency(size):
+    addresses = _addresses(size)
+    staking = _staking(addresses)
+    staking.set_emergency_pause(True)
+    staking.set_emergency_withdraw(True)
+
+    def run():
+        unstake = staking.unstake
+        for address in addresses:
+            unstake(address)
+
+    return run, lambda: len(staking.stakes) == 0
+
+
+@benchmark("project_withdrawal")
+def _project_withdrawal(size):  # a dashboard reading every stake twice
+    addresses = _addresses((size + 1) // 2)
+    staking = _staking(addresses)
+    staking.block_timestamp.set_timestamp(INITIAL_TIME + EPOCH_IN_SECONDS * 6)
+    reads = (addresses + addresses)[:size]
+    results = []
+
+    def run():
+        results.extend(map(staking.project_withdrawal, reads))
+
+    return run, lambda: len(results) == size and all(
+        status == STATUS_OK for status, _ in results
+    )
+
+
+# batch counterparts of the scalar benchmarks above, same populations
+@benchmark("stake_many_new")
+def _stake_many_new(size):
+    addresses = _addresses(size)
+    staking = _staking()
+
+    def run():
+        staking.stake_many(addresses, [1000] * size, [EPOCH_IN_SECONDS * 4] * size)
+
+    return run, lambda: len(staking.stakes) == size
+
+
+@benchmark("stake_many_top_up")
+def _stake_many_top_up(size):
+    addresses = _addresses(size)
+    staking = _staking(addresses)
+    staking.block_timestamp.set_timestamp(INITIAL_TIME + EPOCH_IN_SECONDS)
+
+    def run():
+        staking.stake_many(addresses, [500] * size, [EPOCH_IN_SECONDS] * size)
+
+    return run, lambda: all(
+        staking.stakes[address].lock_amount >= 1500 for address in addresses
+    )
+
+
+@benchmark("unstake_many")
+def _unstake_many(size):
+    addresses = _addresses(size)
+    staking = _staking(addresses)
+    staking.block_timestamp.set_timestamp(INITIAL_TIME + EPOCH_IN_SECONDS * 6)
+
+    def run():
+        staking.unstake_many(addresses)
+
+    return run, lambda: len(staking.stakes) == 0
+
+
+@benchmark("bank_run_emergency")
+def _bank_run_emergency(size):  # every staker exits through unstake_many
+    staking = _staking(_addresses(size))
+    results = []
+
+    def run():
+        results.append(bank_run(staking, emergency=True))
+
+    return run, lambda: results[0].exits_paid == size and len(staking.stakes) == 0
+
+
+@benchmark("next_epoch_start_time")
+def _next_epoch_start_time(size):
+    staking = _staking()
+    times = [INITIAL_TIME + i * 997 for i in range(size)]
+    results = []
+
+    def run():
+        get_next_epoch_start_time = staking._get_next_epoch_start_time
+        results.extend(map(get_next_epoch_start_time, times))
+
+    return run, lambda: len(results) == size and all(results)
+
+
+@benchmark("add_governance_reward")
+def _add_governance_reward(size):
+    addresses = _addresses(size)
+    governance = _governance(addresses)
+
+    def run():
+        governance_module.BLOCK_TIMESTAMP = INITIAL_TIME + EPOCH_IN_SECONDS
+        add_governance_reward = governance.add_governance_reward
+        for address in addresses:
+            add_governance_reward(address)
+
+    return run, lambda: all(
+        governer.reward > 0 for governer in governance.governers.values()
+    )
+
+
+@benchmark("claim_governance_reward")
+def _claim_governance_reward(size):
+    addresses = _addresses(size)
+    governance = _governance(addresses)
+    governance_module.BLOCK_TIMESTAMP = INITIAL_TIME + EPOCH_IN_SECONDS
+    governance.distribute_epoch(addresses)
+
+    def run():
+        governance_module.BLOCK_TIMESTAMP = INITIAL_TIME + EPOCH_IN_SECONDS
+        claim_governance_reward = governance.claim_governance_reward
+        for address in addresses:
+            claim_governance_reward(address)
+
+    return run, lambda: all(
+        governer.reward == 0 and governer.last_claim_time > 0
+        for governer in governance.governers.values()
+    )
+
+
+# measuring
+def measure(name, size, memory=True, repeat=DEFAULT_REPEAT):
+    setup = BENCHMARKS[name]
+    result = BenchmarkResult(name=name, size=size)
+
+    timings = []
+    for _ in range(repeat):
+        run, check = setup(size)
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+        if not check():
+            raise RuntimeError(f"Benchmark {name} did not take the expected path")
+    result.seconds = min(timings)
+    result.ops_per_sec = size / result.seconds if result.seconds > 0 else 0.0
+
+    if memory:  # separate run, tracemalloc slows the calls down
+        run, check = setup(size)
+        gc.collect()
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        run()
+        blocks = sys.getallocatedblocks() - blocks
+        _, result.peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result.allocations_per_op = blocks / size
+    return result
+
+
+def run_suite(
+    sizes=DEFAULT_SIZES, names=None, memory=True, repeat=DEFAULT_REPEAT, progress=None
+):
+    results = []
+    for name in names if names is not None else list(BENCHMARKS):
+        for size in sizes:
+            result = measure(name, size, memory, repeat)
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return results
+
+
+# results and baselines
+def save_results(results, path):
+    document = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": int(time.time()),
+        "results": [asdict(result) for result in results],
+    }
+    with open(path, "w") as file:
+        json.dump(document, file, indent=2)
+
+
+def load_results(path):
+    with open(path) as file:
+        document = json.load(file)
+    return [BenchmarkResult(**result) for result in document["results"]]
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # benchmarks/sizes missing from the baseline are not compared, neither are
+    # memory metrics that were not measured on both sides
+    expected = {(result.name, result.size): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = expected.get((result.name, result.size))
+        if base is None:
+            continue
+        if result.ops_per_sec < base.ops_per_sec * (1 - tolerance):
+            regressions.append(
+                Regression(
+                    result.name,
+                    result.size,
+                    "ops_per_sec",
+                    base.ops_per_sec,
+                    result.ops_per_sec,
+                )
+            )
+        for metric, slack in _ABSOLUTE_SLACK.items():
+            value, limit = getattr(result, metric), getattr(base, metric)
+            if value is None or limit is None:
+                continue
+            # net allocations can be negative (e.g. unstake frees rows)
+            if value - limit > max(abs(limit) * tolerance, slack):
+                regressions.append(
+                    Regression(result.name, result.size, metric, limit, value)
+                )
+    return regressions
+
+
+def _format(result):
+    line = f"{result.name:<24} {result.size:>10} {result.ops_per_sec:>14,.0f} ops/s"
+    if result.peak_memory is not None:
+        line += (
+            f" {result.peak_memory / 2**20:>10.1f} MiB"
+            f" {result.allocations_per_op:>8.2f} blocks/op"
+        )
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS))
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc run"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_suite(
+        args.sizes,
+        args.benchmarks,
+        memory=not args.no_memory,
+        repeat=args.repeat,
+        progress=lambda result: print(_format(result), flush=True),
+    )
+    if args.output:
+        save_results(results, args.output)
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression.message()}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
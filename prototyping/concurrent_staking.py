@@ -0,0 +1,203 @@
+"""
+Staking for threaded servers (no solidity counterpart, on chain every
+transaction runs alone).
+
+Calls for one address are serialized by one of `lock_stripes` locks picked
+by the address hash, so calls for addresses on other stripes do not wait
+for each other. The running aggregates and the maturity index are shared by
+every address; they are updated under a short global lock.
+
+Each stripe and the aggregates have a version counter that is odd while a
+write is in progress. get_stake() and stats() take no lock: they copy what
+they read and retry when the version changed in between (a seqlock), so
+readers never block writers and never see a half-applied top-up;
+project_withdrawal() reads the same way.
+"""
+
+import copy
+import threading
+import time
+
+from prototyping.maturity_index import MaturityIndex
+from prototyping.staking import EPOCH_IN_SECONDS, BlockTimestamp, Stake, Staking
+
+DEFAULT_LOCK_STRIPES = 64
+_CONCURRENCY_ATTRIBUTES = (
+    "_stripes",
+    "_versions",
+    "_aggregates_lock",
+    "_aggregates_version",
+)
+
+
+class ConcurrentStaking(Staking):
+    """
+    Thread-safe Staking with per-address striped locks and lock-free reads.
+    get_stake() returns a detached copy of the stake instead of the live row.
+    Only the default dict stake book is supported (the columnar book changes
+    shared state on access). fork() returns a plain, single-threaded Staking
+    with a full copy of the stakes taken while every lock is held.
+    """
+
+    def __init__(self, *args, lock_stripes=DEFAULT_LOCK_STRIPES, **kwargs):
+        self._stripes = [threading.Lock() for _ in range(lock_stripes)]
+        self._versions = [0] * lock_stripes  # odd while the stripe is written
+        self._aggregates_lock = threading.Lock()
+        self._aggregates_version = 0  # odd while the aggregates are written
+        super().__init__(*args, **kwargs)
+        if type(self.stakes) is not dict:
+            raise ValueError(
+                f"ConcurrentStaking needs a dict stake book, "
+                f"got {type(self.stakes).__name__}"
+            )
+
+    def _stripe_of(self, address):
+        return hash(address) % len(self._stripes)
+
+    # writers: stripe lock of the address
+    def stake(self, address, lock_amount, lock_duration):
+        stripe = self._stripe_of(address)
+        with self._stripes[stripe]:
+            self._versions[stripe] += 1
+            try:
+                return super().stake(address, lock_amount, lock_duration)
+            finally:
+                self._versions[stripe] += 1
+
+    def unstake(self, address):
+        stripe = self._stripe_of(address)
+        with self._stripes[stripe]:
+            self._versions[stripe] += 1
+            try:
+                return super().unstake(address)
+            finally:
+                self._versions[stripe] += 1
+
+    # batch functions lock every stripe they touch, in stripe order
+    def stake_many(self, addresses, lock_amounts, lock_durations):
+        stripes = self._lock_stripes(addresses)
+        try:
+            return super().stake_many(addresses, lock_amounts, lock_durations)
+        finally:
+            self._unlock_stripes(stripes)
+
+    def unstake_many(self, addresses):
+        stripes = self._lock_stripes(addresses)
+        try:
+            return super().unstake_many(addresses)
+        finally:
+            self._unlock_stripes(stripes)
+
+    def _lock_stripes(self, addresses):
+        stripes = sorted({self._stripe_of(address) for address in addresses})
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+            self._versions[stripe] += 1
+        return stripes
+
+    def _unlock_stripes(self, stripes):
+        for stripe in reversed(stripes):
+            self._versions[stripe] += 1
+            self._stripes[stripe].release()
+
+    # shared derived state: global lock around each update
+    def _on_stake_created(self, address, user_stake):
+        with self._aggregates_lock:
+            self._aggregates_version += 1
+            super()._on_stake_created(address, user_stake)
+            self._aggregates_version += 1
+
+    def _on_stake_topped_up(self, address, user_stake, lock_amount, reward):
+        with self._aggregates_lock:
+            self._aggregates_version += 1
+            super()._on_stake_topped_up(address, user_stake, lock_amount, reward)
+            self._aggregates_version += 1
+
+    def _on_stake_removed(self, address, user_stake):
+        with self._aggregates_lock:
+            self._aggregates_version += 1
+            super()._on_stake_removed(address, user_stake)
+            self._aggregates_version += 1
+
+    def _on_stakes_staked(self, changes):
+        with self._aggregates_lock:
+            self._aggregates_version += 1
+            super()._on_stakes_staked(changes)
+            self._aggregates_version += 1
+
+    def _on_stakes_removed(self, changes):
+        with self._aggregates_lock:
+            self._aggregates_version += 1
+            super()._on_stakes_removed(changes)
+            self._aggregates_version += 1
+
+    def maturing_between(self, t0, t1):
+        with self._aggregates_lock:
+            return super().maturing_between(t0, t1)
+
+    def liability_schedule(self):
+        with self._aggregates_lock:
+            return super().liability_schedule()
+
+    # lock-free readers
+    def get_stake(self, address):
+        stripe = self._stripe_of(address)
+        versions = self._versions
+        while True:
+            version = versions[stripe]
+            if not version & 1:
+                user_stake = self.stakes.get(address)
+                snapshot = Stake() if user_stake is None else copy.copy(user_stake)
+                if versions[stripe] == version:
+                    return snapshot
+            time.sleep(0)  # let the writer finish
+
+    def _withdrawal_projection(self, address):
+        stripe = self._stripe_of(address)
+        versions = self._versions
+        while True:
+            version = versions[stripe]
+            if not version & 1:
+                projection = super()._withdrawal_projection(address)
+                if versions[stripe] == version:
+                    return projection
+            time.sleep(0)
+
+    def stats(self):
+        if self.debug:
+            self.check_stats()  # full scan, only meaningful while no one writes
+        while True:
+            version = self._aggregates_version
+            if not version & 1:
+                totals = self._running_totals()
+                if self._aggregates_version == version:
+                    return self._make_stats(*totals)
+            time.sleep(0)
+
+    def fork(self):
+        # a copy-on-write book would share rows with a parent that other
+        # threads keep writing, so the stakes are copied up front instead
+        stripes = self._lock_stripes_all()
+        try:
+            with self._aggregates_lock:
+                totals = self._running_totals()
+                forked = copy.copy(self)
+                stakes = {a: copy.copy(s) for a, s in self.stakes.items()}
+        finally:
+            self._unlock_stripes(stripes)
+        forked.__class__ = Staking
+        for name in _CONCURRENCY_ATTRIBUTES:
+            delattr(forked, name)
+        forked.stakes = stakes
+        forked._forks = []
+        forked.block_timestamp = BlockTimestamp(self.block_timestamp.timestamp)
+        forked.maturity_index = MaturityIndex(EPOCH_IN_SECONDS)
+        forked.rebuild_derived_state(totals=totals)
+        return forked
+
+    def _lock_stripes_all(self):
+        stripes = range(len(self._stripes))
+        for stripe in stripes:
+            self._stripes[stripe].acquire()
+            self._versions[stripe] += 1
+        return stripes
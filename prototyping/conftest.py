@@ -1,5 +1,6 @@
 import pytest
 from prototyping.staking import Staking, BlockTimestamp, EPOCH_IN_SECONDS, Stake
+from prototyping.stake_book import ColumnarStakeBook
 
 # Thursday, 2 May 2024 17:13:20 UTC
 INITIAL_TIME = 1714670000
@@ -14,12 +15,13 @@ def block_timestamp():
     return block_timestamp
 
 
-@pytest.fixture
-def staking(block_timestamp):
+@pytest.fixture(params=["dict", "columnar"])
+def staking(request, block_timestamp):
     staking = Staking(
         utility_token_addr="0x1111",
         reward_rate_per_epoch=10,
         block_timestamp=block_timestamp,
+        stakes={} if request.param == "dict" else ColumnarStakeBook(),
     )
     return staking
 
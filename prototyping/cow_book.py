@@ -0,0 +1,130 @@
+import copy
+from collections.abc import MutableMapping
+
+
+class CopyOnWriteBook(MutableMapping):
+    """
+    Copy-on-write view of a stake/governer book (see Staking.fork()).
+    Rows are copied from the parent book the first time they are accessed
+    through `book[address]`, so in-place updates like
+    `book[address].reward += x` never reach the parent; new and removed rows
+    only live in the view. The owner of the parent book calls keep_row()
+    before it writes, adds or removes a row, so the view stays a snapshot
+    of the parent as it was when the view was created.
+    peek(), values() and items() yield the parent's records for untouched
+    rows, they must not be modified.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self._rows = {}  # address -> record (copied, changed or new rows)
+        self._deleted = set()  # parent addresses hidden from this view
+        self._len = len(parent)
+
+    def _parent_record(self, address):
+        if isinstance(self.parent, CopyOnWriteBook):
+            return self.parent._peek(address)  # no copy in the parent view
+        return self.parent[address]
+
+    def _peek(self, address):
+        record = self._rows.get(address)
+        if record is not None:
+            return record
+        if address in self._deleted:
+            raise KeyError(address)
+        return self._parent_record(address)
+
+    def peek(self, address, default=None):  # read without copying the row
+        try:
+            return self._peek(address)
+        except KeyError:
+            return default
+
+    def keep_row(self, address):
+        # the parent is about to change `address`: keep the row as it is now
+        if address in self._rows or address in self._deleted:
+            return
+        if address in self.parent:
+            self._rows[address] = copy.copy(self._parent_record(address))
+        else:
+            self._deleted.add(address)  # added to the parent after the fork
+
+    # mapping protocol
+    def __getitem__(self, address):
+        record = self._rows.get(address)
+        if record is not None:
+            return record
+        if address in self._deleted:
+            raise KeyError(address)
+        record = self._rows[address] = copy.copy(self._parent_record(address))
+        return record
+
+    def __setitem__(self, address, record):
+        if address not in self:
+            self._len += 1
+        self._deleted.discard(address)
+        self._rows[address] = record
+
+    def __delitem__(self, address):
+        self.pop(address)
+
+    def pop(self, address, *default):
+        if address not in self:
+            if default:
+                return default[0]
+            raise KeyError(address)
+        record = self._rows.pop(address, None)
+        if address in self.parent:
+            if record is None:
+                record = copy.copy(self._parent_record(address))
+            self._deleted.add(address)
+        self._len -= 1
+        return record
+
+    def __contains__(self, address):
+        if address in self._rows:
+            return True
+        if address in self._deleted:
+            return False
+        return address in self.parent
+
+    def __iter__(self):
+        rows, deleted = self._rows, self._deleted
+        for address in self.parent:
+            if address not in rows and address not in deleted:
+                yield address
+        yield from list(rows)
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        rows, deleted = self._rows, self._deleted
+        for address, record in self.parent.items():
+            if address not in rows and address not in deleted:
+                yield address, record
+        yield from list(rows.items())
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+    # overhead of the view
+    def rows_copied(self):  # copied, changed or new rows held by the view
+        return len(self._rows)
+
+    def rows_deleted(self):
+        return len(self._deleted)
+
+
+def keep_rows(forks, address):
+    # called by the owner of a parent book before it changes `address`: every
+    # live view in `forks` (weak references) keeps its row; returns the
+    # references of the views still alive
+    live = []
+    for ref in forks:
+        book = ref()
+        if book is not None:
+            book.keep_row(address)
+            live.append(ref)
+    return live
@@ -0,0 +1,811 @@
+"""
+Differential replay of an operation trace against the Solidity contracts on a
+local EVM node and against the Staking / GovernanceRewarding models.
+
+The contracts are deployed from Truffle artifacts (`truffle compile`) to a
+local Ganache node, and their settings are aligned with the models. The
+trace (prototyping.workload, prototyping.simulation events) is then replayed
+one block per timestamp. Each event becomes one transaction and is applied
+to the models at the same time. Per-operation gas used is collected from the
+receipts, and a divergence is recorded when the node and the model disagree
+on whether an operation succeeds or on the state of an address it touched.
+
+    ganache --miner.instamine eager &
+    python -m prototyping.differential week.trace --build-dir build/contracts
+
+The transactions of a block are sent as one JSON-RPC batch, with explicit
+nonces and gas, over pooled keep-alive connections. The node mines the
+block at the trace timestamp (evm_mine). Receipts and state are checked in
+worker threads while the next blocks are being sent. Trace addresses are
+impersonated with Ganache's evm_addAccount / personal_unlockAccount and
+funded before their first transaction.
+
+Governance events are replayed only against a deployment with a
+GovernanceRewarding contract (`--governance`). GovernanceRewarding reads
+stakes through stakeAmount() / userStakeStart(), which UtilityStaking does
+not implement, so its rewards revert on a real node until a staking adapter
+contract exists. Without one, governance events are skipped and counted in
+the report.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.abi import FunctionAbi, encode_arguments, keccak256
+from prototyping.balances import InMemoryBalanceProvider, StakingBalanceProvider
+from prototyping.governance import STATUS_GOVERNER_ADDED, GovernanceRewarding
+from prototyping.governance import STATUS_OK as GOVERNANCE_STATUS_OK
+from prototyping.simulation import (
+    EmergencyEvent,
+    GovernanceClaimEvent,
+    GovernanceRewardEvent,
+    RewardRateChangeEvent,
+    StakeEvent,
+    UnstakeEvent,
+)
+from prototyping.staking import STATUS_OK, BlockTimestamp, Staking
+from prototyping.workload import read_trace
+
+DEFAULT_URL = "http://127.0.0.1:8545"  # ganache
+DEFAULT_BUILD_DIR = os.path.join("build", "contracts")  # truffle compile
+DEFAULT_POOL_SIZE = 4  # keep-alive connections
+DEFAULT_MAX_BATCH = 500  # calls per JSON-RPC batch
+DEFAULT_TIMEOUT = 60.0  # seconds
+DEFAULT_PIPELINE_DEPTH = 2  # blocks checked while the next ones are sent
+DEFAULT_MAX_DIVERGENCES = 100  # kept in the report, all are counted
+DEFAULT_REWARD_TOLERANCE = 1e-9  # relative, the models' rewards may be floats
+TRANSACTION_GAS = 1_000_000  # gas limit of every replayed transaction
+DEPLOY_GAS = 6_000_000
+ACCOUNT_BALANCE = 10**24  # wei given to every impersonated account
+MAX_UINT256 = 2**256 - 1
+TOKEN_SUPPLY = 10**9 * 10**18  # MarketMachinaToken.maxSupply, minted to the owner
+REWARD_RESERVE = 10**8 * 10**18  # tokens sent to the staking contract for rewards
+MINTER_ROLE = "0x" + keccak256(b"MINTER_ROLE").hex()
+
+# MarketMachinaToken (utility_token.sol), stake and reward token
+TRANSFER = FunctionAbi("transfer", ["address", "uint256"], ["bool"])
+APPROVE = FunctionAbi("approve", ["address", "uint256"], ["bool"])
+# utility_stacking.sol
+STAKE = FunctionAbi("stake", ["uint256", "uint256"])
+UNSTAKE = FunctionAbi("unstake", [])
+SET_MAX_LOCK_BY_AMOUNT = FunctionAbi("setMaxLockByAmount", ["uint256"])
+SET_REWARD_RATE_PER_EPOCH = FunctionAbi("setRewardRatePerEpoch", ["uint256"])
+TOGGLE_EMERGENCY_STOP = FunctionAbi("toggleEmergencyStop", [])
+TOGGLE_EMERGENCY_WITHDRAW = FunctionAbi("toggleEmergencyWithdraw", [])
+STAKERS = FunctionAbi("stakers", ["address"], ["uint256"] * 4)
+# governance_rewarding.sol, governance_token.sol
+ADD_GOVERNANCE_REWARD = FunctionAbi("add_governance_reward", ["address"])
+CLAIM_GOVERNANCE_REWARD = FunctionAbi("claim_governance_reward", [])
+GOV = FunctionAbi("Gov", ["address"], ["uint256"] * 4)
+GRANT_ROLE = FunctionAbi("grantRole", ["bytes32", "address"])
+_REWARD_FIELDS = {STAKERS.name: 3, GOV.name: 1}  # index of the reward output
+
+
+# transport
+class JsonRpcError(Exception):
+    def __init__(self, method, error):
+        self.method = method
+        self.code = error.get("code")
+        self.data = error.get("data")
+        super().__init__(f"{method}: {error.get('message')}")
+
+
+class JsonRpcClient:
+    """
+    JSON-RPC over at most `pool_size` HTTP keep-alive connections, shared by
+    the threads using the client. batch() sends its calls as JSON-RPC batches
+    of up to `max_batch` calls, one round trip each.
+    """
+
+    def __init__(
+        self,
+        url=DEFAULT_URL,
+        pool_size=DEFAULT_POOL_SIZE,
+        max_batch=DEFAULT_MAX_BATCH,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        parsed = urllib.parse.urlsplit(url)
+        self._connection_class = (
+            http.client.HTTPSConnection
+            if parsed.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self._address = (parsed.hostname, parsed.port)
+        self._path = parsed.path or "/"
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.round_trips = 0
+        self._idle = queue.LifoQueue()  # open connections, most recent first
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+    def call(self, method, *params):
+        return self.batch([(method, list(params))])[0]
+
+    def batch(self, calls, raise_errors=True):
+        # [(method, params)] -> results in call order; failed calls raise, or
+        # give their JsonRpcError in place of the result
+        results = []
+        for start in range(0, len(calls), self.max_batch):
+            chunk = calls[start : start + self.max_batch]
+            results += self._batch(chunk, raise_errors)
+        return results
+
+    def _batch(self, calls, raise_errors):
+        with self._lock:
+            ids = [next(self._ids) for _ in calls]
+        payload = json.dumps(
+            [
+                {"jsonrpc": "2.0", "id": id_, "method": method, "params": params}
+                for id_, (method, params) in zip(ids, calls)
+            ]
+        ).encode()
+        replies = self._post(payload)
+        if isinstance(replies, dict):  # the whole batch was rejected
+            raise JsonRpcError("batch", replies.get("error") or {})
+        replies = {reply.get("id"): reply for reply in replies}
+        results = []
+        for id_, (method, _) in zip(ids, calls):
+            reply = replies.get(id_, {"error": {"message": "no reply"}})
+            if "error" in reply:
+                error = JsonRpcError(method, reply["error"])
+                if raise_errors:
+                    raise error
+                results.append(error)
+            else:
+                results.append(reply.get("result"))
+        return results
+
+    def _post(self, payload):
+        with self._slots:
+            try:
+                connection, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                connection, reused = self._connect(), False
+            try:
+                body = self._round_trip(connection, payload)
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused:
+                    raise
+                # the node closed the idle connection; the request was not read
+                connection = self._connect()
+                body = self._round_trip(connection, payload)
+            self._idle.put(connection)
+        with self._lock:
+            self.round_trips += 1
+        return json.loads(body)
+
+    def _connect(self):
+        host, port = self._address
+        return self._connection_class(host, port, timeout=self.timeout)
+
+    def _round_trip(self, connection, payload):
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        connection.request("POST", self._path, payload, headers)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise JsonRpcError("http", {"message": f"HTTP {response.status}"})
+        return body
+
+
+def send_and_mine(client, transactions, timestamp=None):
+    # sends eth_sendTransaction objects as one batch, mines them into one
+    # block and returns the receipts; raises if a transaction reverted
+    hashes = client.batch([("eth_sendTransaction", [tx]) for tx in transactions])
+    client.call("evm_mine", *([] if timestamp is None else [timestamp]))
+    receipts = client.batch([("eth_getTransactionReceipt", [h]) for h in hashes])
+    for transaction, receipt in zip(transactions, receipts):
+        if receipt is None or int(receipt["status"], 16) != 1:
+            raise RuntimeError(f"Setup transaction failed: {transaction!r}")
+    return receipts
+
+
+# deployment
+@dataclass
+class Deployment:
+    owner: str  # deployer, owner of every contract
+    token: str  # MarketMachinaToken, stake and reward token
+    staking: str  # UtilityStaking
+    governance: str = field(default=None)  # GovernanceRewarding
+
+
+def deploy_contract(client, build_dir, name, owner, types=(), args=()):
+    # contract address of a new deployment of a Truffle artifact
+    with open(os.path.join(build_dir, f"{name}.json")) as file:
+        bytecode = json.load(file)["bytecode"]
+    data = bytecode + encode_arguments(list(types), list(args))[2:]
+    transaction = {"from": owner, "data": data, "gas": hex(DEPLOY_GAS)}
+    (receipt,) = send_and_mine(client, [transaction])
+    return receipt["contractAddress"]
+
+
+def deploy(client, build_dir=DEFAULT_BUILD_DIR, owner=None, governance=False):
+    """
+    Deploys MarketMachinaToken (the whole supply minted to `owner`, the first
+    node account by default), UtilityStaking with it as stake and reward
+    token, and optionally GovernanceToken and GovernanceRewarding with the
+    minter role. There is no reputation token contract yet, so reputation is
+    read from a second GovernanceToken nobody can mint (all balances 0).
+    GovernanceRewarding is wired to UtilityStaking, which lacks the
+    stakeAmount / userStakeStart functions it calls, so every reward of an
+    existing governer reverts; hence governance is off by default.
+    """
+    owner = owner or client.call("eth_accounts")[0]
+    token = deploy_contract(
+        client,
+        build_dir,
+        "MarketMachinaToken",
+        owner,
+        ["address", "uint256", "address", "address", "address"],
+        [owner, TOKEN_SUPPLY, owner, owner, owner],  # owner as every multi-sig
+    )
+    staking = deploy_contract(
+        client, build_dir, "UtilityStaking", owner, ["address"] * 2, [token] * 2
+    )
+    if not governance:
+        return Deployment(owner, token, staking)
+    governance_token = deploy_contract(client, build_dir, "GovernanceToken", owner)
+    reputation_token = deploy_contract(client, build_dir, "GovernanceToken", owner)
+    governance = deploy_contract(
+        client,
+        build_dir,
+        "GovernanceRewarding",
+        owner,
+        ["address"] * 3,
+        [reputation_token, governance_token, staking],
+    )
+    data = GRANT_ROLE.encode_call(MINTER_ROLE, governance)
+    grant = {"from": owner, "to": governance_token, "data": data}
+    send_and_mine(client, [grant])
+    return Deployment(owner, token, staking, governance)
+
+
+# report
+@dataclass
+class GasStats:  # receipts of one operation
+    transactions: int = field(default=0)
+    reverted: int = field(default=0)
+    total_gas: int = field(default=0)  # reverted transactions included
+    max_gas: int = field(default=0)
+
+    @property
+    def mean_gas(self):
+        return self.total_gas / self.transactions if self.transactions else 0.0
+
+
+@dataclass
+class Divergence:
+    time: int
+    operation: str  # e.g. "stake[new]", or the getter for a state divergence
+    address: str
+    kind: str  # "status" or "state"
+    model: object  # accepted (status) or the model's fields (state)
+    chain: object
+
+
+@dataclass
+class DifferentialReport:
+    blocks: int = field(default=0)
+    transactions: int = field(default=0)
+    gas: dict = field(default_factory=dict)  # operation -> GasStats
+    divergences: list = field(default_factory=list)  # the first ones
+    divergence_count: int = field(default=0)
+    round_trips: int = field(default=0)  # JSON-RPC HTTP requests
+    skipped: int = field(default=0)  # governance events, no GovernanceRewarding
+    seconds: float = field(default=0.0)
+
+
+@dataclass
+class _Transaction:
+    operation: str
+    sender: str  # trace address, or None for the owner
+    to: str
+    data: str
+    accepted: bool  # by the model
+    address: str = field(default=None)  # trace address it is about, if any
+    funding: int = field(default=0)  # tokens sent to the sender beforehand
+
+
+def _chain_address(address):
+    return f"0x{int(address, 16):040x}"
+
+
+class DifferentialReplay:
+    """
+    Replays trace events against a Deployment (see deploy()) and the given
+    models. The models must start in the state the contracts are in, e.g.
+    both fresh; the contract settings (max lock amount, reward rate,
+    emergency flags) are set from the models on the first replay.
+    """
+
+    def __init__(
+        self,
+        client,
+        deployment,
+        staking,
+        governance=None,
+        pipeline_depth=DEFAULT_PIPELINE_DEPTH,
+        max_divergences=DEFAULT_MAX_DIVERGENCES,
+        reward_tolerance=DEFAULT_REWARD_TOLERANCE,
+    ):
+        self.client = client
+        self.deployment = deployment
+        self.staking = staking
+        self.governance = governance
+        self.pipeline_depth = pipeline_depth
+        self.max_divergences = max_divergences
+        self.reward_tolerance = reward_tolerance
+        self.report = DifferentialReport()
+        self._owner = deployment.owner.lower()
+        self._nonces = {}  # chain address -> next nonce
+        self._funded = set()  # trace addresses with an unlocked, funded account
+        self._held = {}  # trace address -> tokens it holds on chain, per the model
+        self._configured = False
+
+    def replay(self, trace_events):  # time-ordered events, returns the report
+        started = time.perf_counter()
+        round_trips = self.client.round_trips
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.pipeline_depth) as executor:
+            for block_time, block in itertools.groupby(
+                trace_events, key=lambda event: event.time
+            ):
+                if not self._configured:
+                    self._configure(block_time)
+                transactions, state = self._apply_to_model(block_time, list(block))
+                self._fund(block_time, transactions)
+                hashes = self._send(transactions)
+                # the block number is taken as the block is mined: the state
+                # of a block without transactions is read at it too, not at
+                # "latest", which runs up to pipeline_depth blocks ahead
+                _, block_number = self.client.batch(
+                    [("evm_mine", [block_time]), ("eth_blockNumber", [])]
+                )
+                pending.append(
+                    executor.submit(
+                        self._check_block,
+                        block_time,
+                        block_number,
+                        transactions,
+                        hashes,
+                        state,
+                    )
+                )
+                while len(pending) > self.pipeline_depth:
+                    self._record(*pending.popleft().result())
+            while pending:
+                self._record(*pending.popleft().result())
+        self.report.round_trips += self.client.round_trips - round_trips
+        self.report.seconds += time.perf_counter() - started
+        return self.report
+
+    # node setup
+    def _configure(self, block_time):
+        client, deployment, staking = self.client, self.deployment, self.staking
+        client.call("miner_stop")  # blocks are mined by evm_mine only
+        nonce = client.call("eth_getTransactionCount", deployment.owner, "pending")
+        self._nonces[self._owner] = int(nonce, 16)
+        staking_address = deployment.staking
+        max_lock_amount = staking.max_lock_amount
+        reward_rate = staking.reward_rate_per_epoch
+        calls = [
+            (staking_address, SET_MAX_LOCK_BY_AMOUNT.encode_call(max_lock_amount)),
+            (staking_address, SET_REWARD_RATE_PER_EPOCH.encode_call(reward_rate)),
+            (deployment.token, TRANSFER.encode_call(staking_address, REWARD_RESERVE)),
+        ]
+        if staking.emergency_pause:
+            calls.append((staking_address, TOGGLE_EMERGENCY_STOP.encode_call()))
+        if staking.emergency_withdraw:
+            calls.append((staking_address, TOGGLE_EMERGENCY_WITHDRAW.encode_call()))
+        transactions = [self._transaction(None, to, data) for to, data in calls]
+        send_and_mine(client, transactions, block_time)
+        self._configured = True
+
+    def _fund(self, block_time, transactions):
+        # unlocks and funds the new senders, and sends every staker the tokens
+        # of its accepted stakes that it does not hold yet, in a block just
+        # before the operations
+        new = []
+        for transaction in transactions:
+            sender = transaction.sender
+            if sender is not None and sender not in self._funded:
+                self._funded.add(sender)
+                new.append(sender)
+        calls = []
+        for sender in new:
+            address = _chain_address(sender)
+            calls += [
+                ("evm_addAccount", [address, ""]),
+                ("personal_unlockAccount", [address, "", 0]),
+                ("evm_setAccountBalance", [address, hex(ACCOUNT_BALANCE)]),
+                ("eth_getTransactionCount", [address, "pending"]),
+            ]
+        if calls:
+            results = self.client.batch(calls)
+            for sender, nonce in zip(new, results[3::4]):
+                self._nonces[_chain_address(sender)] = int(nonce, 16)
+
+        deployment = self.deployment
+        funding = []
+        for sender in new:  # allowance for every stake to come
+            data = APPROVE.encode_call(deployment.staking, MAX_UINT256)
+            funding.append(self._transaction(sender, deployment.token, data))
+        for transaction in transactions:
+            if transaction.funding:
+                data = TRANSFER.encode_call(
+                    _chain_address(transaction.sender), transaction.funding
+                )
+                funding.append(self._transaction(None, deployment.token, data))
+        if funding:
+            send_and_mine(self.client, funding, block_time)
+
+    def _transaction(self, sender, to, data):
+        # eth_sendTransaction object with the sender's next nonce
+        address = self._owner if sender is None else _chain_address(sender)
+        nonce = self._nonces[address]
+        self._nonces[address] = nonce + 1
+        return {
+            "from": address,
+            "to": to,
+            "data": data,
+            "gas": hex(TRANSACTION_GAS),
+            "nonce": hex(nonce),
+        }
+
+    def _send(self, transactions):
+        return self.client.batch(
+            [
+                ("eth_sendTransaction", [self._transaction(t.sender, t.to, t.data)])
+                for t in transactions
+            ]
+        )
+
+    # model side
+    def _apply_to_model(self, block_time, block):
+        # applies the events of one block to the models (runs of stakes,
+        # unstakes, rewards and claims as batch calls, in trace order) and
+        # returns their transactions and the model state of the touched rows
+        staking = self.staking
+        staking.block_timestamp.set_timestamp(block_time)
+        governance_module.BLOCK_TIMESTAMP = block_time  # block.timestamp in solidity
+        transactions = []
+        state = {}  # (getter, address) -> fields after the block
+        governance = self.governance is not None and self.deployment.governance
+        for kind, run in itertools.groupby(block, key=_run_kind):
+            run = list(run)
+            if kind is StakeEvent:
+                transactions += self._apply_stakes(run)
+            elif kind is UnstakeEvent:
+                transactions += self._apply_unstakes(run)
+            elif kind in (GovernanceRewardEvent, GovernanceClaimEvent):
+                transactions += self._apply_governance(kind, run)
+            else:
+                for event in run:
+                    transactions += self._apply_owner_event(event)
+            for event in run:
+                address = getattr(event, "address", None)
+                if address is not None:
+                    state[STAKERS.name, address] = None
+                    if governance:
+                        state[GOV.name, address] = None
+        for getter, address in state:
+            if getter == STAKERS.name:
+                stake = staking.get_stake(address)
+                fields = (
+                    stake.lock_amount,
+                    stake.start_time,
+                    stake.lock_duration,
+                    stake.reward,
+                )
+            else:
+                governer = self.governance.get_governer(address)
+                fields = (
+                    governer.init_time,
+                    governer.reward,
+                    governer.last_reward_time,
+                    governer.last_claim_time,
+                )
+            state[getter, address] = fields
+        return transactions, state
+
+    def _apply_stakes(self, run):
+        staked = set()
+        operations = []
+        for event in run:  # new or top-up, as decided before the call
+            top_up = event.address in self.staking.stakes or event.address in staked
+            operations.append("stake[top_up]" if top_up else "stake[new]")
+            staked.add(event.address)
+        statuses = self.staking.stake_many(
+            [event.address for event in run],
+            [event.lock_amount for event in run],
+            [event.lock_duration for event in run],
+        )
+        transactions = []
+        held = self._held
+        for event, operation, status in zip(run, operations, statuses):
+            accepted = status == STATUS_OK
+            funding = 0
+            if accepted:  # rejected stakes get nothing, the supply is finite
+                tokens = held.get(event.address, 0)
+                funding = max(event.lock_amount - tokens, 0)
+                held[event.address] = tokens + funding - event.lock_amount
+            transactions.append(
+                _Transaction(
+                    operation,
+                    event.address,
+                    self.deployment.staking,
+                    STAKE.encode_call(event.lock_amount, event.lock_duration),
+                    accepted,
+                    address=event.address,
+                    funding=funding,
+                )
+            )
+        return transactions
+
+    def _apply_unstakes(self, run):
+        emergency = self.staking.emergency_withdraw
+        operation = "unstake[emergency]" if emergency else "unstake"
+        addresses = [event.address for event in run]
+        # the lock amounts come back to the stakers and fund their next stakes;
+        # rewards are left out, the chain may round them differently
+        locked = [self.staking.get_stake(address).lock_amount for address in addresses]
+        statuses, _ = self.staking.unstake_many(addresses)
+        held = self._held
+        for address, lock_amount, status in zip(addresses, locked, statuses):
+            if status == STATUS_OK:
+                held[address] = held.get(address, 0) + lock_amount
+        to, data = self.deployment.staking, UNSTAKE.encode_call()
+        return [
+            _Transaction(operation, address, to, data, status == STATUS_OK, address)
+            for address, status in zip(addresses, statuses)
+        ]
+
+    def _apply_governance(self, kind, run):
+        if self.deployment.governance is None:  # see deploy()
+            self.report.skipped += len(run)
+            return []
+        if self.governance is None:
+            raise ValueError(f"Governance event without governance: {run[0]!r}")
+        addresses = [event.address for event in run]
+        accepted = (GOVERNANCE_STATUS_OK, STATUS_GOVERNER_ADDED)
+        to = self.deployment.governance
+        if kind is GovernanceRewardEvent:  # onlyOwner
+            statuses, _ = self.governance.distribute_epoch(addresses)
+            return [
+                _Transaction(
+                    "add_governance_reward",
+                    None,
+                    to,
+                    ADD_GOVERNANCE_REWARD.encode_call(_chain_address(address)),
+                    status in accepted,
+                    address,
+                )
+                for address, status in zip(addresses, statuses)
+            ]
+        statuses, _ = self.governance.claim_many(addresses)
+        data = CLAIM_GOVERNANCE_REWARD.encode_call()
+        claimed = [status in accepted for status in statuses]
+        return [
+            _Transaction("claim_governance_reward", address, to, data, ok, address)
+            for address, ok in zip(addresses, claimed)
+        ]
+
+    def _apply_owner_event(self, event):
+        staking, to = self.staking, self.deployment.staking
+        if isinstance(event, RewardRateChangeEvent):
+            status = staking.set_reward_rate_per_epoch(event.reward_rate_per_epoch)
+            data = SET_REWARD_RATE_PER_EPOCH.encode_call(event.reward_rate_per_epoch)
+            accepted = status == STATUS_OK
+            return [_Transaction("set_reward_rate", None, to, data, accepted)]
+        if isinstance(event, EmergencyEvent):  # the contract only has toggles
+            transactions = []
+            pause, withdraw = event.emergency_pause, event.emergency_withdraw
+            if pause is not None and pause != staking.emergency_pause:
+                staking.set_emergency_pause(pause)
+                data = TOGGLE_EMERGENCY_STOP.encode_call()
+                transactions.append(
+                    _Transaction("emergency_stop", None, to, data, True)
+                )
+            if withdraw is not None and withdraw != staking.emergency_withdraw:
+                staking.set_emergency_withdraw(withdraw)
+                data = TOGGLE_EMERGENCY_WITHDRAW.encode_call()
+                transactions.append(
+                    _Transaction("emergency_withdraw", None, to, data, True)
+                )
+            return transactions
+        raise TypeError(f"Unknown simulation event: {event!r}")
+
+    # node side (worker threads)
+    def _check_block(self, block_time, block_number, transactions, hashes, state):
+        receipts = self.client.batch(
+            [("eth_getTransactionReceipt", [h]) for h in hashes]
+        )
+        if any(receipt is None for receipt in receipts):
+            raise RuntimeError(f"Transactions of block {block_time} were not mined")
+        getters = {STAKERS.name: (STAKERS, self.deployment.staking)}
+        if self.deployment.governance is not None:
+            getters[GOV.name] = (GOV, self.deployment.governance)
+        calls = []
+        for getter, address in state:
+            function, to = getters[getter]
+            call = {"to": to, "data": function.encode_call(_chain_address(address))}
+            calls.append(("eth_call", [call, block_number]))
+        results = self.client.batch(calls)
+        chain_state = {
+            key: getters[key[0]][0].decode_result(result)
+            for key, result in zip(state, results)
+        }
+        return block_time, transactions, receipts, state, chain_state
+
+    def _record(self, block_time, transactions, receipts, state, chain_state):
+        report = self.report
+        report.blocks += 1
+        report.transactions += len(transactions)
+        for transaction, receipt in zip(transactions, receipts):
+            succeeded = int(receipt["status"], 16) == 1
+            gas_used = int(receipt["gasUsed"], 16)
+            stats = report.gas.get(transaction.operation)
+            if stats is None:
+                stats = report.gas[transaction.operation] = GasStats()
+            stats.transactions += 1
+            stats.reverted += not succeeded
+            stats.total_gas += gas_used
+            stats.max_gas = max(stats.max_gas, gas_used)
+            if succeeded != transaction.accepted:
+                address = transaction.address or self._owner
+                self._diverge(
+                    Divergence(
+                        block_time,
+                        transaction.operation,
+                        address,
+                        "status",
+                        transaction.accepted,
+                        succeeded,
+                    )
+                )
+        for (getter, address), fields in state.items():
+            chain_fields = chain_state[getter, address]
+            if not self._same_fields(getter, fields, chain_fields):
+                divergence = Divergence(
+                    block_time, getter, address, "state", fields, chain_fields
+                )
+                self._diverge(divergence)
+
+    def _same_fields(self, getter, fields, chain_fields):
+        reward = _REWARD_FIELDS[getter]  # may be a float in the models
+        return all(
+            math.isclose(value, chain_value, rel_tol=self.reward_tolerance)
+            if i == reward
+            else value == chain_value
+            for i, (value, chain_value) in enumerate(zip(fields, chain_fields))
+        )
+
+    def _diverge(self, divergence):
+        self.report.divergence_count += 1
+        if len(self.report.divergences) < self.max_divergences:
+            self.report.divergences.append(divergence)
+
+
+def _run_kind(event):  # key of the events applied together as one batch call
+    for kind in (StakeEvent, UnstakeEvent, GovernanceRewardEvent, GovernanceClaimEvent):
+        if isinstance(event, kind):
+            return kind
+    return type(event)
+
+
+def format_report(report):
+    lines = [
+        f"{report.transactions} transactions in {report.blocks} blocks,"
+        f" {report.round_trips} JSON-RPC round trips, {report.seconds:.1f} s",
+        "{:<24} {:>8} {:>8} {:>10} {:>10}".format(
+            "operation", "txs", "reverted", "mean gas", "max gas"
+        ),
+    ]
+    for operation, stats in sorted(report.gas.items()):
+        lines.append(
+            f"{operation:<24} {stats.transactions:>8} {stats.reverted:>8}"
+            f" {stats.mean_gas:>10.0f} {stats.max_gas:>10}"
+        )
+    if report.skipped:
+        lines.append(
+            f"{report.skipped} governance events skipped"
+            " (no GovernanceRewarding deployment)"
+        )
+    lines.append(f"{report.divergence_count} divergences")
+    for d in report.divergences:
+        lines.append(
+            f"  {d.time} {d.operation} {d.address} {d.kind}:"
+            f" model {d.model!r}, chain {d.chain!r}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("trace", help="trace file written by prototyping.workload")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--build-dir", default=DEFAULT_BUILD_DIR)
+    parser.add_argument("--owner", help="deployer account (first node account)")
+    parser.add_argument(
+        "--deployment",
+        help="JSON {owner, token, staking, governance} of deployed contracts",
+    )
+    parser.add_argument(
+        "--governance",
+        action="store_true",
+        help="also deploy GovernanceRewarding (rewards revert, see deploy())",
+    )
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE)
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument("--pipeline-depth", type=int, default=DEFAULT_PIPELINE_DEPTH)
+    parser.add_argument("--max-divergences", type=int, default=DEFAULT_MAX_DIVERGENCES)
+    args = parser.parse_args(argv)
+
+    trace = read_trace(args.trace)
+    first = next(trace, None)
+    if first is None:
+        print("Empty trace")
+        return 0
+    staking = Staking(
+        utility_token_addr="0x1111",
+        block_timestamp=BlockTimestamp(first.time),
+        event_sink=events.NullSink(),
+    )
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        staking_balances=StakingBalanceProvider(staking),
+        reputation_balances=InMemoryBalanceProvider(),  # as deploy(): all 0
+    )
+    with JsonRpcClient(args.url, args.pool_size, args.max_batch) as client:
+        if args.deployment:
+            with open(args.deployment) as file:
+                deployment = Deployment(**json.load(file))
+        else:
+            deployment = deploy(
+                client, args.build_dir, args.owner, governance=args.governance
+            )
+        replay = DifferentialReplay(
+            client,
+            deployment,
+            staking,
+            governance,
+            pipeline_depth=args.pipeline_depth,
+            max_divergences=args.max_divergences,
+        )
+        report = replay.replay(itertools.chain([first], trace))
+    print(format_report(report))
+    return 1 if report.divergence_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+from collections import Counter, deque
+from dataclasses import dataclass
+
+
+# event sinks
+# call sites pass the event type and its raw field values; sinks that drop
+# events never build the event object or format its message
+class PrintSink:
+    """
+    Prints every event message to stdout (the original prototype behaviour).
+    """
+
+    def emit(self, event_type, *args):
+        print(event_type(*args).message())
+
+
+class NullSink:
+    """
+    Drops every event.
+    """
+
+    def emit(self, event_type, *args):
+        pass
+
+
+class CountingSink:
+    """
+    Drops every event but keeps per-event-type counters.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def emit(self, event_type, *args):
+        self.counts[event_type] += 1
+
+    def count(self, event_type):
+        return self.counts[event_type]
+
+
+class RingBufferSink(CountingSink):
+    """
+    Keeps the last `maxlen` events (all of them if maxlen is None)
+    plus per-event-type counters over the whole run.
+    """
+
+    def __init__(self, maxlen=10_000):
+        super().__init__()
+        self.buffer = deque(maxlen=maxlen)
+
+    def emit(self, event_type, *args):
+        self.counts[event_type] += 1
+        self.buffer.append(event_type(*args))
+
+    def events(self, event_type=None):
+        if event_type is None:
+            return list(self.buffer)
+        return [event for event in self.buffer if type(event) is event_type]
+
+
+# shared events
+@dataclass
+class EmergencyPauseSet:
+    emergency_pause: bool
+
+    def message(self):
+        return f"Emergency pause set to {self.emergency_pause}"
+
+
+@dataclass
+class EmergencyPauseActive:
+    def message(self):
+        return "Error: Emergency pause is active. Please try again later."
+
+
+# staking events
+@dataclass
+class UtilityTokenAddrSet:
+    utility_token_addr: str
+
+    def message(self):
+        return f"Utility token address set to {self.utility_token_addr}"
+
+
+@dataclass
+class RewardRateSet:
+    reward_rate_per_epoch: int
+
+    def message(self):
+        return f"Reward rate per epoch set to {self.reward_rate_per_epoch}"
+
+
+@dataclass
+class InvalidRewardRate:
+    reward_rate_per_epoch: int
+    max_reward_rate: int
+
+    def message(self):
+        if self.reward_rate_per_epoch < 0:
+            return "Error: Reward rate must be non-negative."
+        return (
+            f"Error: Reward rate must be less than or equal to "
+            f"{self.max_reward_rate}%."
+        )
+
+
+@dataclass
+class EmergencyWithdrawSet:
+    emergency_withdraw: bool
+
+    def message(self):
+        return f"Emergency withdraw set to: {self.emergency_withdraw}"
+
+
+@dataclass
+class InvalidCurrentTime:
+    current_time: int
+
+    def message(self):
+        return "Error: Invalid current time."
+
+
+@dataclass
+class InvalidStakeParams:
+    lock_amount: int
+    lock_duration: int
+    reason: str
+
+    def message(self):
+        return f"Error: {self.reason}"
+
+
+@dataclass
+class InvalidEpochStart:
+    address: str
+
+    def message(self):
+        return "Error: Invalid next epoch start time. Please try again."
+
+
+@dataclass
+class StakeCreated:
+    address: str
+    lock_amount: int
+    start_time: int
+    lock_duration: int
+    reward: float
+
+    def message(self):
+        return (
+            f"Stake for {self.address} created: Stake(lock_amount={self.lock_amount}, "
+            f"start_time={self.start_time}, lock_duration={self.lock_duration}, "
+            f"reward={self.reward})"
+        )
+
+
+@dataclass
+class InvalidRemainingTime:
+    address: str
+
+    def message(self):
+        return "Error: Invalid remaining time. Please try again."
+
+
+@dataclass
+class StakeNearEnd:
+    address: str
+
+    def message(self):
+        return "Error: Cannot deposit to stake nearing or past its end."
+
+
+@dataclass
+class StakeUpdated:
+    address: str
+    lock_amount: int
+    start_time: int
+    lock_duration: int
+    reward: float
+
+    def message(self):
+        return (
+            f"Stake for {self.address} updated: Stake(lock_amount={self.lock_amount}, "
+            f"start_time={self.start_time}, lock_duration={self.lock_duration}, "
+            f"reward={self.reward})"
+        )
+
+
+@dataclass
+class EmergencyWithdraw:
+    address: str
+    amount: int
+
+    def message(self):
+        return f"Emergency withdraw for {self.address}: {self.amount}"
+
+
+@dataclass
+class NoStakeFound:
+    address: str
+
+    def message(self):
+        return f"Error: No stake found for address {self.address}."
+
+
+@dataclass
+class StakeNotEnded:
+    address: str
+
+    def message(self):
+        return "Error: Cannot withdraw from stake that has not reached its end."
+
+
+@dataclass
+class WithdrawCapExceeded:
+    address: str
+    amount: float
+    max_multiplier_to_withdraw: int
+
+    def message(self):
+        return (
+            f"Error: Cannot withdraw more than "
+            f"{self.max_multiplier_to_withdraw * 100}% of lock amount."
+        )
+
+
+@dataclass
+class Withdraw:
+    address: str
+    amount: float
+
+    def message(self):
+        return f"Withdraw for {self.address}: {self.amount}"
+
+
+# governance events
+@dataclass
+class GovernanceTokenAddrSet:
+    governance_token_addr: str
+
+    def message(self):
+        return f"Governance token address set to {self.governance_token_addr}"
+
+
+@dataclass
+class StakingAddrSet:
+    staking_addr: str
+
+    def message(self):
+        return f"Staking address set to {self.staking_addr}"
+
+
+@dataclass
+class ReputationAddrSet:
+    reputation_addr: str
+
+    def message(self):
+        return f"Reputation token address set to {self.reputation_addr}"
+
+
+@dataclass
+class GovernerAdded:
+    address: str
+
+    def message(self):
+        return f"New governer added with address {self.address}"
+
+
+@dataclass
+class RewardAlreadyGiven:
+    address: str
+
+    def message(self):
+        return (
+            f"Error: Reward already given to governer with address {self.address} "
+            f"in this epoch"
+        )
+
+
+@dataclass
+class RewardAdded:
+    address: str
+    reward: float
+
+    def message(self):
+        return f"Reward of {self.reward} given to governer with address {self.address}"
+
+
+@dataclass
+class GovernerNotFound:
+    address: str
+
+    def message(self):
+        return f"Error: Governer with address {self.address} not found"
+
+
+@dataclass
+class RewardAlreadyClaimed:
+    address: str
+
+    def message(self):
+        return (
+            f"Error: Reward already claimed by governer with address {self.address} "
+            f"in this epoch"
+        )
+
+
+@dataclass
+class NoRewardToClaim:
+    address: str
+
+    def message(self):
+        return f"Error: No reward to claim for governer with address {self.address}"
+
+
+@dataclass
+class RewardClaimed:
+    address: str
+    reward: float
+
+    def message(self):
+        return (
+            f"Reward of {self.reward} claimed by governer with address {self.address}"
+        )
+
+
+# vesting events
+@dataclass
+class TokensReleased:
+    beneficiary: str
+    amount: int
+
+    def message(self):
+        return f"Released {self.amount} tokens to {self.beneficiary}"
+
+
+@dataclass
+class NoTokensToRelease:
+    beneficiary: str
+
+    def message(self):
+        return "Error: No tokens available for release"
+
+
+# presale events
+@dataclass
+class PresaleCreated:
+    presale_id: int
+
+    def message(self):
+        return f"Presale {self.presale_id} created"
+
+
+@dataclass
+class PresaleStageSet:
+    presale_id: int
+
+    def message(self):
+        return f"Presale stage set to {self.presale_id}"
+
+
+@dataclass
+class PresalePaused:
+    presale_id: int
+
+    def message(self):
+        return f"Presale {self.presale_id} paused"
+
+
+@dataclass
+class PresaleUnpaused:
+    presale_id: int
+
+    def message(self):
+        return f"Presale {self.presale_id} unpaused"
+
+
+@dataclass
+class TokensBought:
+    address: str
+    presale_id: int
+    with_eth: bool
+    tokens: int
+    amount_paid: int  # wei or USDC units
+
+    def message(self):
+        currency = "wei" if self.with_eth else "USDC units"
+        return (
+            f"{self.address} bought {self.tokens} tokens in presale "
+            f"{self.presale_id} for {self.amount_paid} {currency}"
+        )
+
+
+@dataclass
+class TokensClaimed:
+    address: str
+    presale_id: int
+    amount: int
+
+    def message(self):
+        return (
+            f"{self.address} claimed {self.amount} tokens of presale "
+            f"{self.presale_id}"
+        )
+
+
+@dataclass
+class PresaleCallReverted:
+    reason: str  # the require() message in solidity
+
+    def message(self):
+        return f"Error: {self.reason}"
@@ -0,0 +1,532 @@
+"""
+Opt-in gas estimation for Staking and GovernanceRewarding.
+
+instrument(obj) turns every call of a non-view contract function into a
+metered transaction: reads and writes of the contract state variables and of
+the struct mapping (stakes / governers) are mapped onto the Solidity storage
+slots of utility_stacking.sol and governance_rewarding.sol and priced with the
+EIP-2929 / EIP-2200 / EIP-3529 rules (cold vs warm slots, zero vs non-zero
+writes, capped refunds). Alternative storage layouts, e.g. PACKED_STAKING_LAYOUT,
+can be passed to compare designs, and meter.transaction() groups several calls
+into one transaction (e.g. add + claim of governance rewards).
+
+Only this contract's storage and the 21000 intrinsic gas are counted; external
+token calls, calldata and event logs are not.
+"""
+
+import functools
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields, replace
+
+import prototyping.governance as governance_module
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import EPOCH_IN_SECONDS, Staking
+
+# gas schedule (London)
+TX_BASE_GAS = 21_000
+COLD_SLOAD_GAS = 2_100
+WARM_ACCESS_GAS = 100
+SSTORE_SET_GAS = 20_000
+SSTORE_RESET_GAS = 2_900  # 5000 - COLD_SLOAD_GAS
+SSTORE_CLEARS_REFUND = 4_800
+MAPPING_ACCESS_GAS = 42  # keccak256(key . slot): 30 + 2 words * 6
+MAX_REFUND_QUOTIENT = 5
+
+# ReentrancyGuard._status values
+_NOT_ENTERED = (1,)
+_ENTERED = (2,)
+
+
+@dataclass
+class StorageLayout:
+    """
+    Solidity storage layout of a prototype: slots of the state variables
+    (attributes sharing a slot are packed), the struct mapping and the offset
+    of each struct field inside the struct, plus which functions are
+    transactions and which modifiers they run.
+    """
+
+    variables: dict  # attribute -> slot
+    mapping: str  # attribute holding the struct mapping
+    mapping_slot: int
+    fields: dict  # struct field -> slot offset inside the struct
+    exists_field: str  # field read by `address in mapping` (== 0 check)
+    transactions: tuple  # non-view functions, one transaction per call
+    only_owner: tuple = field(default=())
+    non_reentrant: tuple = field(default=())
+    unmetered: tuple = field(default=())  # python-only bookkeeping
+    owner_slot: int = field(default=0)  # Ownable._owner
+    guard_slot: int = field(default=None)  # ReentrancyGuard._status
+
+
+# utility_stacking.sol: Ownable, ReentrancyGuard, maxLockAmount,
+# rewardRatePerEpoch, stakeToken, rewardToken, stakers,
+# emergencyStopTrigger + emergencyWithdrawTrigger (packed)
+_STAKING_SETTERS = (
+    "set_utility_token_addr",
+    "set_reward_rate_per_epoch",
+    "set_emergency_pause",
+    "set_emergency_withdraw",
+)
+STAKING_LAYOUT = StorageLayout(
+    variables={
+        "max_lock_amount": 2,
+        "reward_rate_per_epoch": 3,
+        "utility_token_addr": 4,
+        "emergency_pause": 7,
+        "emergency_withdraw": 7,
+    },
+    mapping="stakes",
+    mapping_slot=6,
+    fields={"lock_amount": 0, "start_time": 1, "lock_duration": 2, "reward": 3},
+    exists_field="lock_amount",
+    transactions=("stake", "unstake") + _STAKING_SETTERS,
+    only_owner=_STAKING_SETTERS,
+    non_reentrant=("stake", "unstake"),
+    unmetered=("_on_stake_created", "_on_stake_topped_up", "_on_stake_removed"),
+    guard_slot=1,
+)
+# uint128 amount + reward, uint64 startTime + lockDuration
+PACKED_STAKING_LAYOUT = replace(
+    STAKING_LAYOUT,
+    fields={"lock_amount": 0, "reward": 0, "start_time": 1, "lock_duration": 1},
+)
+
+# governance_rewarding.sol: Ownable, reward, current_time, EPOCH_IN_SECONDS
+# (state variables used as scratch space, mirrored by the prototype),
+# StakingAddr, Staking, RepTokenAddress, GTokenAddress, RepToken, GToken, Gov,
+# emergencyStopTrigger
+_GOVERNANCE_SETTERS = (
+    "set_governance_token_addr",
+    "set_staking_addr",
+    "set_reputation_addr",
+    "set_emergency_pause",
+)
+GOVERNANCE_LAYOUT = StorageLayout(
+    variables={
+        "reward": 1,
+        "current_time": 2,
+        "epoch_in_seconds": 3,
+        "staking_addr": 5,
+        "reputation_addr": 8,
+        "governance_token_addr": 9,
+        "emergency_pause": 11,
+    },
+    mapping="governers",
+    mapping_slot=10,
+    fields={
+        "init_time": 0,
+        "reward": 1,
+        "last_reward_time": 2,
+        "last_claim_time": 3,
+    },
+    exists_field="init_time",
+    transactions=("add_governance_reward", "claim_governance_reward")
+    + _GOVERNANCE_SETTERS,
+    only_owner=("add_governance_reward",) + _GOVERNANCE_SETTERS,
+)
+# uint64 times in one slot, uint128 reward in the next
+PACKED_GOVERNANCE_LAYOUT = replace(
+    GOVERNANCE_LAYOUT,
+    fields={
+        "init_time": 0,
+        "last_reward_time": 0,
+        "last_claim_time": 0,
+        "reward": 1,
+    },
+)
+
+
+@dataclass
+class GasUsage:
+    """
+    Storage access counters and estimated gas of one transaction,
+    or summed over several (see GasMeter.per_operation / per_epoch).
+    """
+
+    function: str = field(default=None)
+    time: int = field(default=0)
+    calls: int = field(default=1)
+    gas: int = field(default=0)  # including TX_BASE_GAS, net of refunds
+    refund: int = field(default=0)
+    cold_sloads: int = field(default=0)
+    warm_sloads: int = field(default=0)
+    sstores_set: int = field(default=0)  # zero -> non-zero
+    sstores_reset: int = field(default=0)  # first change of a non-zero slot
+    sstores_warm: int = field(default=0)  # no-op or already changed slot
+    mapping_accesses: int = field(default=0)
+    field_writes: int = field(default=0)
+
+    @property
+    def mean_gas(self):
+        return self.gas / self.calls if self.calls else 0.0
+
+    def _add(self, other):
+        for counter in _COUNTERS:
+            setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+
+
+_COUNTERS = [f.name for f in fields(GasUsage) if f.name not in ("function", "time")]
+
+
+def _is_zero(value):
+    return not any(value)
+
+
+class GasMeter:
+    """
+    Collects one GasUsage per transaction. Storage accesses outside a
+    transaction (views, batch functions, setup code) are not counted.
+    """
+
+    def __init__(self, epoch_in_seconds=EPOCH_IN_SECONDS):
+        self.epoch_in_seconds = epoch_in_seconds
+        self.calls = []
+        self._call = None  # transaction in progress
+        self._paused = 0
+        self._warm = set()  # slots accessed in this transaction
+        self._original = {}  # slot -> value at the start of this transaction
+
+    @property
+    def active(self):
+        return self._call is not None and not self._paused
+
+    @contextmanager
+    def transaction(self, function, time=0):
+        # calls inside an open transaction are part of it
+        if self._call is not None:
+            yield self._call
+            return
+        call = self._call = GasUsage(function=function, time=time)
+        try:
+            yield call
+        finally:
+            self._call = None
+            self._warm.clear()
+            self._original.clear()
+            call.gas += TX_BASE_GAS
+            call.refund = min(max(call.refund, 0), call.gas // MAX_REFUND_QUOTIENT)
+            call.gas -= call.refund
+            self.calls.append(call)
+
+    @contextmanager
+    def paused(self):
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+
+    # storage accesses
+    def _touch(self, slot):
+        if slot in self._warm:
+            return False
+        self._warm.add(slot)
+        return True
+
+    def sload(self, slot):
+        if not self.active:
+            return
+        call = self._call
+        if self._touch(slot):
+            call.cold_sloads += 1
+            call.gas += COLD_SLOAD_GAS
+        else:
+            call.warm_sloads += 1
+            call.gas += WARM_ACCESS_GAS
+
+    def sstore(self, slot, current, new):  # slot values as tuples of fields
+        if not self.active:
+            return
+        call = self._call
+        original = self._original.setdefault(slot, current)
+        if self._touch(slot):
+            call.gas += COLD_SLOAD_GAS
+        if new == current:
+            call.sstores_warm += 1
+            call.gas += WARM_ACCESS_GAS
+        elif original == current:
+            if _is_zero(original):
+                call.sstores_set += 1
+                call.gas += SSTORE_SET_GAS
+            else:
+                call.sstores_reset += 1
+                call.gas += SSTORE_RESET_GAS
+                if _is_zero(new):
+                    call.refund += SSTORE_CLEARS_REFUND
+        else:
+            call.sstores_warm += 1
+            call.gas += WARM_ACCESS_GAS
+            if not _is_zero(original):
+                if _is_zero(current):
+                    call.refund -= SSTORE_CLEARS_REFUND
+                elif _is_zero(new):
+                    call.refund += SSTORE_CLEARS_REFUND
+            if new == original:
+                if _is_zero(original):
+                    call.refund += SSTORE_SET_GAS - WARM_ACCESS_GAS
+                else:
+                    call.refund += SSTORE_RESET_GAS - WARM_ACCESS_GAS
+
+    def mapping_access(self):
+        if self.active:
+            self._call.mapping_accesses += 1
+            self._call.gas += MAPPING_ACCESS_GAS
+
+    # rollups
+    def per_operation(self):  # {function: GasUsage summed over its calls}
+        totals = {}
+        for call in self.calls:
+            total = totals.get(call.function)
+            if total is None:
+                total = totals[call.function] = GasUsage(
+                    function=call.function, calls=0
+                )
+            total._add(call)
+        return totals
+
+    def per_epoch(self):  # {epoch_start_time: GasUsage summed over the epoch}
+        totals = {}
+        for call in self.calls:
+            epoch_start_time = call.time - call.time % self.epoch_in_seconds
+            total = totals.get(epoch_start_time)
+            if total is None:
+                total = totals[epoch_start_time] = GasUsage(
+                    time=epoch_start_time, calls=0
+                )
+            total._add(call)
+        return dict(sorted(totals.items()))
+
+    def reset(self):
+        self.calls.clear()
+
+
+# metered storage
+class _MeteredRecord:
+    # Stake / Governer seen through a MeteredBook inside a transaction
+    __slots__ = ("_book", "_address", "_record")
+
+    def __init__(self, book, address, record):
+        self._book = book
+        self._address = address
+        self._record = record
+
+    def __getattr__(self, name):
+        value = getattr(self._record, name)
+        offset = self._book.layout.fields.get(name)
+        if offset is not None:
+            self._book.meter.sload(self._book._slot(self._address, offset))
+        return value
+
+    def __setattr__(self, name, value):
+        if name in _MeteredRecord.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            self._book._write_field(self._address, self._record, name, value)
+
+    def __eq__(self, other):
+        if isinstance(other, _MeteredRecord):
+            other = other._record
+        return self._record == other
+
+    def __repr__(self):
+        return repr(self._record)
+
+
+class MeteredBook(MutableMapping):
+    """
+    Struct mapping wrapper that reports mapping accesses and struct slot
+    reads/writes to a GasMeter; a plain pass-through outside transactions.
+    """
+
+    def __init__(self, book, meter, layout):
+        self.book = book
+        self.meter = meter
+        self.layout = layout
+        self._slot_fields = {}  # offset -> fields packed into that slot
+        for name, offset in layout.fields.items():
+            self._slot_fields.setdefault(offset, []).append(name)
+        self._zero = {
+            offset: (0,) * len(names) for offset, names in self._slot_fields.items()
+        }
+
+    def _slot(self, address, offset):
+        return (self.layout.mapping_slot, address, offset)
+
+    def _slot_value(self, record, offset):
+        return tuple(getattr(record, name) for name in self._slot_fields[offset])
+
+    def _write_field(self, address, record, name, value):
+        offset = self.layout.fields.get(name)
+        if offset is None or not self.meter.active:
+            setattr(record, name, value)
+            return
+        current = self._slot_value(record, offset)
+        setattr(record, name, value)
+        self.meter.sstore(
+            self._slot(address, offset), current, self._slot_value(record, offset)
+        )
+        self.meter._call.field_writes += 1
+
+    def _slot_values(self, record):  # {offset: slot value}, zeros for None
+        if record is None:
+            return self._zero
+        return {offset: self._slot_value(record, offset) for offset in self._zero}
+
+    def _write_record(self, address, current, new):  # struct assignment / delete
+        for offset, value in new.items():
+            self.meter.sstore(self._slot(address, offset), current[offset], value)
+        self.meter._call.field_writes += len(self.layout.fields)
+
+    # mapping protocol
+    def __contains__(self, address):
+        if self.meter.active:
+            self.meter.mapping_access()
+            offset = self.layout.fields[self.layout.exists_field]
+            self.meter.sload(self._slot(address, offset))
+        return address in self.book
+
+    def __getitem__(self, address):
+        record = self.book[address]
+        if not self.meter.active:
+            return record
+        self.meter.mapping_access()
+        return _MeteredRecord(self, address, record)
+
+    def __setitem__(self, address, record):
+        if isinstance(record, _MeteredRecord):
+            record = record._record
+        if self.meter.active:
+            self.meter.mapping_access()
+            old = self.book[address] if address in self.book else None
+            self._write_record(
+                address, self._slot_values(old), self._slot_values(record)
+            )
+        self.book[address] = record
+
+    def __delitem__(self, address):
+        self.pop(address)
+
+    def pop(self, address, *default):
+        if self.meter.active and address in self.book:
+            self.meter.mapping_access()
+            self._write_record(
+                address, self._slot_values(self.book[address]), self._zero
+            )
+        return self.book.pop(address, *default)
+
+    def __iter__(self):
+        return iter(self.book)
+
+    def __len__(self):
+        return len(self.book)
+
+    # bulk reads have no solidity counterpart and are never metered
+    def values(self):
+        return self.book.values()
+
+    def items(self):
+        return self.book.items()
+
+
+# metered state variables
+_METERED_CLASSES = {}
+
+
+def _metered_class(cls):
+    metered = _METERED_CLASSES.get(cls)
+    if metered is not None:
+        return metered
+
+    def slot_value(self, slot):
+        variables = object.__getattribute__(self, "_gas_layout").variables
+        values = []
+        for name, other in variables.items():
+            if other == slot:
+                try:
+                    values.append(object.__getattribute__(self, name))
+                except AttributeError:  # e.g. a constant in the prototype
+                    values.append(0)
+        return tuple(values)
+
+    def __getattribute__(self, name):
+        value = object.__getattribute__(self, name)
+        slot = object.__getattribute__(self, "_gas_layout").variables.get(name)
+        if slot is not None:
+            object.__getattribute__(self, "gas_meter").sload(slot)
+        return value
+
+    def __setattr__(self, name, value):
+        slot = object.__getattribute__(self, "_gas_layout").variables.get(name)
+        meter = object.__getattribute__(self, "gas_meter")
+        if slot is None or not meter.active:
+            object.__setattr__(self, name, value)
+            return
+        current = slot_value(self, slot)
+        object.__setattr__(self, name, value)
+        meter.sstore(slot, current, slot_value(self, slot))
+
+    metered = type(
+        f"Metered{cls.__name__}",
+        (cls,),
+        {"__getattribute__": __getattribute__, "__setattr__": __setattr__},
+    )
+    _METERED_CLASSES[cls] = metered
+    return metered
+
+
+def _transaction(meter, layout, name, method, clock):
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        with meter.transaction(name, clock()):
+            if name in layout.only_owner:
+                meter.sload(layout.owner_slot)
+            guarded = name in layout.non_reentrant and layout.guard_slot is not None
+            if guarded:
+                meter.sload(layout.guard_slot)
+                meter.sstore(layout.guard_slot, _NOT_ENTERED, _ENTERED)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                if guarded:
+                    meter.sstore(layout.guard_slot, _ENTERED, _NOT_ENTERED)
+
+    return call
+
+
+def _unmetered(meter, method):
+    @functools.wraps(method)
+    def call(*args, **kwargs):
+        with meter.paused():
+            return method(*args, **kwargs)
+
+    return call
+
+
+def instrument(obj, meter=None, layout=None):
+    # meters a Staking or GovernanceRewarding instance in place, returns the meter
+    if isinstance(obj, Staking):
+        layout = layout or STAKING_LAYOUT
+        clock = lambda: obj.block_timestamp.timestamp  # noqa: E731
+    elif isinstance(obj, GovernanceRewarding):
+        layout = layout or GOVERNANCE_LAYOUT
+        clock = lambda: governance_module.BLOCK_TIMESTAMP  # noqa: E731
+    else:
+        raise TypeError(f"Cannot instrument {type(obj).__name__}")
+    if hasattr(obj, "gas_meter"):
+        raise ValueError(f"{type(obj).__name__} is already instrumented")
+    if meter is None:
+        meter = GasMeter()
+
+    obj.gas_meter = meter
+    obj._gas_layout = layout
+    book = MeteredBook(getattr(obj, layout.mapping), meter, layout)
+    setattr(obj, layout.mapping, book)
+    for name in layout.transactions:
+        method = getattr(obj, name)
+        setattr(obj, name, _transaction(meter, layout, name, method, clock))
+    for name in layout.unmetered:
+        setattr(obj, name, _unmetered(meter, getattr(obj, name)))
+    obj.__class__ = _metered_class(type(obj))
+    return meter
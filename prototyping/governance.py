@@ -1,9 +1,18 @@
+import copy
 import time
+import weakref
+from array import array
 from dataclasses import dataclass, field
 import math
 
+from prototyping import abdk_math, events
+from prototyping.balances import InMemoryBalanceProvider
+from prototyping.cow_book import CopyOnWriteBook, keep_rows
+from prototyping.lru_cache import LruCache
+
 
 EPOCH_IN_SECONDS = 60 * 60 * 24 * 7  # 1 week
+PROJECTION_CACHE_SIZE = 1 << 16  # addresses with a memoized reward projection
 BALANCES = {
     "0x111": {  # user1
         "0x222": 100.0,  # utility token
@@ -15,6 +24,15 @@ BALANCES = {
     }
 }
 
+# per-address statuses returned by the batch functions (distribute_epoch, claim_many)
+STATUS_OK = 0
+STATUS_EMERGENCY_PAUSE = 1
+STATUS_GOVERNER_ADDED = 2  # first call only registers the governer
+STATUS_REWARD_ALREADY_GIVEN = 3
+STATUS_GOVERNER_NOT_FOUND = 4
+STATUS_REWARD_ALREADY_CLAIMED = 5
+STATUS_NO_REWARD = 6
+
 
 @dataclass
 class Governer:
@@ -25,6 +43,7 @@ class Governer:
 
 
 class GovernanceRewarding:
+    epoch_in_seconds = EPOCH_IN_SECONDS  # EPOCH_IN_SECONDS state variable in solidity
 
     # deployer functions
     def __init__(
@@ -33,26 +52,50 @@ class GovernanceRewarding:
         staking_addr,
         reputation_addr,
         emergency_pause=False,
+        event_sink=None,  # see prototyping.events (defaults to printing to stdout)
+        staking_balances=None,  # see prototyping.balances (defaults to BALANCES)
+        reputation_balances=None,  # see prototyping.balances (defaults to BALANCES)
+        fixed_point=False,  # compute rewards with ABDKMath64x64 exactly as on chain
+        projection_cache_size=PROJECTION_CACHE_SIZE,
     ):
         self.governance_token_addr = governance_token_addr
         self.staking_addr = staking_addr
         self.reputation_addr = reputation_addr
         self.emergency_pause = emergency_pause
         self.governers = {}
+        # state variables the solidity functions use as scratch space
+        self.reward = 0.0
+        self.current_time = 0
+        self.fixed_point = fixed_point
+        self.event_sink = event_sink if event_sink is not None else events.PrintSink()
+        self.staking_balances = (
+            staking_balances
+            if staking_balances is not None
+            else InMemoryBalanceProvider(BALANCES)
+        )
+        self.reputation_balances = (
+            reputation_balances
+            if reputation_balances is not None
+            else InMemoryBalanceProvider(BALANCES)
+        )
+        self.projections = LruCache(projection_cache_size)
+        self._forks = []  # weak references to the governer books of live forks
         
     
     # setter functions (onlyOwner functions in solidity)
     def set_governance_token_addr(self, governance_token_addr):
         self.governance_token_addr = governance_token_addr
-        print(f"Governance token address set to {governance_token_addr}")
+        self.event_sink.emit(events.GovernanceTokenAddrSet, governance_token_addr)
         
     def set_staking_addr(self, staking_addr):
         self.staking_addr = staking_addr
-        print(f"Staking address set to {staking_addr}")
+        self.projections.clear()
+        self.event_sink.emit(events.StakingAddrSet, staking_addr)
         
     def set_reputation_addr(self, reputation_addr):
         self.reputation_addr = reputation_addr
-        print(f"Reputation token address set to {reputation_addr}")
+        self.projections.clear()
+        self.event_sink.emit(events.ReputationAddrSet, reputation_addr)
 
     
     # getter functions (view functions in solidity)
@@ -68,90 +111,265 @@ class GovernanceRewarding:
     def get_governer(self, address):
         if address not in self.governers:
             return Governer()
+        peek = getattr(self.governers, "peek", None)
+        if peek is not None:  # fork views and mapped books copy no row
+            return peek(address)
         return self.governers[address]
     
     
     # util functions
     def _get_staking_balance(self, user_addr, staking_addr):
-        try:
-            staking_balance = BALANCES[user_addr][staking_addr]  # getStake() in stake contract
-            return max(0.0, staking_balance)
-        except KeyError:
-            return 0.0  # return 0 if address not found
+        # getStake() in stake contract
+        return self.staking_balances.balance_of(user_addr, staking_addr)
     
     def _get_reputation_balance(self, user_addr, reputation_addr):
-        try:
-            rep_balance = BALANCES[user_addr][reputation_addr]  # BalanceOf in solidity
-            return max(0.0, rep_balance)
-        except KeyError:
-            return 0.0  # return 0 if address not found 
+        # BalanceOf in solidity
+        return self.reputation_balances.balance_of(user_addr, reputation_addr)
+
+    def _get_staking_balances(self, user_addrs, staking_addr):
+        return self.staking_balances.balances_of(user_addrs, staking_addr)
+
+    def _get_reputation_balances(self, user_addrs, reputation_addr):
+        return self.reputation_balances.balances_of(user_addrs, reputation_addr)
+
+    def _governance_reward(self, address):
+        staking_balance = self._get_staking_balance(address, self.staking_addr)
+        reputation_balance = self._get_reputation_balance(address, self.reputation_addr)
+        return self._reward_of_balances(staking_balance, reputation_balance)
+
+    def _reward_of_balances(self, staking_balance, reputation_balance):
+        # TODO: think about the reward formula (# import "abdk-libraries-solidity/ABDKMath64x64.sol"; for log)
+        if self.fixed_point:
+            return abdk_math.governance_reward(
+                int(staking_balance), int(reputation_balance)
+            )
+        return staking_balance * (1 + math.log(reputation_balance + 1)/100)
     
     
     # emergency functions (onlyOwner functions in solidity)
     def set_emergency_pause(self, emergency_pause):  # pause all functions
         if self.emergency_pause != emergency_pause:
             self.emergency_pause = emergency_pause
-            print(f"Emergency pause set to {emergency_pause}")
+            self.event_sink.emit(events.EmergencyPauseSet, emergency_pause)
             
     
     # main functions (public functions in solidity)
     def add_governance_reward(self, address):  # maybe it is better to use onlyOwner here
         
         if self.emergency_pause:
-            print("Emergency pause is active")
+            self.event_sink.emit(events.EmergencyPauseActive)
             return
         
-        current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        self.current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        if self._forks:
+            self._keep_rows_in_forks(address)
         if address not in self.governers:
             self.governers[address] = Governer(
-                init_time = current_time,  # block.timestamp in solidity
+                init_time = self.current_time,  # block.timestamp in solidity
                 reward = 0.0,
-                last_reward_time = current_time,
+                last_reward_time = self.current_time,
                 last_claim_time = 0.0
             )
-            print(f"New governer added with address {address}")
+            self.event_sink.emit(events.GovernerAdded, address)
         else:
-            if current_time - self.governers[address].last_reward_time < EPOCH_IN_SECONDS:
-                print(f"Error: Reward already given to governer with address {address} in this epoch")
+            if self.current_time - self.governers[address].last_reward_time < self.epoch_in_seconds:
+                self.event_sink.emit(events.RewardAlreadyGiven, address)
                 return
-            staking_balance = self._get_staking_balance(address, self.staking_addr)
-            reputation_balance = self._get_reputation_balance(address, self.reputation_addr)
-            # TODO: think about the reward formula (# import "abdk-libraries-solidity/ABDKMath64x64.sol"; for log)
-            reward = staking_balance * (1 + math.log(reputation_balance + 1)/100)
-            self.governers[address].reward = reward  # safer, but maybe it will require += reward instead of = reward
-            self.governers[address].last_reward_time = current_time
-            print(f"Reward of {reward} given to governer with address {address}")
+            self.reward = self._governance_reward(address)
+            self.governers[address].reward = self.reward  # safer, but maybe it will require += reward instead of = reward
+            self.governers[address].last_reward_time = self.current_time
+            self.event_sink.emit(events.RewardAdded, address, self.reward)
             
     
     def claim_governance_reward(self, address):  # perhaps can be public
         if self.emergency_pause:
-            print("Emergency pause is active")
+            self.event_sink.emit(events.EmergencyPauseActive)
             return
         
         if address not in self.governers:
-            print(f"Error: Governer with address {address} not found")
+            self.event_sink.emit(events.GovernerNotFound, address)
             return
         
-        current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        self.current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
         
-        if current_time - self.governers[address].last_claim_time < EPOCH_IN_SECONDS:
-            print(f"Error: Reward already claimed by governer with address {address} in this epoch")
+        if self.current_time - self.governers[address].last_claim_time < self.epoch_in_seconds:
+            self.event_sink.emit(events.RewardAlreadyClaimed, address)
             return
         
-        reward = self.governers[address].reward
+        self.reward = self.governers[address].reward
         
-        if reward <= 0:
-            print(f"Error: No reward to claim for governer with address {address}")
+        if self.reward <= 0:
+            self.event_sink.emit(events.NoRewardToClaim, address)
             return
         
+        if self._forks:
+            self._keep_rows_in_forks(address)
         self.governers[address].reward = 0.0
-        self.governers[address].last_claim_time = current_time
-        print(f"Reward of {reward} claimed by governer with address {address}")
+        self.governers[address].last_claim_time = self.current_time
+        self.event_sink.emit(events.RewardClaimed, address, self.reward)
         
     
     # TODO: potentially we can combine add_governance_reward and claim_governance_reward
     # into one public user function so that user will pay gas instead of the contract owner
     # but it it will need to make manually on a weekly basis, so not to lose the reward (discuss with the team)
+
+    # batch functions (weekly operator run, no solidity counterpart)
+    # rows are applied in order, so repeated addresses behave exactly like
+    # consecutive scalar calls; outcomes are returned as (statuses, rewards)
+    def distribute_epoch(self, addresses):
+        rewards = [0.0] * len(addresses)
+        if self.emergency_pause:
+            return array("b", [STATUS_EMERGENCY_PAUSE]) * len(addresses), rewards
+
+        current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        statuses = array("b", bytes(len(addresses)))
+        governers = self.governers
+        epoch_in_seconds = self.epoch_in_seconds
+        keep_rows = self._keep_rows_in_forks if self._forks else None
+        eligible = []  # rows that get a reward this epoch
+        for i, address in enumerate(addresses):
+            governer = governers.get(address)
+            if governer is None:
+                if keep_rows:
+                    keep_rows(address)
+                governers[address] = Governer(
+                    init_time=current_time,
+                    reward=0.0,
+                    last_reward_time=current_time,
+                    last_claim_time=0.0,
+                )
+                statuses[i] = STATUS_GOVERNER_ADDED
+            elif current_time - governer.last_reward_time < epoch_in_seconds:
+                statuses[i] = STATUS_REWARD_ALREADY_GIVEN
+            else:
+                if keep_rows:
+                    keep_rows(address)
+                governer.last_reward_time = current_time
+                eligible.append(i)
+
+        eligible_addresses = [addresses[i] for i in eligible]
+        staking_balances = self._get_staking_balances(
+            eligible_addresses, self.staking_addr
+        )
+        reputation_balances = self._get_reputation_balances(
+            eligible_addresses, self.reputation_addr
+        )
+        if self.fixed_point:
+            eligible_rewards = abdk_math.governance_rewards(
+                [int(balance) for balance in staking_balances],
+                [int(balance) for balance in reputation_balances],
+            )
+        else:
+            log = math.log
+            eligible_rewards = [
+                staking_balance * (1 + log(reputation_balance + 1)/100)
+                for staking_balance, reputation_balance in zip(
+                    staking_balances, reputation_balances
+                )
+            ]
+        for i, address, reward in zip(eligible, eligible_addresses, eligible_rewards):
+            governers[address].reward = reward
+            rewards[i] = reward
+        return statuses, rewards
+
+    def claim_many(self, addresses):
+        rewards = [0.0] * len(addresses)
+        if self.emergency_pause:
+            return array("b", [STATUS_EMERGENCY_PAUSE]) * len(addresses), rewards
+
+        current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        statuses = array("b", bytes(len(addresses)))
+        governers = self.governers
+        epoch_in_seconds = self.epoch_in_seconds
+        keep_rows = self._keep_rows_in_forks if self._forks else None
+        for i, address in enumerate(addresses):
+            governer = governers.get(address)
+            if governer is None:
+                statuses[i] = STATUS_GOVERNER_NOT_FOUND
+            elif current_time - governer.last_claim_time < epoch_in_seconds:
+                statuses[i] = STATUS_REWARD_ALREADY_CLAIMED
+            elif governer.reward <= 0:
+                statuses[i] = STATUS_NO_REWARD
+            else:
+                if keep_rows:
+                    keep_rows(address)
+                rewards[i] = governer.reward
+                governer.reward = 0.0
+                governer.last_claim_time = current_time
+        return statuses, rewards
+
+    # projections (dashboards, no solidity counterpart)
+    def project_governance_reward(self, address, at_time=None):
+        # (status, reward) add_governance_reward(address) would give at
+        # `at_time` (defaults to BLOCK_TIMESTAMP) with the current balances,
+        # without changing any state. The reward is memoized together with
+        # the epoch of `at_time` and the balances it was computed from, so
+        # a balance change within the epoch is never served stale.
+        if self.emergency_pause:
+            return STATUS_EMERGENCY_PAUSE, 0.0
+        if address not in self.governers:
+            return STATUS_GOVERNER_ADDED, 0.0
+        governer = self.get_governer(address)
+        if at_time is None:
+            at_time = BLOCK_TIMESTAMP
+        if at_time - governer.last_reward_time < self.epoch_in_seconds:
+            return STATUS_REWARD_ALREADY_GIVEN, 0.0
+        key = (
+            at_time // self.epoch_in_seconds,
+            self._get_staking_balance(address, self.staking_addr),
+            self._get_reputation_balance(address, self.reputation_addr),
+        )
+        projection = self.projections.get(address)
+        if projection is None or projection[0] != key:
+            projection = (key, self._reward_of_balances(*key[1:]))
+            self.projections.put(address, projection)
+        return STATUS_OK, projection[1]
+
+    def invalidate_projections(self, addresses=None):  # all if addresses is None
+        if addresses is None:
+            self.projections.clear()
+            return
+        for address in addresses:
+            self.projections.pop(address)
+
+    # what-if analysis (no solidity counterpart)
+    def _keep_rows_in_forks(self, address):
+        # called before the row of `address` is written or added while
+        # forks are alive (`if self._forks:`)
+        self._forks = keep_rows(self._forks, address)
+
+    def fork(self):
+        # copy-on-write copy, governers are shared until either side changes
+        # them (see Staking.fork())
+        forked = copy.copy(self)
+        forked.governers = CopyOnWriteBook(self.governers)
+        forked._forks = []
+        self._forks.append(weakref.ref(forked.governers))
+        forked.projections = LruCache(self.projections.maxsize)
+        return forked
+
+    # chain mirror (state from the contract's event logs, no solidity counterpart)
+    def apply_reward_added(self, address, reward):  # RewardAdded
+        # the contract rewrites the whole Governer struct
+        current_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        if self._forks:
+            self._keep_rows_in_forks(address)
+        self.governers[address] = Governer(
+            init_time=current_time,
+            reward=reward,
+            last_reward_time=current_time,
+            last_claim_time=0,
+        )
+
+    def apply_reward_claimed(self, address):  # GovernanceTokenClaim
+        governer = self.governers.get(address)
+        if governer is None:
+            return False
+        if self._forks:
+            self._keep_rows_in_forks(address)
+        governer.reward = 0.0
+        governer.last_claim_time = BLOCK_TIMESTAMP  # block.timestamp in solidity
+        return True
             
 
 # Test
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+
+
+class LruCache:
+    """
+    Bounded mapping that evicts the least recently used entry once it holds
+    `maxsize` entries. get() counts as a use; pop() drops a single entry,
+    e.g. when the row it was computed from changes.
+    Every operation runs under one lock, so the cache can be shared by
+    threads: put() is an insert, a move and an eviction that another
+    thread's pop() must not interleave with.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            entries = self._entries
+            entries[key] = value
+            entries.move_to_end(key)
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def pop_many(self, keys):
+        keys = list(keys)  # consumed outside the lock
+        with self._lock:
+            entries = self._entries
+            for key in keys:
+                entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,180 @@
+from bisect import bisect_left, insort
+
+
+class MaturityIndex:
+    """
+    Stakes bucketed by the epoch of their end time (start_time + lock_duration).
+    Each bucket keeps its members with their end times and the running
+    lock_amount + reward due, and the bucket keys are kept sorted, so range
+    queries only touch the buckets they overlap.
+    Addresses that were never added (e.g. stakes written straight into
+    Staking.stakes) are ignored by add_liability and remove, which return
+    whether the address was tracked.
+    After defer_rebuild(stakes) updates are skipped and the index is rebuilt
+    from the stake book on the first query instead.
+    """
+
+    def __init__(self, epoch_in_seconds):
+        self.epoch_in_seconds = epoch_in_seconds
+        self._epochs = []  # sorted bucket keys (end_time // epoch_in_seconds)
+        self._members = {}  # bucket key -> {address: end_time}
+        self._liability = {}  # bucket key -> lock_amount + reward due
+        self._pending = None  # stake book to rebuild from on first query
+
+    def __len__(self):
+        self._flush()
+        return sum(map(len, self._members.values()))
+
+    # updates
+    def add(self, address, end_time, liability):
+        if self._pending is not None:
+            return
+        key = end_time // self.epoch_in_seconds
+        bucket = self._members.get(key)
+        if bucket is None:
+            bucket = self._members[key] = {}
+            self._liability[key] = 0
+            insort(self._epochs, key)
+        bucket[address] = end_time
+        self._liability[key] += liability
+
+    def add_liability(self, address, end_time, liability):  # top-ups
+        if self._pending is not None:
+            return True
+        key = end_time // self.epoch_in_seconds
+        bucket = self._members.get(key)
+        if bucket is None or address not in bucket:
+            return False
+        self._liability[key] += liability
+        return True
+
+    def remove(self, address, end_time, liability):
+        if self._pending is not None:
+            return True
+        key = end_time // self.epoch_in_seconds
+        bucket = self._members.get(key)
+        if bucket is None or bucket.pop(address, None) is None:
+            return False
+        if bucket:
+            self._liability[key] -= liability
+        else:
+            del self._members[key]
+            del self._liability[key]
+            del self._epochs[bisect_left(self._epochs, key)]
+        return True
+
+    # batch updates (stake_many / unstake_many): one pass in row order, new
+    # bucket keys are merged into the sorted keys once at the end; both return
+    # the positions of the entries whose address was not tracked
+    def add_many(self, entries):
+        # (address, end_time, liability, new) per row: add() for new rows,
+        # add_liability() otherwise
+        if self._pending is not None:
+            return []
+        epoch_in_seconds = self.epoch_in_seconds
+        members, liabilities = self._members, self._liability
+        untracked, new_keys = [], []
+        for i, (address, end_time, liability, new) in enumerate(entries):
+            key = end_time // epoch_in_seconds
+            bucket = members.get(key)
+            if new:
+                if bucket is None:
+                    bucket = members[key] = {}
+                    liabilities[key] = 0
+                    new_keys.append(key)
+                bucket[address] = end_time
+            elif bucket is None or address not in bucket:
+                untracked.append(i)
+                continue
+            liabilities[key] += liability
+        if new_keys:
+            self._epochs.extend(new_keys)
+            self._epochs.sort()
+        return untracked
+
+    def remove_many(self, entries):  # remove() of (address, end_time, liability)
+        if self._pending is not None:
+            return []
+        epoch_in_seconds = self.epoch_in_seconds
+        members, liabilities = self._members, self._liability
+        untracked = []
+        emptied = False
+        for i, (address, end_time, liability) in enumerate(entries):
+            key = end_time // epoch_in_seconds
+            bucket = members.get(key)
+            if bucket is None or bucket.pop(address, None) is None:
+                untracked.append(i)
+            elif bucket:
+                liabilities[key] -= liability
+            else:
+                del members[key]
+                del liabilities[key]
+                emptied = True
+        if emptied:
+            self._epochs = [key for key in self._epochs if key in members]
+        return untracked
+
+    def clear(self):
+        self._pending = None
+        self._epochs.clear()
+        self._members.clear()
+        self._liability.clear()
+
+    def rebuild(self, stakes):
+        self.clear()
+        entries = getattr(stakes, "maturity_entries", None)
+        if entries is not None:  # column scan, e.g. ColumnarStakeBook
+            entries = entries()
+        else:
+            entries = (
+                (
+                    address,
+                    stake.start_time + stake.lock_duration,
+                    stake.lock_amount + stake.reward,
+                )
+                for address, stake in stakes.items()
+            )
+        self.add_many(
+            (address, end_time, liability, True)
+            for address, end_time, liability in entries
+        )
+
+    def defer_rebuild(self, stakes):
+        self.clear()
+        self._pending = stakes
+
+    def _flush(self):
+        if self._pending is not None:
+            self.rebuild(self._pending)
+
+    # queries
+    def _keys_between(self, t0, t1):
+        self._flush()
+        lo = bisect_left(self._epochs, t0 // self.epoch_in_seconds)
+        hi = bisect_left(self._epochs, -(-t1 // self.epoch_in_seconds))
+        return self._epochs[lo:hi]
+
+    def maturing_between(self, t0, t1):
+        # addresses with t0 <= end_time < t1, i.e. maturing_between(0, t) are
+        # the stakes that can be unstaked at block.timestamp == t
+        matured = []
+        for key in self._keys_between(t0, t1):
+            bucket = self._members[key]
+            start = key * self.epoch_in_seconds
+            if t0 <= start and start + self.epoch_in_seconds <= t1:
+                matured.extend(bucket)
+            else:
+                matured.extend(a for a, end in bucket.items() if t0 <= end < t1)
+        return matured
+
+    def liability_due(self, epoch_start_time):
+        # lock_amount + reward of the stakes ending in the given epoch
+        self._flush()
+        return self._liability.get(epoch_start_time // self.epoch_in_seconds, 0)
+
+    def liability_schedule(self):
+        # [(epoch_start_time, lock_amount + reward), ...] ordered by epoch
+        self._flush()
+        return [
+            (key * self.epoch_in_seconds, self._liability[key]) for key in self._epochs
+        ]
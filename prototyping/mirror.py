@@ -0,0 +1,331 @@
+"""
+Read replica of the deployed staking and governance contracts, kept in sync
+from their event logs.
+
+An asyncio producer pulls log batches from a source and puts them on a
+bounded queue; when the consumer falls behind the queue fills up and the
+producer waits, so bursts of blocks never buffer more than `queue_size`
+batches. The consumer decodes each batch and applies it to the Staking /
+GovernanceRewarding models, which then answer queries from memory:
+
+    mirror = ChainMirror(staking, governance, checkpoint_path="mirror.json")
+    await mirror.run(JsonLinesSource("logs.jsonl"))
+    staking.get_stake("0x...")
+
+The checkpoint is the last block applied completely. The models themselves
+are not persisted with it (see prototyping.snapshot), and reorgs are not
+handled: mirror finalized blocks only.
+"""
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+
+import prototyping.governance as governance_module
+from prototyping.abi import EventAbi
+
+DEFAULT_QUEUE_SIZE = 8  # batches
+DEFAULT_BATCH_SIZE = 1000  # logs, JsonLinesSource
+DEFAULT_MAX_BLOCKS = 100  # blocks per get_logs call, PollingSource
+
+# utility_stacking.sol
+STAKE_INITIATED = EventAbi(
+    "StakeInitiated",
+    [
+        ("owner", "address", True),
+        ("amount", "uint256", False),
+        ("nextEpoch", "uint256", False),
+        ("epochNum", "uint256", False),  # lock duration in seconds
+        ("reward", "uint256", False),
+    ],
+)
+STAKE_UPDATED = EventAbi(
+    "StakeUpdated",
+    [
+        ("owner", "address", True),
+        ("amount", "uint256", False),
+        ("epoch", "uint256", False),  # the stake's reward
+    ],
+)
+STAKE_EMERGENCY_WITHDRAWN = EventAbi(
+    "StakeEmergencyWithdrawn",
+    [("owner", "address", True), ("amount", "uint256", False)],
+)
+STAKE_REGULAR_WITHDRAWN = EventAbi(
+    "StakeRegularWithdrawn",
+    [
+        ("owner", "address", True),
+        ("amount", "uint256", False),
+        ("reward", "uint256", False),
+    ],
+)
+# governance_rewarding.sol
+REWARD_ADDED = EventAbi(
+    "RewardAdded", [("owner", "address", False), ("amount", "uint256", False)]
+)
+GOVERNANCE_TOKEN_CLAIM = EventAbi(
+    "GovernanceTokenClaim",
+    [("owner", "address", False), ("amount", "uint256", False)],
+)
+
+
+@dataclass
+class Log:  # one eth_getLogs entry
+    block_number: int
+    block_timestamp: int
+    log_index: int
+    address: str  # emitting contract
+    topics: list
+    data: str
+
+    @classmethod
+    def from_json(cls, entry):  # hex quantities, needs "blockTimestamp"
+        return cls(
+            block_number=int(entry["blockNumber"], 16),
+            block_timestamp=int(entry["blockTimestamp"], 16),
+            log_index=int(entry["logIndex"], 16),
+            address=entry["address"].lower(),
+            topics=entry["topics"],
+            data=entry["data"],
+        )
+
+    def to_json(self):
+        return {
+            "blockNumber": hex(self.block_number),
+            "blockTimestamp": hex(self.block_timestamp),
+            "logIndex": hex(self.log_index),
+            "address": self.address,
+            "topics": self.topics,
+            "data": self.data,
+        }
+
+    @classmethod
+    def for_event(cls, event_abi, values, block_number, block_timestamp, **kwargs):
+        # log of an event, e.g. for test sources; kwargs: log_index, address
+        topics, data = event_abi.encode(values)
+        return cls(
+            block_number=block_number,
+            block_timestamp=block_timestamp,
+            log_index=kwargs.get("log_index", 0),
+            address=kwargs.get("address", "0x" + "0" * 40),
+            topics=topics,
+            data=data,
+        )
+
+
+@dataclass
+class LogBatch:
+    last_block: int  # every log up to this block is in this or earlier batches
+    logs: list
+
+
+# sources: batches(from_block) is an async iterator of LogBatch in block order
+class JsonLinesSource:
+    """
+    eth_getLogs entries, one JSON object per line, in block order.
+    Lines are read in a worker thread one batch at a time; a batch holds at
+    least `batch_size` logs (if there are that many) and always ends on a
+    block boundary.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+
+    async def batches(self, from_block=0):
+        reader = self._read(from_block)
+        while True:
+            batch = await asyncio.to_thread(next, reader, None)
+            if batch is None:
+                return
+            yield batch
+
+    def _read(self, from_block):
+        logs = []
+        with open(self.path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                log = Log.from_json(json.loads(line))
+                if log.block_number < from_block:
+                    continue
+                if len(logs) >= self.batch_size and (
+                    log.block_number != logs[-1].block_number
+                ):
+                    yield LogBatch(logs[-1].block_number, logs)
+                    logs = []
+                logs.append(log)
+        if logs:
+            yield LogBatch(logs[-1].block_number, logs)
+
+
+class PollingSource:
+    """
+    Logs fetched from a node in ranges of at most `max_blocks` blocks.
+    `node` provides async block_number() and get_logs(from_block, to_block)
+    (eth_getLogs entries); the head is polled every `poll_interval` seconds
+    once the source has caught up. Stops after `until_block` if given.
+    """
+
+    def __init__(
+        self, node, max_blocks=DEFAULT_MAX_BLOCKS, poll_interval=1.0, until_block=None
+    ):
+        self.node = node
+        self.max_blocks = max_blocks
+        self.poll_interval = poll_interval
+        self.until_block = until_block
+
+    async def batches(self, from_block=0):
+        next_block = from_block
+        while self.until_block is None or next_block <= self.until_block:
+            head = await self.node.block_number()
+            if self.until_block is not None:
+                head = min(head, self.until_block)
+            if next_block > head:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            to_block = min(head, next_block + self.max_blocks - 1)
+            entries = await self.node.get_logs(next_block, to_block)
+            yield LogBatch(to_block, [Log.from_json(entry) for entry in entries])
+            next_block = to_block + 1
+
+
+@dataclass
+class MirrorStats:
+    batches: int = field(default=0)
+    logs_applied: int = field(default=0)
+    logs_ignored: int = field(default=0)  # other contracts or events
+    logs_skipped: int = field(default=0)  # at or before the checkpoint
+    max_queue_depth: int = field(default=0)
+
+
+class ChainMirror:
+    """
+    Applies contract event logs to a Staking and (optionally) a
+    GovernanceRewarding instance. Logs are matched by event topic, and by
+    emitting contract when the contract addresses are given.
+    """
+
+    def __init__(
+        self,
+        staking,
+        governance=None,
+        staking_address=None,
+        governance_address=None,
+        checkpoint_path=None,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ):
+        self.staking = staking
+        self.governance = governance
+        self.checkpoint_path = checkpoint_path
+        self.queue_size = queue_size
+        self.checkpoint = None  # last block applied completely
+        self.stats = MirrorStats()
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as file:
+                self.checkpoint = json.load(file)["block"]
+
+        handlers = [
+            (staking_address, STAKE_INITIATED, self._on_stake_initiated),
+            (staking_address, STAKE_UPDATED, self._on_stake_updated),
+            (staking_address, STAKE_EMERGENCY_WITHDRAWN, self._on_stake_withdrawn),
+            (staking_address, STAKE_REGULAR_WITHDRAWN, self._on_stake_withdrawn),
+        ]
+        if governance is not None:
+            handlers += [
+                (governance_address, REWARD_ADDED, self._on_reward_added),
+                (governance_address, GOVERNANCE_TOKEN_CLAIM, self._on_reward_claimed),
+            ]
+        self._handlers = {  # topic -> (contract address or None, abi, handler)
+            event_abi.topic: (address and address.lower(), event_abi, handler)
+            for address, event_abi, handler in handlers
+        }
+
+    # pipeline
+    async def run(self, source):
+        # until the source is exhausted, from the block after the checkpoint
+        from_block = 0 if self.checkpoint is None else self.checkpoint + 1
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        producer = asyncio.create_task(self._produce(source, from_block, queue))
+        try:
+            while True:
+                self.stats.max_queue_depth = max(
+                    self.stats.max_queue_depth, queue.qsize()
+                )
+                batch = await queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                self.apply_batch(batch)
+                await asyncio.sleep(0)  # let the producer refill the queue
+        finally:
+            producer.cancel()
+        return self.stats
+
+    async def _produce(self, source, from_block, queue):
+        try:
+            async for batch in source.batches(from_block):
+                await queue.put(batch)  # waits while the queue is full
+        except Exception as error:  # handed over to run()
+            await queue.put(error)
+        else:
+            await queue.put(None)
+
+    def apply_batch(self, batch):
+        stats = self.stats
+        checkpoint = -1 if self.checkpoint is None else self.checkpoint
+        handlers = self._handlers
+        block_timestamp = None
+        for log in batch.logs:
+            if log.block_number <= checkpoint:
+                stats.logs_skipped += 1
+                continue
+            handler = handlers.get(log.topics[0]) if log.topics else None
+            if handler is None or (handler[0] and handler[0] != log.address):
+                stats.logs_ignored += 1
+                continue
+            if log.block_timestamp != block_timestamp:
+                block_timestamp = log.block_timestamp
+                self.staking.block_timestamp.set_timestamp(block_timestamp)
+                governance_module.BLOCK_TIMESTAMP = block_timestamp
+            _, event_abi, apply = handler
+            apply(event_abi.decode(log.topics, log.data))
+            stats.logs_applied += 1
+        stats.batches += 1
+        if batch.last_block > checkpoint:
+            self.checkpoint = batch.last_block
+            self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        if self.checkpoint_path is None:
+            return
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump({"block": self.checkpoint}, file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    # event handlers
+    def _on_stake_initiated(self, values):
+        self.staking.apply_stake_initiated(
+            values["owner"],
+            values["amount"],
+            values["nextEpoch"],
+            values["epochNum"],
+            values["reward"],
+        )
+
+    def _on_stake_updated(self, values):
+        self.staking.apply_stake_updated(
+            values["owner"], values["amount"], values["epoch"]
+        )
+
+    def _on_stake_withdrawn(self, values):  # emergency or regular
+        self.staking.apply_stake_withdrawn(values["owner"])
+
+    def _on_reward_added(self, values):
+        self.governance.apply_reward_added(values["owner"], values["amount"])
+
+    def _on_reward_claimed(self, values):
+        self.governance.apply_reward_claimed(values["owner"])
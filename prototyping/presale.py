@@ -0,0 +1,601 @@
+"""
+Presale (contracts/presale.sol) for launch load tests.
+
+Presale keeps the contract's accounting: stages (`presale[id]`) with their
+price, Sold, tokensToSell and amountRaised, the per-buyer, per-stage
+`userClaimData`, `isExist` / `uniqueBuyers`, pauses and the blacklist. The
+ETH price comes from a price feed object with latest_round_data() like the
+Chainlink aggregator; StubPriceFeed returns a fixed answer.
+
+Buyers are numbered in order of their first purchase. Per-stage amounts are
+kept in typed columns indexed by that number, so a million buyers cost a few
+bytes each instead of a dict of structs per buyer and stage.
+
+On chain tokensToSell is never set and a stage runs until the owner calls
+setPresaleStage(). Here a stage created with `tokens_to_sell` rolls over to
+the next stage as soon as its Sold reaches that amount, as the owner would
+do; the order that crosses the cap is filled completely, because the
+contract does not cap orders.
+
+    feed = StubPriceFeed(3000 * 10**8)
+    presale = Presale(feed, usdc_addr="0x2", sale_token_addr="0x3")
+    for price, supply in stages:
+        presale.create_presale(price, tokens_to_sell=supply)
+    presale.set_presale_stage(1)
+    result = run_launch(presale, generate_orders(buyers=10**6))
+"""
+
+import itertools
+import random
+import time
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field
+
+from prototyping import events
+from prototyping.staking import BlockTimestamp
+
+ETH_MULTIPLIER = 10**18
+USDC_MULTIPLIER = 10**6
+_ETH_SCALE = ETH_MULTIPLIER * ETH_MULTIPLIER  # wei * price (18 decimals)
+DEFAULT_BLOCK_TIME = 12  # seconds
+
+# per-order statuses returned by the batch functions (buy_many, claim_many)
+STATUS_OK = 0
+STATUS_INVALID_PRESALE_ID = 1
+STATUS_NOT_ACTIVE = 2
+STATUS_INVALID_AMOUNT = 3  # buys no tokens
+STATUS_PAUSED = 4
+STATUS_BLACKLISTED = 5
+STATUS_NOT_PARTICIPANT = 6
+STATUS_NOTHING_TO_CLAIM = 7
+STATUS_NO_SALE_TOKEN = 8
+STATUS_INSUFFICIENT_TOKENS = 9  # contract holds less than the claim
+STATUS_CLAIM_DISABLED = 10
+
+REVERT_REASONS = {  # require() messages in solidity
+    STATUS_INVALID_PRESALE_ID: "Invalid presale id",
+    STATUS_NOT_ACTIVE: "presale not Active",
+    STATUS_INVALID_AMOUNT: "Invalid sale amount",
+    STATUS_PAUSED: "Presale paused",
+    STATUS_BLACKLISTED: "Account is blackListed",
+    STATUS_NOT_PARTICIPANT: "User not a participant",
+    STATUS_NOTHING_TO_CLAIM: "Nothing to claim",
+    STATUS_NO_SALE_TOKEN: "Presale token address not set",
+    STATUS_INSUFFICIENT_TOKENS: "Not enough tokens in the contract",
+    STATUS_CLAIM_DISABLED: "Claim is not enable",
+}
+
+# token amounts are uint256 and exceed 2**64 in wei, so they are split into
+# two unsigned 64-bit columns (hi, lo) like ColumnarStakeBook does
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+
+
+class StubPriceFeed:
+    """
+    Aggregator stand-in: latestRoundData() with a fixed ETH / USD answer
+    (8 decimals, e.g. 3000 * 10**8); set_answer() starts a new round.
+    """
+
+    def __init__(self, answer, updated_at=0):
+        self.answer = answer
+        self.round_id = 1
+        self.updated_at = updated_at
+
+    def set_answer(self, answer, updated_at=0):
+        self.answer = answer
+        self.round_id += 1
+        self.updated_at = updated_at
+
+    def latest_round_data(self):
+        # (roundId, answer, startedAt, updatedAt, answeredInRound)
+        updated_at = self.updated_at
+        return self.round_id, self.answer, updated_at, updated_at, self.round_id
+
+
+@dataclass
+class PresaleData:  # struct PresaleData
+    start_time: int = field(default=0)
+    end_time: int = field(default=0)
+    price: int = field(default=0)  # tokens (wei) per whole USDC
+    sold: int = field(default=0)
+    tokens_to_sell: int = field(default=0)  # 0: no cap (as on chain)
+    amount_raised: int = field(default=0)  # USDC units
+    active: bool = field(default=False)
+    is_enable_claim: bool = field(default=False)
+
+
+@dataclass
+class UserData:  # struct UserData
+    invested_amount: int = field(default=0)  # USDC units
+    claim_at: int = field(default=0)  # never written by the contract
+    claimable_amount: int = field(default=0)
+
+
+class _StageLedger:
+    """
+    userClaimData[*][id] of one stage, one slot per buyer number.
+    Columns grow on demand, so stages only pay for buyers up to the highest
+    number that bought in them.
+    """
+
+    def __init__(self):
+        self.invested = array("Q")
+        self.tokens_hi = array("Q")
+        self.tokens_lo = array("Q")
+
+    def grow(self, buyer):  # room for buyer numbers up to `buyer`
+        missing = max(buyer + 1 - len(self.invested), len(self.invested))
+        zeros = array("Q", bytes(8 * missing))
+        self.invested += zeros
+        self.tokens_hi += zeros
+        self.tokens_lo += zeros
+
+    def get(self, buyer):  # (invested, claimable tokens)
+        if buyer >= len(self.invested):
+            return 0, 0
+        tokens = (self.tokens_hi[buyer] << _WORD_BITS) | self.tokens_lo[buyer]
+        return self.invested[buyer], tokens
+
+    def set(self, buyer, invested, tokens):
+        if buyer >= len(self.invested):
+            self.grow(buyer)
+        self.invested[buyer] = invested
+        self.tokens_hi[buyer] = tokens >> _WORD_BITS
+        self.tokens_lo[buyer] = tokens & _WORD_MASK
+
+
+class Presale:
+
+    # deployer functions
+    def __init__(
+        self,
+        price_feed,  # latest_round_data() like the Chainlink aggregator
+        usdc_addr,
+        sale_token_addr,
+        fund_receiver="0x0",  # msg.sender of the deployment
+        sale_token_balance=0,  # SaleToken.balanceOf(this), funded for claims
+        block_timestamp=None,  # for testing purposes only
+        event_sink=None,  # see prototyping.events (defaults to printing to stdout)
+    ):
+        self.price_feed = price_feed
+        self.usdc_addr = usdc_addr
+        self.sale_token_addr = sale_token_addr
+        self.fund_receiver = fund_receiver
+        self.sale_token_balance = sale_token_balance
+        self.presale = {}  # id -> PresaleData
+        self.presale_id = 0
+        self.current_sale = 0
+        self.paused = set()  # presale ids
+        self.overall_raised = 0  # USDC units
+        self.unique_buyers = 0
+        self.received_wei = 0  # forwarded to fund_receiver
+        self.received_usdc = 0
+        self.blacklist = set()
+        self._buyer_numbers = {}  # address -> buyer number
+        self._is_exist = bytearray()  # by buyer number
+        self._ledgers = {}  # presale id -> _StageLedger
+        self.event_sink = event_sink if event_sink is not None else events.PrintSink()
+        self.block_timestamp = block_timestamp or BlockTimestamp(
+            int(time.time())
+        )  # for testing purposes only (not needed in actual implementation)
+
+    # owner functions (onlyOwner functions in solidity)
+    def create_presale(self, price, tokens_to_sell=0):  # returns the presale id
+        if price <= 0:
+            self.event_sink.emit(events.PresaleCallReverted, "Zero price")
+            return 0
+        self.presale_id += 1
+        self.presale[self.presale_id] = PresaleData(
+            price=price, tokens_to_sell=tokens_to_sell
+        )
+        self.event_sink.emit(events.PresaleCreated, self.presale_id)
+        return self.presale_id
+
+    def set_presale_stage(self, presale_id):
+        if self._price(presale_id) <= 0:
+            self.event_sink.emit(events.PresaleCallReverted, "Invalid presale ID")
+            return
+        current_time = self.block_timestamp.timestamp  # solidity: block.timestamp
+        if self.current_sale != 0:
+            self.presale[self.current_sale].end_time = current_time
+            self.presale[self.current_sale].active = False
+        self.presale[presale_id].start_time = current_time
+        self.presale[presale_id].active = True
+        self.current_sale = presale_id
+        self.event_sink.emit(events.PresaleStageSet, presale_id)
+
+    def enable_claim(self, presale_id, status):
+        self.presale.setdefault(presale_id, PresaleData()).is_enable_claim = status
+
+    def update_presale(self, presale_id, price, is_claimable):
+        if price <= 0:
+            self.event_sink.emit(events.PresaleCallReverted, "Zero price")
+            return
+        data = self.presale.setdefault(presale_id, PresaleData())
+        data.price = price
+        data.is_enable_claim = is_claimable
+
+    def pause_presale(self, presale_id):
+        if presale_id <= 0 or presale_id != self.current_sale:
+            self.event_sink.emit(events.PresaleCallReverted, "Invalid presale id")
+        elif presale_id in self.paused:
+            self.event_sink.emit(events.PresaleCallReverted, "Already paused")
+        else:
+            self.paused.add(presale_id)
+            self.event_sink.emit(events.PresalePaused, presale_id)
+
+    def unpause_presale(self, presale_id):
+        if presale_id <= 0 or presale_id != self.current_sale:
+            self.event_sink.emit(events.PresaleCallReverted, "Invalid presale id")
+        elif presale_id not in self.paused:
+            self.event_sink.emit(events.PresaleCallReverted, "Not paused")
+        else:
+            self.paused.discard(presale_id)
+            self.event_sink.emit(events.PresaleUnpaused, presale_id)
+
+    def blacklist_user(self, address, value):
+        if value:
+            self.blacklist.add(address)
+        else:
+            self.blacklist.discard(address)
+
+    def change_claim_address(self, old_address, new_address):
+        if not old_address or not new_address:
+            self.event_sink.emit(events.PresaleCallReverted, "Invalid addresses")
+            return
+        if old_address == new_address:
+            self.event_sink.emit(events.PresaleCallReverted, "Addresses are the same")
+            return
+        old = self._buyer_numbers.get(old_address)
+        # as on chain the loop stops before the last presale id, and an
+        # unknown old address only reverts when there is a presale to move
+        if self.presale_id > 1 and (old is None or not self._is_exist[old]):
+            self.event_sink.emit(events.PresaleCallReverted, "User not a participant")
+            return
+        new = self._buyer_number(new_address)
+        old = self._buyer_number(old_address)
+        for presale_id in range(1, self.presale_id):
+            ledger = self._ledger(presale_id)
+            _, tokens = ledger.get(old)
+            new_invested, _ = ledger.get(new)
+            ledger.set(new, new_invested, tokens)
+            old_invested, _ = ledger.get(old)
+            ledger.set(old, old_invested, 0)
+        self._is_exist[old] = 0
+        self._is_exist[new] = 1
+
+    # getter functions (view functions in solidity)
+    def get_latest_price(self):  # USD per ETH, 18 decimals
+        _, answer, _, _, _ = self.price_feed.latest_round_data()
+        return answer * 10**10
+
+    def usdc_to_tokens(self, presale_id, amount):
+        return amount * self._price(presale_id) // USDC_MULTIPLIER
+
+    def eth_to_tokens(self, presale_id, amount):
+        return self.usdc_to_tokens(presale_id, self._wei_to_usdc(amount))
+
+    def is_exist(self, address):
+        buyer = self._buyer_numbers.get(address)
+        return buyer is not None and bool(self._is_exist[buyer])
+
+    def user_claim_data(self, address, presale_id):
+        buyer = self._buyer_numbers.get(address)
+        ledger = self._ledgers.get(presale_id)
+        if buyer is None or ledger is None:
+            return UserData()
+        invested, tokens = ledger.get(buyer)
+        return UserData(invested_amount=invested, claimable_amount=tokens)
+
+    def claimable_amount(self, address, presale_id):
+        return self.user_claim_data(address, presale_id).claimable_amount
+
+    # util functions
+    def _price(self, presale_id):
+        data = self.presale.get(presale_id)
+        return 0 if data is None else data.price
+
+    def _wei_to_usdc(self, amount, latest_price=None):
+        if latest_price is None:
+            latest_price = self.get_latest_price()
+        return amount * latest_price * USDC_MULTIPLIER // _ETH_SCALE
+
+    def _ledger(self, presale_id):
+        ledger = self._ledgers.get(presale_id)
+        if ledger is None:
+            ledger = self._ledgers[presale_id] = _StageLedger()
+        return ledger
+
+    def _buyer_number(self, address):
+        buyer = self._buyer_numbers.get(address)
+        if buyer is None:
+            buyer = len(self._buyer_numbers)
+            self._buyer_numbers[address] = buyer
+            self._is_exist.append(0)
+        return buyer
+
+    def _check_sale(self, address, tokens, with_eth):
+        # modifiers and require()s of buyWithUSDC / buyWithEth, in order
+        sale = self.current_sale
+        if sale <= 0:
+            return STATUS_INVALID_PRESALE_ID
+        if not self.presale[sale].active:
+            return STATUS_NOT_ACTIVE
+        if tokens <= 0:
+            return STATUS_INVALID_AMOUNT
+        if with_eth and address in self.blacklist:  # checked first for ETH
+            return STATUS_BLACKLISTED
+        if sale in self.paused:
+            return STATUS_PAUSED
+        if address in self.blacklist:
+            return STATUS_BLACKLISTED
+        return STATUS_OK
+
+    def _record_sale(self, address, tokens, usdc_amount):
+        data = self.presale[self.current_sale]
+        buyer = self._buyer_number(address)
+        if not self._is_exist[buyer]:
+            self._is_exist[buyer] = 1
+            self.unique_buyers += 1
+        data.sold += tokens
+        data.amount_raised += usdc_amount
+        self.overall_raised += usdc_amount
+        ledger = self._ledger(self.current_sale)
+        invested, claimable = ledger.get(buyer)
+        if claimable > 0:
+            ledger.set(buyer, invested + usdc_amount, claimable + tokens)
+        else:  # the contract overwrites the struct
+            ledger.set(buyer, usdc_amount, tokens)
+        self._roll_over_if_sold_out()
+
+    def _roll_over_if_sold_out(self):
+        data = self.presale[self.current_sale]
+        if 0 < data.tokens_to_sell <= data.sold:
+            if self.current_sale + 1 in self.presale:
+                self.set_presale_stage(self.current_sale + 1)
+            else:  # last stage, closed like setPresaleStage() would
+                data.end_time = self.block_timestamp.timestamp
+                data.active = False
+
+    # main functions (public functions in solidity)
+    def buy_with_usdc(self, address, usdc_amount):  # returns the tokens bought
+        tokens = self.usdc_to_tokens(self.current_sale, usdc_amount)
+        status = self._check_sale(address, tokens, with_eth=False)
+        if status != STATUS_OK:
+            self.event_sink.emit(events.PresaleCallReverted, REVERT_REASONS[status])
+            return 0
+        #  TODO: USDC allowance and transferFrom to fund_receiver
+        sale = self.current_sale
+        self.received_usdc += usdc_amount
+        self._record_sale(address, tokens, usdc_amount)
+        self.event_sink.emit(
+            events.TokensBought, address, sale, False, tokens, usdc_amount
+        )
+        return tokens
+
+    def buy_with_eth(self, address, wei_amount):  # returns the tokens bought
+        usdc_amount = self._wei_to_usdc(wei_amount)
+        tokens = self.usdc_to_tokens(self.current_sale, usdc_amount)
+        status = self._check_sale(address, tokens, with_eth=True)
+        if status != STATUS_OK:
+            self.event_sink.emit(events.PresaleCallReverted, REVERT_REASONS[status])
+            return 0
+        sale = self.current_sale
+        self.received_wei += wei_amount
+        self._record_sale(address, tokens, usdc_amount)
+        self.event_sink.emit(
+            events.TokensBought, address, sale, True, tokens, wei_amount
+        )
+        return tokens
+
+    def claim_amount(self, address, presale_id):  # returns the tokens claimed
+        status, amount = self._check_claim(address, presale_id)
+        if status != STATUS_OK:
+            self.event_sink.emit(events.PresaleCallReverted, REVERT_REASONS[status])
+            return 0
+        self._pay_claim(address, presale_id, amount)
+        self.event_sink.emit(events.TokensClaimed, address, presale_id, amount)
+        return amount
+
+    def _check_claim(self, address, presale_id):
+        if not self.is_exist(address):
+            return STATUS_NOT_PARTICIPANT, 0
+        amount = self.claimable_amount(address, presale_id)
+        if amount <= 0:
+            return STATUS_NOTHING_TO_CLAIM, 0
+        if address in self.blacklist:
+            return STATUS_BLACKLISTED, 0
+        if not self.sale_token_addr:
+            return STATUS_NO_SALE_TOKEN, 0
+        if amount > self.sale_token_balance:
+            return STATUS_INSUFFICIENT_TOKENS, 0
+        if not self.presale[presale_id].is_enable_claim:
+            return STATUS_CLAIM_DISABLED, 0
+        return STATUS_OK, amount
+
+    def _pay_claim(self, address, presale_id, amount):
+        self.sale_token_balance -= amount
+        ledger = self._ledger(presale_id)
+        buyer = self._buyer_numbers[address]
+        invested, _ = ledger.get(buyer)
+        ledger.set(buyer, invested, 0)
+
+    # batch functions (launch load tests, no solidity counterpart)
+    # orders are applied in order within one block, exactly like consecutive
+    # scalar calls (including stage rollovers); outcomes are returned as
+    # (statuses, tokens)
+    def buy_many(self, addresses, amounts, with_eth=None):
+        # with_eth: per-order flags, all orders are paid in USDC if None
+        statuses = array("b", bytes(len(addresses)))
+        bought = [0] * len(addresses)
+        if with_eth is None:
+            with_eth = itertools.repeat(False)
+        eth_to_usdc = self.get_latest_price() * USDC_MULTIPLIER
+        blacklist = self.blacklist
+        buyer_numbers = self._buyer_numbers
+        is_exist = self._is_exist
+        new_buyers = received_wei = received_usdc = 0
+        sale = None
+        orders = zip(addresses, amounts, with_eth)
+        for i, (address, amount, eth) in enumerate(orders):
+            if sale != self.current_sale:  # first order or after a rollover
+                sale = self.current_sale
+                data = self.presale.get(sale)
+                refusal = None
+                if sale <= 0:
+                    refusal = STATUS_INVALID_PRESALE_ID
+                elif not data.active:
+                    refusal = STATUS_NOT_ACTIVE
+                else:
+                    ledger = self._ledger(sale)
+                    price, cap = data.price, data.tokens_to_sell
+                    paused = sale in self.paused
+                    sold = raised = 0  # added to data at a rollover and at the end
+            if refusal is not None:
+                statuses[i] = refusal
+                continue
+            usdc_amount = amount * eth_to_usdc // _ETH_SCALE if eth else amount
+            tokens = usdc_amount * price // USDC_MULTIPLIER
+            if tokens <= 0:
+                statuses[i] = STATUS_INVALID_AMOUNT
+                continue
+            if eth and address in blacklist:  # checked first for ETH
+                statuses[i] = STATUS_BLACKLISTED
+                continue
+            if paused:
+                statuses[i] = STATUS_PAUSED
+                continue
+            if address in blacklist:
+                statuses[i] = STATUS_BLACKLISTED
+                continue
+
+            buyer = buyer_numbers.get(address)
+            if buyer is None:
+                buyer = buyer_numbers[address] = len(buyer_numbers)
+                is_exist.append(1)
+                new_buyers += 1
+            elif not is_exist[buyer]:
+                is_exist[buyer] = 1
+                new_buyers += 1
+            if buyer >= len(ledger.invested):
+                ledger.grow(buyer)
+            tokens_hi, tokens_lo = ledger.tokens_hi, ledger.tokens_lo
+            claimable = (tokens_hi[buyer] << _WORD_BITS) | tokens_lo[buyer]
+            if claimable > 0:
+                ledger.invested[buyer] += usdc_amount
+                claimable += tokens
+            else:  # the contract overwrites the struct
+                ledger.invested[buyer] = usdc_amount
+                claimable = tokens
+            tokens_hi[buyer] = claimable >> _WORD_BITS
+            tokens_lo[buyer] = claimable & _WORD_MASK
+            if eth:
+                received_wei += amount
+            else:
+                received_usdc += amount
+            bought[i] = tokens
+            sold += tokens
+            raised += usdc_amount
+            if cap and data.sold + sold >= cap:
+                data.sold += sold
+                data.amount_raised += raised
+                self.overall_raised += raised
+                sold = raised = 0
+                self._roll_over_if_sold_out()  # next stage, or closes the last
+                sale = None
+        if refusal is None and sale is not None:
+            data.sold += sold
+            data.amount_raised += raised
+            self.overall_raised += raised
+        self.unique_buyers += new_buyers
+        self.received_wei += received_wei
+        self.received_usdc += received_usdc
+        return statuses, bought
+
+    def claim_many(self, addresses, presale_id):
+        statuses = array("b", bytes(len(addresses)))
+        claimed = [0] * len(addresses)
+        for i, address in enumerate(addresses):
+            status, amount = self._check_claim(address, presale_id)
+            statuses[i] = status
+            if status == STATUS_OK:
+                self._pay_claim(address, presale_id, amount)
+                claimed[i] = amount
+        return statuses, claimed
+
+
+# launch replay (no solidity counterpart)
+@dataclass
+class PresaleOrder:
+    time: int  # block timestamp
+    address: str
+    amount: int  # wei or USDC units
+    with_eth: bool = field(default=False)
+
+
+@dataclass
+class LaunchResult:
+    orders: int = field(default=0)
+    orders_filled: int = field(default=0)
+    rejections: Counter = field(default_factory=Counter)  # status -> count
+    tokens_sold: int = field(default=0)
+    usdc_raised: int = field(default=0)  # overalllRaised, USDC units
+    unique_buyers: int = field(default=0)
+    # (presale id, start time, end time or None) in stage order
+    stage_times: list = field(default_factory=list)
+
+
+def run_launch(presale, orders):
+    # applies time-ordered orders block by block, one buy_many call per block
+    result = LaunchResult()
+    for block_time, block in itertools.groupby(orders, key=lambda order: order.time):
+        presale.block_timestamp.set_timestamp(block_time)
+        block = list(block)
+        statuses, bought = presale.buy_many(
+            [order.address for order in block],
+            [order.amount for order in block],
+            [order.with_eth for order in block],
+        )
+        counts = Counter(statuses)
+        result.orders += len(block)
+        result.orders_filled += counts.pop(STATUS_OK, 0)
+        result.rejections.update(counts)
+        result.tokens_sold += sum(bought)
+    result.usdc_raised = presale.overall_raised
+    result.unique_buyers = presale.unique_buyers
+    result.stage_times = [
+        (presale_id, data.start_time, data.end_time or None)
+        for presale_id, data in sorted(presale.presale.items())
+        if data.start_time
+    ]
+    return result
+
+
+def generate_orders(
+    buyers=10**6,
+    orders=None,  # defaults to one order per buyer, later orders are repeats
+    seed=0,
+    start_time=1714670000,
+    block_time=DEFAULT_BLOCK_TIME,
+    orders_per_block=1000,
+    eth_share=0.5,  # fraction of orders paid in ETH
+    mean_usd=500.0,  # exponential order size
+    eth_usd=3000,  # to size the ETH orders
+):
+    # seeded stream of PresaleOrder, `orders_per_block` orders per block
+    rng = random.Random(seed)
+    if orders is None:
+        orders = buyers
+    for n in range(orders):
+        usd = rng.expovariate(1 / mean_usd)
+        buyer = n if n < buyers else rng.randrange(buyers)  # first orders first
+        address = f"0x{buyer + 1:040x}"
+        order_time = start_time + (n // orders_per_block) * block_time
+        if rng.random() < eth_share:
+            amount = int(usd / eth_usd * ETH_MULTIPLIER)
+            yield PresaleOrder(order_time, address, amount, with_eth=True)
+        else:
+            amount = int(usd * USDC_MULTIPLIER)
+            yield PresaleOrder(order_time, address, amount)
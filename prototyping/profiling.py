@@ -0,0 +1,374 @@
+"""
+Opt-in profiling of the Staking / GovernanceRewarding hot paths.
+
+Profiler.attach() puts timing probes on one instance: its hot methods are
+shadowed by instance attributes that time the call and then run the class
+method. Nothing in staking.py or governance.py checks for a profiler, so an
+instance without probes runs exactly the code it runs in production, and
+detach() removes the probes again. Probes of instances that are forked
+while attached keep timing the parent, so attach after fork().
+
+Each probe records call counts, cumulative and self wall time. Calls whose
+path depends on the state (new stake or top-up, regular, emergency or
+paused unstake, new governer or reward) get a child frame for the branch, e.g.
+`Staking.stake` > `Staking.stake[top_up]`. Batch calls get a child frame
+per row branch instead, counted in rows and sharing the self time of the
+batch call by row count, e.g. `Staking._on_stakes_staked` >
+`Staking._on_stakes_staked[top_up]`, so a replay through stake_many shows
+the same new / top-up split as one through stake(). With `memory=True` a
+tracemalloc snapshot is taken at every epoch boundary of a Simulation. The
+call stacks can be written in the collapsed format of flamegraph.pl /
+speedscope:
+
+    python -m prototyping.profiling week.trace --memory --stacks week.folded
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import StakingBalanceProvider
+from prototyping.governance import (
+    STATUS_GOVERNER_ADDED,
+    STATUS_OK as GOVERNANCE_STATUS_OK,
+    GovernanceRewarding,
+)
+from prototyping.simulation import Simulation
+from prototyping.staking import STATUS_OK, BlockTimestamp, Staking
+from prototyping.workload import read_trace
+
+DEFAULT_TOP = 10  # tracemalloc lines kept per snapshot
+
+
+# probes: (method name, branch classifier or None); a classifier gets the
+# instance and the call arguments and names the path the call will take
+def _stake_branch(staking, address, *args):
+    return "top_up" if address in staking.stakes else "new"
+
+
+def _unstake_branch(staking, *args):
+    if not staking.emergency_pause:
+        return "regular"
+    if staking.emergency_withdraw:
+        return "emergency"
+    return "paused"  # rejected with EmergencyPauseActive
+
+
+def _governance_reward_branch(governance, address):
+    return "reward" if address in governance.governers else "register"
+
+
+class RowBranches:
+    """
+    Branch classifier of a batch call: `count(instance, result, *args)` runs
+    after the call and returns {branch: rows}.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+
+def _staked_rows(staking, result, changes):
+    new = sum(change[6] for change in changes)
+    return {"new": new, "top_up": len(changes) - new}
+
+
+def _removed_rows(staking, result, changes):
+    return {_unstake_branch(staking): len(changes)}
+
+
+def _validated_rows(staking, statuses, *args):
+    valid = statuses.count(STATUS_OK)
+    return {"valid": valid, "invalid": len(statuses) - valid}
+
+
+def _distributed_rows(governance, result, addresses):
+    statuses = result[0]
+    register = statuses.count(STATUS_GOVERNER_ADDED)
+    reward = statuses.count(GOVERNANCE_STATUS_OK)
+    return {
+        "register": register,
+        "reward": reward,
+        "rejected": len(statuses) - register - reward,
+    }
+
+
+def _claimed_rows(governance, result, addresses):
+    claimed = result[0].count(GOVERNANCE_STATUS_OK)
+    return {"claim": claimed, "rejected": len(addresses) - claimed}
+
+
+PROBES = {
+    Staking: [
+        ("stake", _stake_branch),
+        ("unstake", _unstake_branch),
+        ("_validate_stake_params", None),
+        ("stake_many", None),
+        ("unstake_many", _unstake_branch),
+        ("_validate_stake_params_many", RowBranches(_validated_rows)),
+        ("_on_stake_created", None),
+        ("_on_stake_topped_up", None),
+        ("_on_stake_removed", None),
+        ("_on_stakes_staked", RowBranches(_staked_rows)),  # once per batch
+        ("_on_stakes_removed", RowBranches(_removed_rows)),
+    ],
+    GovernanceRewarding: [
+        ("add_governance_reward", _governance_reward_branch),
+        ("_governance_reward", None),
+        ("claim_governance_reward", None),
+        ("distribute_epoch", RowBranches(_distributed_rows)),
+        ("claim_many", RowBranches(_claimed_rows)),
+    ],
+}
+
+
+@dataclass
+class ProbeStats:
+    name: str
+    calls: int = field(default=0)
+    total_ns: int = field(default=0)  # including the probed calls it made
+    self_ns: int = field(default=0)
+
+
+@dataclass
+class MemorySample:  # tracemalloc at an epoch boundary
+    time: int
+    current: int  # bytes traced
+    peak: int
+    top: list = field(default_factory=list)  # [(file:line, bytes, blocks)]
+
+
+class Profiler:
+    def __init__(self, memory=False, top=DEFAULT_TOP, snapshot_dir=None):
+        self.memory = memory
+        self.top = top
+        self.snapshot_dir = snapshot_dir  # also dump the full snapshots here
+        self.stats = {}  # frame name -> ProbeStats
+        self.stacks = Counter()  # "a;b;c" -> self time (ns)
+        self.memory_samples = []
+        self._frames = []  # [path, name, start_ns, child_ns] of the open calls
+        self._attached = {}  # id(target) -> (target, probed method names)
+        self._started_tracemalloc = False
+
+    # probes
+    def attach(self, target):
+        probes = next(
+            (probes for cls, probes in PROBES.items() if isinstance(target, cls)),
+            None,
+        )
+        if probes is None:
+            raise TypeError(f"No probes for {type(target).__name__}")
+        prefix = next(cls for cls in PROBES if isinstance(target, cls)).__name__
+        for name, classify in probes:
+            method = getattr(target, name)
+            probe = self._probe(target, method, f"{prefix}.{name}", classify)
+            setattr(target, name, probe)
+        self._attached[id(target)] = (target, [name for name, _ in probes])
+        return target
+
+    def detach(self, target=None):  # every attached instance if None
+        targets = (
+            list(self._attached.values())
+            if target is None
+            else [self._attached[id(target)]]
+        )
+        for probed, names in targets:
+            for name in names:
+                vars(probed).pop(name, None)
+            del self._attached[id(probed)]
+
+    def _probe(self, target, method, name, classify):
+        enter, leave = self._enter, self._leave
+        if classify is None:
+
+            def probe(*args, **kwargs):
+                enter(name)
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    leave()
+
+        elif isinstance(classify, RowBranches):
+            count = classify.count
+
+            def probe(*args, **kwargs):
+                enter(name)
+                try:
+                    result = method(*args, **kwargs)
+                except BaseException:
+                    leave()
+                    raise
+                leave(count(target, result, *args, **kwargs))
+                return result
+
+        else:
+
+            def probe(*args, **kwargs):
+                enter(name)
+                enter(f"{name}[{classify(target, *args, **kwargs)}]")
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    leave()
+                    leave()
+
+        return probe
+
+    def _enter(self, name):
+        frames = self._frames
+        path = f"{frames[-1][0]};{name}" if frames else name
+        frames.append([path, name, time.perf_counter_ns(), 0])
+
+    def _leave(self, rows=None):  # rows: {branch: rows} of a batch call
+        path, name, start, child = self._frames.pop()
+        elapsed = time.perf_counter_ns() - start
+        self_ns = elapsed - child
+        total_rows = sum(rows.values()) if rows else 0
+        if total_rows:  # self time moves to the row branches, split by rows
+            rows_ns = rows_done = 0
+            for branch, count in rows.items():
+                if not count:
+                    continue
+                rows_done += count
+                branch_ns = self_ns * rows_done // total_rows - rows_ns
+                rows_ns += branch_ns
+                branch_name = f"{name}[{branch}]"
+                branch_path = f"{path};{branch_name}"
+                self._record(branch_name, branch_path, count, branch_ns, branch_ns)
+            self_ns -= rows_ns
+        self._record(name, path, 1, elapsed, self_ns)
+        if self._frames:
+            self._frames[-1][3] += elapsed
+
+    def _record(self, name, path, calls, total_ns, self_ns):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = ProbeStats(name)
+        stats.calls += calls
+        stats.total_ns += total_ns
+        stats.self_ns += self_ns
+        self.stacks[path] += self_ns
+
+    # memory
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def on_epoch(self, simulation, epoch_start_time):  # Simulation.on_epoch callback
+        self.take_memory_sample(epoch_start_time)
+
+    def take_memory_sample(self, timestamp):
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        top = [
+            (str(stat.traceback), stat.size, stat.count)
+            for stat in snapshot.statistics("lineno")[: self.top]
+        ]
+        sample = MemorySample(timestamp, current, peak, top)
+        self.memory_samples.append(sample)
+        if self.snapshot_dir is not None:
+            file_name = f"epoch-{timestamp}.tracemalloc"
+            snapshot.dump(os.path.join(self.snapshot_dir, file_name))
+        return sample
+
+    # reports
+    def summary(self):  # ProbeStats by cumulative time, largest first
+        return sorted(self.stats.values(), key=lambda stats: -stats.total_ns)
+
+    def format_summary(self):
+        header = ("probe", "calls", "total s", "self s", "us/call")
+        lines = ["{:<44} {:>10} {:>9} {:>9} {:>9}".format(*header)]
+        for stats in self.summary():
+            lines.append(
+                f"{stats.name:<44} {stats.calls:>10} {stats.total_ns / 1e9:>9.3f}"
+                f" {stats.self_ns / 1e9:>9.3f}"
+                f" {stats.total_ns / 1e3 / stats.calls:>9.2f}"
+            )
+        for sample in self.memory_samples:
+            lines.append(
+                f"epoch {sample.time}: {sample.current / 2**20:.1f} MiB traced,"
+                f" peak {sample.peak / 2**20:.1f} MiB"
+            )
+        return "\n".join(lines)
+
+    def write_stacks(self, path):
+        # collapsed stacks ("a;b;c <self time in us>"), one line per call path
+        with open(path, "w") as file:
+            for stack, self_ns in sorted(self.stacks.items()):
+                file.write(f"{stack} {self_ns // 1000}\n")
+
+
+def profile_trace(path, memory=False, top=DEFAULT_TOP, snapshot_dir=None):
+    # replays a trace (prototyping.workload) through a Simulation with probes
+    # on a fresh Staking / GovernanceRewarding pair; returns (result, profiler)
+    trace = read_trace(path)
+    first = next(trace, None)
+    start_time = first.time if first is not None else 0
+    staking = Staking(
+        utility_token_addr="0x1111",
+        block_timestamp=BlockTimestamp(start_time),
+        event_sink=events.NullSink(),
+    )
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        staking_balances=StakingBalanceProvider(staking),
+    )
+    profiler = Profiler(memory=memory, top=top, snapshot_dir=snapshot_dir)
+    profiler.attach(staking)
+    profiler.attach(governance)
+    trace_events = trace if first is None else itertools.chain([first], trace)
+    simulation = Simulation(staking, trace_events, governance)
+    if memory:
+        simulation.on_epoch(profiler.on_epoch)
+    block_timestamp = governance_module.BLOCK_TIMESTAMP
+    profiler.start()
+    try:
+        result = simulation.run()
+    finally:
+        profiler.stop()
+        profiler.detach()
+        governance_module.BLOCK_TIMESTAMP = block_timestamp
+    return result, profiler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("trace", help="trace file written by prototyping.workload")
+    parser.add_argument(
+        "--memory", action="store_true", help="tracemalloc snapshot at every epoch"
+    )
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    parser.add_argument("--snapshot-dir", help="dump the tracemalloc snapshots here")
+    parser.add_argument("--stacks", help="write collapsed stacks to this file")
+    args = parser.parse_args(argv)
+
+    result, profiler = profile_trace(
+        args.trace, memory=args.memory, top=args.top, snapshot_dir=args.snapshot_dir
+    )
+    print(f"{result.events_applied} events applied, end time {result.end_time}")
+    print(profiler.format_summary())
+    if args.stacks:
+        profiler.write_stacks(args.stacks)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
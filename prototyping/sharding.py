@@ -0,0 +1,298 @@
+"""
+Staking and GovernanceRewarding sharded by address across worker processes.
+
+Every worker process owns one shard: a Staking instance and a
+GovernanceRewarding instance that reads its staking balances from it. An
+address always hashes to the same shard, so its stake and its governer live
+in the same process and the reward formula never needs another shard.
+
+The front end routes calls to the owning shard. Batch calls are split per
+shard, sent to every shard before any reply is read (the shards work in
+parallel), and the per-row outcomes are put back in input order. Global
+queries are answered by map-reduce over the shards:
+
+    with ShardedLedger(staking_kwargs, governance_kwargs, shards=8) as ledger:
+        ledger.set_timestamp(block_time)
+        statuses = ledger.stake_many(addresses, amounts, durations)
+        ledger.stats().total_locked
+
+Requests and replies are pickled through pipes, so batches should be large
+enough to amortize the round trip.
+"""
+
+import multiprocessing
+import os
+import zlib
+from array import array
+from dataclasses import dataclass, field
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import StakingBalanceProvider
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import BlockTimestamp, Staking
+
+
+@dataclass
+class GovernanceTotals:
+    governer_count: int = field(default=0)
+    total_reward: float = field(default=0.0)  # given and not claimed yet
+
+
+class _Shard:
+    # the worker side: one Staking / GovernanceRewarding pair
+
+    def __init__(self, initial_time, staking_kwargs, governance_kwargs):
+        staking_kwargs = {"event_sink": events.NullSink(), **staking_kwargs}
+        governance_kwargs = {"event_sink": events.NullSink(), **governance_kwargs}
+        self.staking = Staking(
+            block_timestamp=BlockTimestamp(initial_time), **staking_kwargs
+        )
+        self.governance = GovernanceRewarding(
+            staking_balances=StakingBalanceProvider(self.staking), **governance_kwargs
+        )
+        governance_module.BLOCK_TIMESTAMP = initial_time
+
+    def set_timestamp(self, timestamp):
+        self.staking.block_timestamp.set_timestamp(timestamp)
+        governance_module.BLOCK_TIMESTAMP = timestamp  # block.timestamp in solidity
+
+    # routed calls
+    def stake(self, address, lock_amount, lock_duration):
+        return self.staking.stake(address, lock_amount, lock_duration)
+
+    def unstake(self, address):
+        return self.staking.unstake(address)
+
+    def add_governance_reward(self, address):
+        return self.governance.add_governance_reward(address)
+
+    def claim_governance_reward(self, address):
+        return self.governance.claim_governance_reward(address)
+
+    def stake_many(self, addresses, lock_amounts, lock_durations):
+        return self.staking.stake_many(addresses, lock_amounts, lock_durations)
+
+    def unstake_many(self, addresses):
+        return self.staking.unstake_many(addresses)
+
+    def distribute_epoch(self, addresses):
+        return self.governance.distribute_epoch(addresses)
+
+    def claim_many(self, addresses):
+        return self.governance.claim_many(addresses)
+
+    def get_stake(self, address):
+        return self.staking.get_stake(address)
+
+    def get_governer(self, address):
+        return self.governance.get_governer(address)
+
+    # map side of the global queries
+    def running_totals(self):
+        return self.staking._running_totals()
+
+    def liability_schedule(self):
+        return self.staking.liability_schedule()
+
+    def maturing_between(self, t0, t1):
+        return self.staking.maturing_between(t0, t1)
+
+    def governance_totals(self):
+        governers = self.governance.governers.values()
+        return len(governers), sum(governer.reward for governer in governers)
+
+
+def _serve(connection, initial_time, staking_kwargs, governance_kwargs):
+    # worker process loop: (method name, args) in, (ok, result or error) out
+    shard = _Shard(initial_time, staking_kwargs, governance_kwargs)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        name, args = request
+        try:
+            result = getattr(shard, name)(*args)
+        except Exception as error:  # re-raised by the front end
+            connection.send((False, error))
+        else:
+            connection.send((True, result))
+    connection.close()
+
+
+class ShardedLedger:
+    """
+    Front end of `shards` worker processes (one per core by default), each
+    owning the stakes and governers of the addresses that hash to it.
+    `staking_kwargs` and `governance_kwargs` are passed to every shard's
+    Staking and GovernanceRewarding (events are dropped unless an event sink
+    is given; it is then copied into every worker).
+    """
+
+    def __init__(
+        self,
+        staking_kwargs,
+        governance_kwargs,
+        shards=None,
+        initial_time=0,
+        mp_context=None,  # multiprocessing context, e.g. get_context("spawn")
+    ):
+        context = mp_context or multiprocessing.get_context()
+        self.shard_count = shards or os.cpu_count() or 1
+        self._connections = []
+        self._processes = []
+        for _ in range(self.shard_count):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_serve,
+                args=(
+                    worker_connection,
+                    initial_time,
+                    staking_kwargs,
+                    governance_kwargs,
+                ),
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def shard_of(self, address):  # stable across runs, unlike hash()
+        return zlib.crc32(address.encode()) % self.shard_count
+
+    # transport
+    def _call(self, shard, name, *args):
+        self._connections[shard].send((name, args))
+        return self._receive(shard)
+
+    def _receive(self, shard):
+        return self._receive_all([shard])[0]
+
+    def _receive_all(self, shards):
+        # every reply is read before an error is raised, so no reply is left
+        # in a pipe to be taken for the answer to the next request
+        replies = [self._connections[shard].recv() for shard in shards]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def _broadcast(self, name, *args):  # results in shard order
+        for connection in self._connections:
+            connection.send((name, args))
+        return self._receive_all(range(self.shard_count))
+
+    def _scatter(self, name, addresses, *columns):
+        # sends each shard its rows (in input order) and returns
+        # [(input positions, result)] of the shards that got any
+        positions = [[] for _ in range(self.shard_count)]
+        shard_of = self.shard_of
+        for i, address in enumerate(addresses):
+            positions[shard_of(address)].append(i)
+        busy = [shard for shard in range(self.shard_count) if positions[shard]]
+        for shard in busy:
+            rows = positions[shard]
+            args = [[column[i] for i in rows] for column in (addresses, *columns)]
+            self._connections[shard].send((name, args))
+        return list(zip((positions[shard] for shard in busy), self._receive_all(busy)))
+
+    @staticmethod
+    def _gather_statuses(size, replies):
+        statuses = array("b", bytes(size))
+        for rows, shard_statuses in replies:
+            for i, status in zip(rows, shard_statuses):
+                statuses[i] = status
+        return statuses
+
+    @classmethod
+    def _gather_outcomes(cls, size, replies, default):
+        # replies of (statuses, amounts) batch calls
+        statuses = cls._gather_statuses(
+            size, [(rows, reply[0]) for rows, reply in replies]
+        )
+        amounts = [default] * size
+        for rows, (_, shard_amounts) in replies:
+            for i, amount in zip(rows, shard_amounts):
+                amounts[i] = amount
+        return statuses, amounts
+
+    # block time of every shard (block.timestamp in solidity)
+    def set_timestamp(self, timestamp):
+        self._broadcast("set_timestamp", timestamp)
+
+    # routed scalar calls
+    def stake(self, address, lock_amount, lock_duration):
+        return self._call(
+            self.shard_of(address), "stake", address, lock_amount, lock_duration
+        )
+
+    def unstake(self, address):
+        return self._call(self.shard_of(address), "unstake", address)
+
+    def add_governance_reward(self, address):
+        return self._call(self.shard_of(address), "add_governance_reward", address)
+
+    def claim_governance_reward(self, address):
+        return self._call(self.shard_of(address), "claim_governance_reward", address)
+
+    def get_stake(self, address):
+        return self._call(self.shard_of(address), "get_stake", address)
+
+    def get_governer(self, address):
+        return self._call(self.shard_of(address), "get_governer", address)
+
+    # routed batch calls, same outcomes as the Staking / GovernanceRewarding
+    # batch functions (rows of one address stay in order on its shard)
+    def stake_many(self, addresses, lock_amounts, lock_durations):
+        replies = self._scatter("stake_many", addresses, lock_amounts, lock_durations)
+        return self._gather_statuses(len(addresses), replies)
+
+    def unstake_many(self, addresses):
+        replies = self._scatter("unstake_many", addresses)
+        return self._gather_outcomes(len(addresses), replies, 0)
+
+    def distribute_epoch(self, addresses):
+        replies = self._scatter("distribute_epoch", addresses)
+        return self._gather_outcomes(len(addresses), replies, 0.0)
+
+    def claim_many(self, addresses):
+        replies = self._scatter("claim_many", addresses)
+        return self._gather_outcomes(len(addresses), replies, 0.0)
+
+    # global queries (map-reduce over the shards)
+    def stats(self):
+        totals = [sum(column) for column in zip(*self._broadcast("running_totals"))]
+        return Staking._make_stats(*totals)
+
+    def liability_schedule(self):  # [(epoch_start_time, lock_amount + reward), ...]
+        due = {}
+        for schedule in self._broadcast("liability_schedule"):
+            for epoch_start_time, liability in schedule:
+                due[epoch_start_time] = due.get(epoch_start_time, 0) + liability
+        return sorted(due.items())
+
+    def maturing_between(self, t0, t1):  # addresses with t0 <= stake end < t1
+        matured = []
+        for addresses in self._broadcast("maturing_between", t0, t1):
+            matured.extend(addresses)
+        return matured
+
+    def governance_totals(self):
+        counts, rewards = zip(*self._broadcast("governance_totals"))
+        return GovernanceTotals(governer_count=sum(counts), total_reward=sum(rewards))
@@ -0,0 +1,229 @@
+import heapq
+import itertools
+from collections import Counter
+from dataclasses import dataclass, field
+
+import prototyping.governance as governance_module
+from prototyping.governance import STATUS_GOVERNER_ADDED
+from prototyping.governance import STATUS_OK as GOVERNANCE_STATUS_OK
+from prototyping.staking import EPOCH_IN_SECONDS, STATUS_OK
+
+
+@dataclass
+class StakeEvent:
+    time: int
+    address: str
+    lock_amount: int
+    lock_duration: int
+
+
+@dataclass
+class TopUpEvent(StakeEvent):  # stake() on an existing address
+    pass
+
+
+@dataclass
+class UnstakeEvent:
+    time: int
+    address: str
+
+
+@dataclass
+class RewardRateChangeEvent:
+    time: int
+    reward_rate_per_epoch: int
+
+
+@dataclass
+class EmergencyEvent:
+    time: int
+    emergency_pause: bool = field(default=None)  # None keeps the current value
+    emergency_withdraw: bool = field(default=None)
+
+
+@dataclass
+class GovernanceRewardEvent:  # add_governance_reward() by the operator
+    time: int
+    address: str
+
+
+@dataclass
+class GovernanceClaimEvent:  # claim_governance_reward() by the governer
+    time: int
+    address: str
+
+
+@dataclass
+class SimulationResult:
+    events_applied: int = field(default=0)
+    stakes_applied: int = field(default=0)
+    stakes_rejected: int = field(default=0)
+    unstakes_applied: int = field(default=0)
+    unstakes_rejected: int = field(default=0)
+    total_withdrawn: int = field(default=0)
+    end_time: int = field(default=0)
+    rejections: Counter = field(default_factory=Counter)  # status -> count
+    governance_applied: int = field(default=0)  # rewards given (or registered)
+    governance_rejected: int = field(default=0)
+    total_claimed: float = field(default=0.0)
+
+
+class Simulation:
+    """
+    Discrete-event engine around a Staking instance.
+    Events come from an optional time-ordered stream (read lazily, one event
+    ahead) and from schedule(); a priority queue orders them by time, the
+    block timestamp jumps straight from one event time to the next and
+    consecutive stake/unstake events with the same time are applied through
+    stake_many/unstake_many. Governance events need a GovernanceRewarding
+    instance, they are batched through distribute_epoch/claim_many.
+    """
+
+    def __init__(self, staking, events=None, governance=None):
+        self.staking = staking
+        self.governance = governance
+        self.result = SimulationResult(end_time=staking.block_timestamp.timestamp)
+        self._queue = []  # (time, seq, event, from_stream)
+        self._seq = itertools.count()
+        self._stream = iter(events) if events is not None else None
+        self._stream_time = None
+        self._epoch_callbacks = []
+        self._pull_from_stream()
+
+    # scheduling
+    def schedule(self, event):
+        if event.time < self.now:
+            raise ValueError(
+                f"Cannot schedule event at {event.time} before current time {self.now}"
+            )
+        heapq.heappush(self._queue, (event.time, next(self._seq), event, False))
+
+    def schedule_many(self, events):
+        for event in events:
+            self.schedule(event)
+
+    def on_epoch(self, callback):  # callback(simulation, epoch_start_time)
+        self._epoch_callbacks.append(callback)
+
+    @property
+    def now(self):
+        return self.staking.block_timestamp.timestamp
+
+    def _pull_from_stream(self):
+        if self._stream is None:
+            return
+        event = next(self._stream, None)
+        if event is None:
+            self._stream = None
+            return
+        if self._stream_time is not None and event.time < self._stream_time:
+            raise ValueError(
+                f"Event stream is not time-ordered: "
+                f"{event.time} after {self._stream_time}"
+            )
+        self._stream_time = event.time
+        heapq.heappush(self._queue, (event.time, next(self._seq), event, True))
+
+    def _pop(self):
+        _, _, event, from_stream = heapq.heappop(self._queue)
+        if from_stream:
+            self._pull_from_stream()
+        return event
+
+    def _cross_epoch_boundary(self, time):
+        # stops the clock at the next epoch start before `time`, if any, and runs
+        # the epoch callbacks there (they may schedule events from that point on)
+        if not self._epoch_callbacks:
+            return False
+        epoch_start_time = (self.now // EPOCH_IN_SECONDS + 1) * EPOCH_IN_SECONDS
+        if epoch_start_time > time:
+            return False
+        self.staking.block_timestamp.set_timestamp(epoch_start_time)
+        for callback in self._epoch_callbacks:
+            callback(self, epoch_start_time)
+        return True
+
+    def _pop_batch(self, time, event_type):
+        # consecutive queued events with the same time and kind
+        batch = [self._pop()]
+        queue = self._queue
+        while queue and queue[0][0] == time and isinstance(queue[0][2], event_type):
+            batch.append(self._pop())
+        return batch
+
+    def _count_statuses(self, statuses):  # records rejections, returns applied
+        counts = Counter(statuses)
+        applied = counts.pop(STATUS_OK, 0)
+        self.result.rejections.update(counts)
+        return applied
+
+    def _apply_governance(self, time, batch):
+        if self.governance is None:
+            raise ValueError(
+                f"Governance event without a governance instance: {batch[0]!r}"
+            )
+        governance_module.BLOCK_TIMESTAMP = time  # block.timestamp in solidity
+        addresses = [e.address for e in batch]
+        if isinstance(batch[0], GovernanceRewardEvent):
+            statuses, _ = self.governance.distribute_epoch(addresses)
+        else:
+            statuses, rewards = self.governance.claim_many(addresses)
+            self.result.total_claimed += sum(rewards)
+        counts = Counter(statuses)
+        applied = counts[GOVERNANCE_STATUS_OK] + counts[STATUS_GOVERNER_ADDED]
+        self.result.governance_applied += applied
+        self.result.governance_rejected += len(batch) - applied
+
+    # main loop
+    def run(self, until=None):  # apply all events with time <= until
+        staking = self.staking
+        result = self.result
+        while True:
+            if not self._queue or (until is not None and self._queue[0][0] > until):
+                # nothing left to apply before `until`, but epoch callbacks up to
+                # `until` may still schedule new events
+                if until is not None and self._cross_epoch_boundary(until):
+                    continue
+                break
+            time, _, event, _ = self._queue[0]
+            if self._cross_epoch_boundary(time):
+                continue
+            staking.block_timestamp.set_timestamp(time)
+
+            if isinstance(event, StakeEvent):
+                batch = self._pop_batch(time, StakeEvent)
+                statuses = staking.stake_many(
+                    [e.address for e in batch],
+                    [e.lock_amount for e in batch],
+                    [e.lock_duration for e in batch],
+                )
+                applied = self._count_statuses(statuses)
+                result.stakes_applied += applied
+                result.stakes_rejected += len(batch) - applied
+            elif isinstance(event, UnstakeEvent):
+                batch = self._pop_batch(time, UnstakeEvent)
+                statuses, amounts = staking.unstake_many([e.address for e in batch])
+                applied = self._count_statuses(statuses)
+                result.unstakes_applied += applied
+                result.unstakes_rejected += len(batch) - applied
+                result.total_withdrawn += sum(amounts)
+            elif isinstance(event, RewardRateChangeEvent):
+                batch = [self._pop()]
+                staking.set_reward_rate_per_epoch(event.reward_rate_per_epoch)
+            elif isinstance(event, (GovernanceRewardEvent, GovernanceClaimEvent)):
+                batch = self._pop_batch(time, type(event))
+                self._apply_governance(time, batch)
+            elif isinstance(event, EmergencyEvent):
+                batch = [self._pop()]
+                if event.emergency_pause is not None:
+                    staking.set_emergency_pause(event.emergency_pause)
+                if event.emergency_withdraw is not None:
+                    staking.set_emergency_withdraw(event.emergency_withdraw)
+            else:
+                raise TypeError(f"Unknown simulation event: {event!r}")
+            result.events_applied += len(batch)
+
+        if until is not None and until > self.now:
+            staking.block_timestamp.set_timestamp(until)
+        result.end_time = self.now
+        return result
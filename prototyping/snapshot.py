@@ -0,0 +1,460 @@
+"""
+Binary snapshots of Staking and GovernanceRewarding state.
+
+A file is a sequence of records. Each record is a 16 byte preamble
+(magic, format version, header length), a JSON header with the scalar state
+and the column layout, and 8-byte aligned little-endian columns:
+addresses (offsets + utf-8 blob, sorted) and one column per Stake/Governer
+field ("q" int64, "d" float64, "u128" as two uint64 columns).
+
+load_snapshot() memory-maps the file and serves rows straight from the
+columns (binary search on the sorted addresses), so opening a snapshot does not
+depend on its size. Rows are copied into memory only when they are accessed
+or changed. save_delta() appends a record with just the rows changed since the
+last snapshot or delta.
+"""
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+from prototyping.governance import Governer, GovernanceRewarding
+from prototyping.staking import Stake, Staking
+
+MAGIC = b"MMBFPSNP"
+VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+_WORD_MASK = (1 << 64) - 1
+_UNSET = object()
+
+STAKING = "staking"
+GOVERNANCE = "governance"
+
+STAKE_FIELDS = [
+    ("lock_amount", "u128"),
+    ("start_time", "q"),
+    ("lock_duration", "q"),
+    ("reward", "d"),
+]
+GOVERNER_FIELDS = [
+    ("init_time", "q"),
+    ("reward", "d"),  # "u128" when rewards are computed in fixed point
+    ("last_reward_time", "q"),
+    ("last_claim_time", "q"),
+]
+
+
+def _align8(nbytes):
+    return (nbytes + 7) & ~7
+
+
+# writing
+def _address_columns(addresses):
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for address in addresses:
+        blob += address.encode()
+        offsets.append(len(blob))
+    return offsets, array("B", blob)
+
+
+def _field_columns(prefix, fields, records):
+    columns = []
+    for name, kind in fields:
+        values = [getattr(record, name) for record in records]
+        if kind == "u128":
+            values = [int(value) for value in values]  # e.g. a 0.0 reset
+            hi = array("Q", [value >> 64 for value in values])
+            lo = array("Q", [value & _WORD_MASK for value in values])
+            columns.append((f"{prefix}{name}.hi", hi))
+            columns.append((f"{prefix}{name}.lo", lo))
+        elif kind == "q":
+            columns.append((f"{prefix}{name}", array("q", map(int, values))))
+        else:
+            columns.append((f"{prefix}{name}", array(kind, values)))
+    return columns
+
+
+def _write_record(file, header, columns):
+    layout = []
+    offset = 0
+    for name, column in columns:
+        nbytes = len(column) * column.itemsize
+        layout.append(
+            {
+                "name": name,
+                "typecode": column.typecode,
+                "offset": offset,
+                "nbytes": nbytes,
+            }
+        )
+        offset += _align8(nbytes)
+    header = dict(header, columns=layout, data_nbytes=offset)
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b" " * (_align8(len(header_bytes)) - len(header_bytes))
+
+    file.write(_PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)))
+    file.write(header_bytes)
+    for name, column in columns:
+        if sys.byteorder != "little":
+            column = array(column.typecode, column)
+            column.byteswap()
+        data = column.tobytes()
+        file.write(data)
+        file.write(b"\0" * (_align8(len(data)) - len(data)))
+
+
+def _state_of(obj):
+    if isinstance(obj, Staking):
+        return STAKING, STAKE_FIELDS, obj.stakes, {
+            "utility_token_addr": obj.utility_token_addr,
+            "reward_rate_per_epoch": obj.reward_rate_per_epoch,
+            "emergency_pause": obj.emergency_pause,
+            "emergency_withdraw": obj.emergency_withdraw,
+            "block_timestamp": obj.block_timestamp.timestamp,
+            "max_lock_duration": obj.max_lock_duration,
+            "max_lock_amount": obj.max_lock_amount,
+            "max_reward_rate": obj.max_reward_rate,
+            "max_multiplier_to_withdraw": obj.max_multiplier_to_withdraw,
+            "totals": list(obj._running_totals()),
+        }
+    if isinstance(obj, GovernanceRewarding):
+        fields = GOVERNER_FIELDS
+        if obj.fixed_point:
+            fields = [(n, "u128" if n == "reward" else k) for n, k in fields]
+        return GOVERNANCE, fields, obj.governers, {
+            "governance_token_addr": obj.governance_token_addr,
+            "staking_addr": obj.staking_addr,
+            "reputation_addr": obj.reputation_addr,
+            "emergency_pause": obj.emergency_pause,
+            "fixed_point": obj.fixed_point,
+        }
+    raise TypeError(f"Cannot snapshot {type(obj).__name__}")
+
+
+def save_snapshot(obj, path):
+    kind, fields, book, state = _state_of(obj)
+    if isinstance(book, MappedBook) and book.path == path:
+        raise ValueError("Cannot overwrite the snapshot a book is mapped from")
+    items = sorted(book.items())
+    addresses = [address for address, _ in items]
+    records = [record for _, record in items]
+    offsets, blob = _address_columns(addresses)
+    with open(path, "wb") as file:
+        _write_record(
+            file,
+            {"kind": kind, "rows": len(items), "fields": fields, "state": state},
+            [("address.offsets", offsets), ("address.blob", blob)]
+            + _field_columns("", fields, records),
+        )
+
+
+def save_delta(obj, path):
+    # appends the rows changed since the last snapshot or delta to `path`;
+    # obj must have been opened with load_snapshot()
+    kind, fields, book, state = _state_of(obj)
+    if not isinstance(book, MappedBook):
+        raise ValueError("save_delta() needs state opened with load_snapshot()")
+    changed, deleted = book._take_changes()
+    offsets, blob = _address_columns([address for address, _ in changed])
+    deleted_offsets, deleted_blob = _address_columns(deleted)
+    with open(path, "ab") as file:
+        _write_record(
+            file,
+            {
+                "kind": f"{kind}-delta",
+                "rows": len(changed),
+                "deleted": len(deleted),
+                "fields": fields,
+                "state": state,
+            },
+            [
+                ("address.offsets", offsets),
+                ("address.blob", blob),
+                ("deleted.offsets", deleted_offsets),
+                ("deleted.blob", deleted_blob),
+            ]
+            + _field_columns("", fields, [record for _, record in changed]),
+        )
+    return len(changed), len(deleted)
+
+
+# reading
+def _read_records(buffer):
+    view = memoryview(buffer)
+    position = 0
+    while position < len(view):
+        magic, version, header_nbytes = _PREAMBLE.unpack_from(view, position)
+        if magic != MAGIC:
+            raise ValueError("Not a snapshot file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        position += _PREAMBLE.size
+        header = json.loads(bytes(view[position : position + header_nbytes]))
+        position += header_nbytes
+        columns = {}
+        for column in header["columns"]:
+            start = position + column["offset"]
+            data = view[start : start + column["nbytes"]]
+            if sys.byteorder != "little":
+                swapped = array(column["typecode"], bytes(data))
+                swapped.byteswap()
+                data = memoryview(swapped.tobytes())
+            columns[column["name"]] = data.cast(column["typecode"])
+        position += header["data_nbytes"]
+        yield header, columns
+
+
+class _AddressColumn:
+    # sequence view over the sorted address column (used with bisect)
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return bytes(self._blob[start:end]).decode()
+
+
+def _field_readers(prefix, fields, columns):
+    readers = []
+    for name, kind in fields:
+        if kind == "u128":
+            hi, lo = columns[f"{prefix}{name}.hi"], columns[f"{prefix}{name}.lo"]
+            readers.append(
+                (name, lambda row, hi=hi, lo=lo: (hi[row] << 64) | lo[row])
+            )
+        else:
+            readers.append((name, columns[f"{prefix}{name}"].__getitem__))
+    return readers
+
+
+class MappedBook(MutableMapping):
+    """
+    Stake/governer book served from a memory-mapped snapshot.
+    Unchanged rows are read from the mapped columns, rows that are accessed
+    through `book[address]` or written are copied into an in-memory overlay
+    (so in-place updates like `book[address].reward += x` work as on a dict),
+    and deletions of snapshot rows are kept as tombstones.
+    Only writes, deletions and `book[address]` (the row may be updated in
+    place) mark a row for the next delta; peek() reads without copying or
+    marking, values() / items() yield detached copies of unchanged rows.
+    """
+
+    def __init__(self, path, buffer, record_type, fields, columns, rows):
+        self.path = path
+        self._buffer = buffer  # keeps the mapping alive
+        self._record_type = record_type
+        self._addresses = _AddressColumn(
+            columns["address.offsets"], columns["address.blob"]
+        )
+        self._rows = rows
+        self._readers = _field_readers("", fields, columns)
+        self._overlay = {}  # address -> record (accessed, changed or new rows)
+        self._deleted = set()  # snapshot addresses removed since load
+        self._len = rows
+        self._dirty = set()  # addresses written or handed out since the last delta
+        self._persisted = {}  # address -> field values written by the last delta
+
+    def _find(self, address):
+        row = bisect_left(self._addresses, address)
+        if row < self._rows and self._addresses[row] == address:
+            return row
+        return -1
+
+    def _record_at(self, row):
+        return self._record_type(**{name: read(row) for name, read in self._readers})
+
+    def peek(self, address, default=None):  # read without copying the row
+        record = self._overlay.get(address)
+        if record is not None:
+            return record
+        if address in self._deleted:
+            return default
+        row = self._find(address)
+        return self._record_at(row) if row >= 0 else default
+
+    # mapping protocol
+    def __getitem__(self, address):
+        # the caller may update the row in place, so it is marked changed;
+        # read-only callers use peek()
+        record = self._overlay.get(address)
+        if record is not None:
+            self._dirty.add(address)
+            return record
+        if address in self._deleted:
+            raise KeyError(address)
+        row = self._find(address)
+        if row < 0:
+            raise KeyError(address)
+        record = self._overlay[address] = self._record_at(row)
+        self._dirty.add(address)
+        return record
+
+    def __setitem__(self, address, record):
+        if address not in self:
+            self._len += 1
+        self._deleted.discard(address)
+        self._overlay[address] = record
+        self._dirty.add(address)
+
+    def __delitem__(self, address):
+        self.pop(address)
+
+    def pop(self, address, *default):
+        if address not in self:
+            if default:
+                return default[0]
+            raise KeyError(address)
+        record = self._overlay.pop(address, None)
+        row = self._find(address)
+        if record is None:
+            record = self._record_at(row)
+        if row >= 0:
+            self._deleted.add(address)
+        self._len -= 1
+        self._dirty.add(address)
+        return record
+
+    def __contains__(self, address):
+        if address in self._overlay:
+            return True
+        if address in self._deleted:
+            return False
+        return self._find(address) >= 0
+
+    def __iter__(self):
+        overlay, deleted = self._overlay, self._deleted
+        for row in range(self._rows):
+            address = self._addresses[row]
+            if address not in overlay and address not in deleted:
+                yield address
+        yield from list(overlay)
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        overlay, deleted = self._overlay, self._deleted
+        for row in range(self._rows):
+            address = self._addresses[row]
+            if address not in overlay and address not in deleted:
+                yield address, self._record_at(row)
+        yield from list(overlay.items())
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+    # overhead of the book
+    def rows_copied(self):  # accessed, changed or new rows held in memory
+        return len(self._overlay)
+
+    # deltas
+    def _values_of(self, record):
+        return tuple(getattr(record, name) for name, _ in self._readers)
+
+    def _persisted_values(self, address):
+        # field values as of the last delta (None if the row did not exist)
+        values = self._persisted.get(address, _UNSET)
+        if values is _UNSET:
+            row = self._find(address)
+            values = self._values_of(self._record_at(row)) if row >= 0 else None
+        return values
+
+    def _take_changes(self):
+        changed = []
+        deleted = []
+        for address in sorted(self._dirty):
+            record = self._overlay.get(address)
+            persisted = self._persisted_values(address)
+            if record is None:
+                if persisted is not None:
+                    deleted.append(address)
+                    self._persisted[address] = None
+                continue
+            values = self._values_of(record)
+            if values != persisted:
+                changed.append((address, record))
+                self._persisted[address] = values
+        self._dirty.clear()
+        return changed, deleted
+
+    def _apply_delta(self, header, columns):
+        addresses = _AddressColumn(
+            columns["address.offsets"], columns["address.blob"]
+        )
+        readers = _field_readers("", header["fields"], columns)
+        deleted = _AddressColumn(columns["deleted.offsets"], columns["deleted.blob"])
+        for address in deleted:
+            if address in self:
+                self.pop(address)
+            self._persisted[address] = None
+        for row, address in enumerate(addresses):
+            values = {name: read(row) for name, read in readers}
+            self[address] = self._record_type(**values)
+            self._persisted[address] = tuple(values[name] for name, _ in self._readers)
+        self._dirty.clear()
+
+
+def load_snapshot(path, deltas=None, **kwargs):
+    # returns a Staking or GovernanceRewarding backed by a MappedBook;
+    # `deltas` is a delta file written by save_delta(), applied in order;
+    # extra keyword arguments go to the constructor (e.g. event_sink)
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    header, columns = next(_read_records(buffer))
+    kind, state = header["kind"], header["state"]
+    record_type = {STAKING: Stake, GOVERNANCE: Governer}.get(kind)
+    if record_type is None:
+        raise ValueError(f"Not a full snapshot: {kind}")
+    book = MappedBook(
+        path, buffer, record_type, header["fields"], columns, header["rows"]
+    )
+
+    if deltas is not None:
+        with open(deltas, "rb") as file:
+            delta_buffer = file.read()  # deltas are applied into the overlay
+        for delta_header, delta_columns in _read_records(delta_buffer):
+            if delta_header["kind"] != f"{kind}-delta":
+                raise ValueError(f"Delta of kind {delta_header['kind']} for {kind}")
+            book._apply_delta(delta_header, delta_columns)
+            state = delta_header["state"]
+
+    if kind == STAKING:
+        staking = Staking(
+            utility_token_addr=state["utility_token_addr"],
+            reward_rate_per_epoch=state["reward_rate_per_epoch"],
+            emergency_pause=state["emergency_pause"],
+            emergency_withdraw=state["emergency_withdraw"],
+            max_lock_duration=state["max_lock_duration"],
+            max_lock_amount=state["max_lock_amount"],
+            max_reward_rate=state["max_reward_rate"],
+            max_multiplier_to_withdraw=state["max_multiplier_to_withdraw"],
+            **kwargs,
+        )
+        staking.stakes = book
+        staking.rebuild_derived_state(totals=tuple(state["totals"]))
+        if "block_timestamp" not in kwargs:
+            staking.block_timestamp.set_timestamp(state["block_timestamp"])
+        return staking
+
+    governance = GovernanceRewarding(
+        governance_token_addr=state["governance_token_addr"],
+        staking_addr=state["staking_addr"],
+        reputation_addr=state["reputation_addr"],
+        emergency_pause=state["emergency_pause"],
+        fixed_point=state["fixed_point"],
+        **kwargs,
+    )
+    governance.governers = book
+    return governance
@@ -1,5 +1,15 @@
+import copy
+import math
 import time
+import weakref
+from array import array
 from dataclasses import dataclass, field
+from functools import reduce
+from operator import add, itemgetter, mul, sub
+
+from prototyping import events
+from prototyping.cow_book import CopyOnWriteBook, keep_rows
+from prototyping.maturity_index import MaturityIndex
 
 DAY_IN_SECONDS = 60 * 60 * 24
 EPOCH_IN_SECONDS = DAY_IN_SECONDS * 7  # 1 week
@@ -8,6 +18,31 @@ MAX_LOCK_AMOUNT = 10**18 * 10**7  # 1% of total supply
 MAX_REWARD_RATE = 10  # 10% per epoch
 MAX_MULTIPLIER_TO_WITHDRAW = 3  # 300% of lock amount
 
+# per-row statuses returned by the batch functions (stake_many, unstake_many),
+# STATUS_OK / STATUS_INVALID_REWARD_RATE also by set_reward_rate_per_epoch
+STATUS_OK = 0
+STATUS_EMERGENCY_PAUSE = 1
+STATUS_INVALID_AMOUNT = 2  # lock amount must be positive
+STATUS_AMOUNT_TOO_LARGE = 3  # lock amount above max_lock_amount
+STATUS_DURATION_TOO_SHORT = 4  # lock duration below 1 epoch
+STATUS_DURATION_TOO_LONG = 5  # lock duration above max_lock_duration
+STATUS_INVALID_EPOCH_START = 6
+STATUS_INVALID_REMAINING_TIME = 7
+STATUS_STAKE_NEAR_END = 8  # top-up to stake nearing or past its end
+STATUS_NO_STAKE = 9
+STATUS_NOT_ENDED = 10  # withdraw from stake that has not reached its end
+STATUS_WITHDRAW_CAP = 11  # withdraw above max_multiplier_to_withdraw
+STATUS_INVALID_REWARD_RATE = 12  # negative or above max_reward_rate
+
+
+def _drop_positions(rows, positions):  # rows without the given sorted positions
+    if not positions:
+        return rows
+    rows = list(rows)
+    for i in reversed(positions):
+        del rows[i]
+    return rows
+
 
 class BlockTimestamp:
     """
@@ -32,6 +67,17 @@ class Stake:
     lock_duration: int = field(default=0)
     reward: int = field(default=0)
 
+    def __copy__(self):  # cheaper than the generic copy.copy (fork() rows)
+        return Stake(self.lock_amount, self.start_time, self.lock_duration, self.reward)
+
+
+@dataclass
+class StakingStats:
+    total_locked: int = field(default=0)
+    total_reward: float = field(default=0.0)
+    staker_count: int = field(default=0)
+    average_lock_duration: float = field(default=0.0)  # weighted by lock amount
+
 
 class Staking:
 
@@ -43,12 +89,28 @@ class Staking:
         emergency_pause=False,
         emergency_withdraw=False,
         block_timestamp=None,  # for testing purposes only (not needed in actual implementation)
+        stakes=None,  # stake storage engine, e.g. ColumnarStakeBook (defaults to a plain dict)
+        debug=False,  # check the running aggregates against a full recompute in stats()
+        event_sink=None,  # see prototyping.events (defaults to printing to stdout)
+        max_lock_duration=MAX_LOCK_DURATION,
+        max_lock_amount=MAX_LOCK_AMOUNT,
+        max_reward_rate=MAX_REWARD_RATE,
+        max_multiplier_to_withdraw=MAX_MULTIPLIER_TO_WITHDRAW,
     ):
         self.utility_token_addr = utility_token_addr
         self.reward_rate_per_epoch = reward_rate_per_epoch
         self.emergency_pause = emergency_pause
         self.emergency_withdraw = emergency_withdraw
-        self.stakes = {}
+        self.max_lock_duration = max_lock_duration
+        self.max_lock_amount = max_lock_amount
+        self.max_reward_rate = max_reward_rate
+        self.max_multiplier_to_withdraw = max_multiplier_to_withdraw
+        self.stakes = stakes if stakes is not None else {}
+        self.debug = debug
+        self.event_sink = event_sink if event_sink is not None else events.PrintSink()
+        self.maturity_index = MaturityIndex(EPOCH_IN_SECONDS)
+        self._forks = []  # weak references to the stake books of live forks
+        self.rebuild_derived_state()
         self.block_timestamp = block_timestamp or BlockTimestamp(
             int(time.time())
         )  # for testing purposes only (not needed in actual implementation)
@@ -56,17 +118,22 @@ class Staking:
     # setter functions (onlyOwner functions in solidity)
     def set_utility_token_addr(self, utility_token_addr):
         self.utility_token_addr = utility_token_addr
-        print(f"Utility token address set to {utility_token_addr}")
+        self.event_sink.emit(events.UtilityTokenAddrSet, utility_token_addr)
 
     def set_reward_rate_per_epoch(self, reward_rate_per_epoch):
-        if reward_rate_per_epoch > MAX_REWARD_RATE:
-            print("Error: Reward rate must be less than or equal to 10%.")
-            return
+        if reward_rate_per_epoch > self.max_reward_rate:
+            self.event_sink.emit(
+                events.InvalidRewardRate, reward_rate_per_epoch, self.max_reward_rate
+            )
+            return STATUS_INVALID_REWARD_RATE
         if reward_rate_per_epoch < 0:
-            print("Error: Reward rate must be non-negative.")
-            return
+            self.event_sink.emit(
+                events.InvalidRewardRate, reward_rate_per_epoch, self.max_reward_rate
+            )
+            return STATUS_INVALID_REWARD_RATE
         self.reward_rate_per_epoch = reward_rate_per_epoch
-        print(f"Reward rate per epoch set to {reward_rate_per_epoch}")
+        self.event_sink.emit(events.RewardRateSet, reward_rate_per_epoch)
+        return STATUS_OK
 
     # getter functions (view functions in solidity)
     def get_utility_token_addr(self):
@@ -78,25 +145,94 @@ class Staking:
     def get_stake(self, address):
         if address not in self.stakes:  # solidity: stakes[msg.sender].lockAmount == 0
             return Stake()
-        return self.stakes[address]
+        return self._read_stake(address)
+
+    def _read_stake(self, address):  # None without a stake; copies no row
+        # fork views and mapped snapshot books copy rows on book[address]
+        peek = getattr(self.stakes, "peek", None)
+        if peek is not None:
+            return peek(address)
+        return self.stakes.get(address)
+
+    # projections (dashboards, no solidity counterpart)
+    def project_withdrawal(self, address, at_time=None):
+        # (status, amount) unstake(address) would give at `at_time` (defaults to
+        # the block timestamp), without changing any state. Nothing is
+        # memoized: the projection is a few field reads (benchmark
+        # project_withdrawal), cheaper than an LRU lookup plus invalidating
+        # the entry on every stake change.
+        if self.emergency_pause and not self.emergency_withdraw:
+            return STATUS_EMERGENCY_PAUSE, 0
+        projection = self._withdrawal_projection(address)
+        if projection is None:
+            return STATUS_NO_STAKE, 0
+        end_time, lock_amount, amount_to_withdraw = projection
+        if self.emergency_pause:  # emergency withdraw
+            return STATUS_OK, lock_amount
+        if at_time is None:
+            at_time = self.block_timestamp.timestamp
+        if at_time <= end_time:
+            return STATUS_NOT_ENDED, 0
+        if amount_to_withdraw > lock_amount * self.max_multiplier_to_withdraw:
+            return STATUS_WITHDRAW_CAP, 0
+        return STATUS_OK, amount_to_withdraw
+
+    def _withdrawal_projection(self, address):  # (end_time, lock_amount, amount)
+        user_stake = self._read_stake(address)
+        if user_stake is None:
+            return None
+        lock_amount = user_stake.lock_amount
+        return (
+            user_stake.start_time + user_stake.lock_duration,
+            lock_amount,
+            lock_amount + user_stake.reward,
+        )
+
+    # maturity queries (treasury planning, no solidity counterpart)
+    def maturing_between(self, t0, t1):  # addresses with t0 <= stake end < t1
+        return self.maturity_index.maturing_between(t0, t1)
+
+    def liability_schedule(self):  # [(epoch_start_time, lock_amount + reward), ...]
+        return self.maturity_index.liability_schedule()
+
+    # aggregate queries (running totals, no solidity counterpart)
+    def stats(self):
+        if self.debug:
+            self.check_stats()
+        return self._make_stats(*self._running_totals())
+
+    def check_stats(self):  # debug consistency check against a full recompute
+        stats = self._make_stats(*self._running_totals())
+        expected = self._make_stats(*self._scan_totals())
+        if (
+            stats.total_locked != expected.total_locked
+            or stats.staker_count != expected.staker_count
+            or not math.isclose(stats.total_reward, expected.total_reward)
+            or not math.isclose(
+                stats.average_lock_duration, expected.average_lock_duration
+            )
+        ):
+            raise AssertionError(
+                f"Running stats {stats} do not match recomputed stats {expected}"
+            )
 
     # emergency functions (onlyOwner functions in solidity)
     def set_emergency_pause(self, emergency_pause):  # pause all stake functions
         if self.emergency_pause != emergency_pause:
             self.emergency_pause = emergency_pause
-            print(f"Emergency pause set to {emergency_pause}")
+            self.event_sink.emit(events.EmergencyPauseSet, emergency_pause)
 
     def set_emergency_withdraw(
         self, emergency_withdraw
     ):  # allow all users to withdraw their stakes
         if self.emergency_withdraw != emergency_withdraw:
             self.emergency_withdraw = emergency_withdraw
-            print(f"Emergency withdraw set to: {emergency_withdraw}")
+            self.event_sink.emit(events.EmergencyWithdrawSet, emergency_withdraw)
 
     # util functions
     def _get_next_epoch_start_time(self, current_time):
         if current_time <= 0:
-            print("Error: Invalid current time.")
+            self.event_sink.emit(events.InvalidCurrentTime, current_time)
             return 0
         seconds_since_epoch = current_time % EPOCH_IN_SECONDS  # unix epoch starts on a Thursday 00:00:00 UTC
         next_epoch_start_time = current_time + EPOCH_IN_SECONDS - seconds_since_epoch
@@ -104,29 +240,203 @@ class Staking:
             return 0
         return next_epoch_start_time
 
+    # bookkeeping of derived state (maturity index and running aggregates),
+    # called on every stake mutation. Stakes written straight into self.stakes
+    # are not tracked until rebuild_derived_state() is called.
+    # `totals` (as returned by _scan_totals) skips the full scan when the totals
+    # are already known, e.g. from a snapshot; the maturity index is then
+    # rebuilt on its first query.
+    def rebuild_derived_state(self, totals=None):
+        if totals is None:
+            self.maturity_index.rebuild(self.stakes)
+            totals = self._scan_totals()
+        else:
+            self.maturity_index.defer_rebuild(self.stakes)
+        (
+            self._total_locked,
+            self._total_reward,
+            self._staker_count,
+            self._total_locked_duration,
+        ) = totals
+
+    def _running_totals(self):  # same layout as _scan_totals
+        return (
+            self._total_locked,
+            self._total_reward,
+            self._staker_count,
+            self._total_locked_duration,
+        )
+
+    def _scan_totals(self):  # full scan of the stake book
+        scan_totals = getattr(self.stakes, "scan_totals", None)
+        if scan_totals is not None:  # column sums, e.g. ColumnarStakeBook
+            return scan_totals()
+        total_locked = 0
+        total_reward = 0.0
+        total_locked_duration = 0
+        for user_stake in self.stakes.values():
+            total_locked += user_stake.lock_amount
+            total_reward += user_stake.reward
+            total_locked_duration += user_stake.lock_amount * user_stake.lock_duration
+        return total_locked, total_reward, len(self.stakes), total_locked_duration
+
+    @staticmethod
+    def _make_stats(total_locked, total_reward, staker_count, total_locked_duration):
+        return StakingStats(
+            total_locked=total_locked,
+            total_reward=total_reward,
+            staker_count=staker_count,
+            average_lock_duration=(
+                total_locked_duration / total_locked if total_locked else 0.0
+            ),
+        )
+
+    def _keep_rows_in_forks(self, address):
+        # called before the row of `address` is written, added or removed
+        # while forks are alive (`if self._forks:`), see fork()
+        self._forks = keep_rows(self._forks, address)
+
+    # derived state of one row: called by stake(), unstake() and the apply_*
+    # mirror functions only, the batch functions call the batch hooks below
+    def _on_stake_created(self, address, user_stake):
+        self.maturity_index.add(
+            address,
+            user_stake.start_time + user_stake.lock_duration,
+            user_stake.lock_amount + user_stake.reward,
+        )
+        self._total_locked += user_stake.lock_amount
+        self._total_reward += user_stake.reward
+        self._staker_count += 1
+        self._total_locked_duration += user_stake.lock_amount * user_stake.lock_duration
+
+    def _on_stake_topped_up(self, address, user_stake, lock_amount, reward):
+        if self.maturity_index.add_liability(
+            address,
+            user_stake.start_time + user_stake.lock_duration,
+            lock_amount + reward,
+        ):
+            self._total_locked += lock_amount
+            self._total_reward += reward
+            self._total_locked_duration += lock_amount * user_stake.lock_duration
+
+    def _on_stake_removed(self, address, user_stake):
+        if self.maturity_index.remove(
+            address,
+            user_stake.start_time + user_stake.lock_duration,
+            user_stake.lock_amount + user_stake.reward,
+        ):
+            self._total_locked -= user_stake.lock_amount
+            self._total_reward -= user_stake.reward
+            self._staker_count -= 1
+            self._total_locked_duration -= (
+                user_stake.lock_amount * user_stake.lock_duration
+            )
+
+    # derived state of a stake_many / unstake_many batch, applied once per batch
+    # in row order so the float reward total matches the per-row hooks exactly.
+    # These replace the per-row hooks for the batch functions: stake_many and
+    # unstake_many never call _on_stake_created / _on_stake_topped_up /
+    # _on_stake_removed, so a subclass overriding those must override these
+    # too. A change is (address, end_time, liability, lock_amount, reward,
+    # lock_duration), plus whether the stake is new for stake_many (the new
+    # and top-up counts of a batch), with the amounts the row added or
+    # removed. Changes hold no Stake, so the garbage collector untracks them
+    # instead of rescanning them on every collection.
+    def _on_stakes_staked(self, changes):
+        index = self.maturity_index
+        untracked = index.add_many(map(itemgetter(0, 1, 2, 6), changes))
+        changes = _drop_positions(changes, untracked)  # untracked top-ups
+        self._total_locked += sum(map(itemgetter(3), changes))
+        self._total_reward = reduce(
+            add, map(itemgetter(4), changes), self._total_reward
+        )
+        self._staker_count += sum(map(itemgetter(6), changes))
+        self._total_locked_duration += sum(
+            map(mul, map(itemgetter(3), changes), map(itemgetter(5), changes))
+        )
+
+    def _on_stakes_removed(self, changes):
+        index = self.maturity_index
+        untracked = index.remove_many(map(itemgetter(0, 1, 2), changes))
+        changes = _drop_positions(changes, untracked)
+        self._total_locked -= sum(map(itemgetter(3), changes))
+        self._total_reward = reduce(
+            sub, map(itemgetter(4), changes), self._total_reward
+        )
+        self._staker_count -= len(changes)
+        self._total_locked_duration -= sum(
+            map(mul, map(itemgetter(3), changes), map(itemgetter(5), changes))
+        )
+
     # validate stake parameters
     def _validate_stake_params(self, lock_amount, lock_duration):
         if lock_amount <= 0:
-            print("Error: Lock amount must be positive.")
+            self.event_sink.emit(
+                events.InvalidStakeParams,
+                lock_amount,
+                lock_duration,
+                "Lock amount must be positive.",
+            )
             return False
-        if lock_amount > MAX_LOCK_AMOUNT:
-            print(
-                "Error: Lock amount must be less than or equal to 1% of total supply."
+        if lock_amount > self.max_lock_amount:
+            self.event_sink.emit(
+                events.InvalidStakeParams,
+                lock_amount,
+                lock_duration,
+                f"Lock amount must be less than or equal to {self.max_lock_amount}.",
             )
             return False
         if lock_duration < EPOCH_IN_SECONDS:
-            print("Error: Lock duration must be at least 1 epoch.")
+            self.event_sink.emit(
+                events.InvalidStakeParams,
+                lock_amount,
+                lock_duration,
+                "Lock duration must be at least 1 epoch.",
+            )
             return False
-        if lock_duration > MAX_LOCK_DURATION:
-            print("Error: Lock duration must be less than or equal to 52 epochs.")
+        if lock_duration > self.max_lock_duration:
+            self.event_sink.emit(
+                events.InvalidStakeParams,
+                lock_amount,
+                lock_duration,
+                f"Lock duration must be less than or equal to "
+                f"{self.max_lock_duration // EPOCH_IN_SECONDS} epochs.",
+            )
             return False
         return True
 
+    def _validate_stake_params_many(self, lock_amounts, lock_durations):
+        # same checks and order as _validate_stake_params, one status per row
+        max_lock_amount = self.max_lock_amount
+        max_lock_duration = self.max_lock_duration
+        if (
+            lock_amounts
+            and len(lock_amounts) == len(lock_durations)
+            and min(lock_amounts) > 0
+            and max(lock_amounts) <= max_lock_amount
+            and min(lock_durations) >= EPOCH_IN_SECONDS
+            and max(lock_durations) <= max_lock_duration
+        ):  # whole batch valid, checked with four passes over the columns
+            return array("b", bytes(len(lock_amounts)))
+
+        def status(lock_amount, lock_duration):
+            if lock_amount <= 0:
+                return STATUS_INVALID_AMOUNT
+            if lock_amount > max_lock_amount:
+                return STATUS_AMOUNT_TOO_LARGE
+            if lock_duration < EPOCH_IN_SECONDS:
+                return STATUS_DURATION_TOO_SHORT
+            if lock_duration > max_lock_duration:
+                return STATUS_DURATION_TOO_LONG
+            return STATUS_OK
+
+        return array("b", map(status, lock_amounts, lock_durations))
+
     # main stake functions
     def stake(self, address, lock_amount, lock_duration):  # lock_duration in seconds
 
         if self.emergency_pause:
-            print("Error: Emergency pause is active. Please try again later.")
+            self.event_sink.emit(events.EmergencyPauseActive)
             return
 
         if not self._validate_stake_params(lock_amount, lock_duration):
@@ -138,17 +448,27 @@ class Staking:
         if address not in self.stakes:  # solidity: stakes[msg.sender].lockAmount == 0
             next_epoch_start_time = self._get_next_epoch_start_time(current_time)
             if next_epoch_start_time <= 0:
-                print("Error: Invalid next epoch start time. Please try again.")
+                self.event_sink.emit(events.InvalidEpochStart, address)
                 return
             epoch_num = lock_duration // EPOCH_IN_SECONDS
             _reward = lock_amount * epoch_num * self.reward_rate_per_epoch / 100
+            if self._forks:
+                self._keep_rows_in_forks(address)
             self.stakes[address] = Stake(
                 lock_amount=lock_amount,
                 start_time=next_epoch_start_time,
                 lock_duration=epoch_num * EPOCH_IN_SECONDS,
                 reward=_reward,
             )
-            print(f"Stake for {address} created: {self.stakes[address]}")
+            self._on_stake_created(address, self.stakes[address])
+            self.event_sink.emit(
+                events.StakeCreated,
+                address,
+                lock_amount,
+                next_epoch_start_time,
+                epoch_num * EPOCH_IN_SECONDS,
+                _reward,
+            )
         else:  # existing stake
             remaining_time = (
                 self.stakes[address].start_time
@@ -156,37 +476,55 @@ class Staking:
                 - current_time
             )
             if remaining_time > self.stakes[address].lock_duration + EPOCH_IN_SECONDS:
-                print("Error: Invalid remaining time. Please try again.")
+                self.event_sink.emit(events.InvalidRemainingTime, address)
                 return
             if remaining_time <= EPOCH_IN_SECONDS:
-                print("Error: Cannot deposit to stake nearing or past its end.")
+                self.event_sink.emit(events.StakeNearEnd, address)
                 return
             remaining_epoch_num = remaining_time // EPOCH_IN_SECONDS
             _reward = (
                 lock_amount * remaining_epoch_num * self.reward_rate_per_epoch / 100
             )
+            if self._forks:
+                self._keep_rows_in_forks(address)
             self.stakes[address].lock_amount += lock_amount
             self.stakes[address].reward += _reward
-            print(f"Stake for {address} updated: {self.stakes[address]}")
+            self._on_stake_topped_up(
+                address, self.stakes[address], lock_amount, _reward
+            )
+            user_stake = self.stakes[address]
+            self.event_sink.emit(
+                events.StakeUpdated,
+                address,
+                user_stake.lock_amount,
+                user_stake.start_time,
+                user_stake.lock_duration,
+                user_stake.reward,
+            )
 
     # address = msg.sender
     def unstake(self, address):
 
         if self.emergency_pause and not self.emergency_withdraw:
-            print("Error: Emergency pause is active. Please try again later.")
+            self.event_sink.emit(events.EmergencyPauseActive)
             return 0
 
         # allow all users to withdraw their stakes in case of emergency
         if self.emergency_pause and self.emergency_withdraw:
             if address in self.stakes:
-                amount_to_withdraw = self.stakes[address].lock_amount
-                self.stakes.pop(address)
-                print(f"Emergency withdraw for {address}: {amount_to_withdraw}")
+                if self._forks:
+                    self._keep_rows_in_forks(address)
+                user_stake = self.stakes.pop(address)
+                amount_to_withdraw = user_stake.lock_amount
+                self._on_stake_removed(address, user_stake)
+                self.event_sink.emit(
+                    events.EmergencyWithdraw, address, amount_to_withdraw
+                )
                 return amount_to_withdraw
 
         # check if user has stake
         if address not in self.stakes:  # solidity: stakes[msg.sender].lockAmount == 0
-            print(f"Error: No stake found for address {address}.")
+            self.event_sink.emit(events.NoStakeFound, address)
             return 0
 
         current_time = self.block_timestamp.timestamp  # solidity: block.timestamp
@@ -194,7 +532,7 @@ class Staking:
             current_time
             <= self.stakes[address].start_time + self.stakes[address].lock_duration
         ):
-            print("Error: Cannot withdraw from stake that has not reached its end.")
+            self.event_sink.emit(events.StakeNotEnded, address)
             return 0
 
         amount_to_withdraw = (
@@ -203,11 +541,223 @@ class Staking:
 
         if (
             amount_to_withdraw
-            > self.stakes[address].lock_amount * MAX_MULTIPLIER_TO_WITHDRAW
+            > self.stakes[address].lock_amount * self.max_multiplier_to_withdraw
         ):
-            print("Error: Cannot withdraw more than 300% of lock amount.")
+            self.event_sink.emit(
+                events.WithdrawCapExceeded,
+                address,
+                amount_to_withdraw,
+                self.max_multiplier_to_withdraw,
+            )
             return 0
 
-        self.stakes.pop(address)
-        print(f"Withdraw for {address}: {amount_to_withdraw}")
+        if self._forks:
+            self._keep_rows_in_forks(address)
+        self._on_stake_removed(address, self.stakes.pop(address))
+        self.event_sink.emit(events.Withdraw, address, amount_to_withdraw)
         return amount_to_withdraw
+
+    # what-if analysis (no solidity counterpart)
+    def fork(self):
+        # copy-on-write copy for trying out changes: the stakes are shared with
+        # this instance until either side changes them (see CopyOnWriteBook),
+        # the fork's maturity index is only built if it is queried
+        forked = copy.copy(self)
+        forked.stakes = CopyOnWriteBook(self.stakes)
+        forked._forks = []
+        self._forks.append(weakref.ref(forked.stakes))
+        forked.block_timestamp = BlockTimestamp(self.block_timestamp.timestamp)
+        forked.maturity_index = MaturityIndex(EPOCH_IN_SECONDS)
+        forked.rebuild_derived_state(totals=self._running_totals())
+        return forked
+
+    # chain mirror (state from the contract's event logs, no solidity counterpart)
+    def apply_stake_initiated(
+        self, address, lock_amount, start_time, lock_duration, reward
+    ):  # StakeInitiated
+        if self._forks:
+            self._keep_rows_in_forks(address)
+        previous = self.stakes.pop(address, None)
+        if previous is not None:
+            self._on_stake_removed(address, previous)
+        self.stakes[address] = Stake(lock_amount, start_time, lock_duration, reward)
+        self._on_stake_created(address, self.stakes[address])
+
+    def apply_stake_updated(self, address, lock_amount, reward):  # StakeUpdated
+        # the log carries the new totals of the stake
+        user_stake = self.stakes.get(address)
+        if user_stake is None:
+            return False
+        added_amount = lock_amount - user_stake.lock_amount
+        added_reward = reward - user_stake.reward
+        if self._forks:
+            self._keep_rows_in_forks(address)
+        user_stake.lock_amount = lock_amount
+        user_stake.reward = reward
+        self._on_stake_topped_up(address, user_stake, added_amount, added_reward)
+        return True
+
+    def apply_stake_withdrawn(self, address):  # Stake*Withdrawn
+        if self._forks:
+            self._keep_rows_in_forks(address)
+        user_stake = self.stakes.pop(address, None)
+        if user_stake is None:
+            return False
+        self._on_stake_removed(address, user_stake)
+        return True
+
+    # batch functions (replay helpers, no solidity counterpart)
+    # rows are applied in order, so repeated addresses behave exactly like
+    # consecutive stake()/unstake() calls; errors are reported as statuses.
+    # Throughput is only 1.2-1.5x a stake()/unstake() loop with a NullSink
+    # (benchmarks stake_many_* / unstake_many), far from the 50-100x first
+    # aimed for: every row still builds or updates a Stake in Python.
+    def stake_many(self, addresses, lock_amounts, lock_durations):
+        if self.emergency_pause:
+            return array("b", [STATUS_EMERGENCY_PAUSE]) * len(addresses)
+
+        statuses = self._validate_stake_params_many(lock_amounts, lock_durations)
+
+        current_time = self.block_timestamp.timestamp  # solidity: block.timestamp
+        next_epoch_start_time = 0
+        if current_time > 0:
+            next_epoch_start_time = (
+                current_time + EPOCH_IN_SECONDS - current_time % EPOCH_IN_SECONDS
+            )
+            if next_epoch_start_time <= current_time:
+                next_epoch_start_time = 0
+        reward_rate_per_epoch = self.reward_rate_per_epoch
+        stakes = self.stakes
+        keep_rows = self._keep_rows_in_forks if self._forks else None
+        changes = []  # derived state is updated once, after the loop
+
+        rows = zip(addresses, lock_amounts, lock_durations)
+        for i, (address, lock_amount, lock_duration) in enumerate(rows):
+            if statuses[i] != STATUS_OK:
+                continue
+            user_stake = stakes.get(address)
+            if user_stake is None:  # new stake
+                if next_epoch_start_time <= 0:
+                    statuses[i] = STATUS_INVALID_EPOCH_START
+                    continue
+                epoch_num = lock_duration // EPOCH_IN_SECONDS
+                user_stake = Stake(
+                    lock_amount=lock_amount,
+                    start_time=next_epoch_start_time,
+                    lock_duration=epoch_num * EPOCH_IN_SECONDS,
+                    reward=lock_amount * epoch_num * reward_rate_per_epoch / 100,
+                )
+                if keep_rows:
+                    keep_rows(address)
+                stakes[address] = user_stake
+                lock_duration = user_stake.lock_duration
+                reward = user_stake.reward
+                changes.append(
+                    (
+                        address,
+                        next_epoch_start_time + lock_duration,
+                        lock_amount + reward,
+                        lock_amount,
+                        reward,
+                        lock_duration,
+                        True,
+                    )
+                )
+            else:  # existing stake
+                lock_duration = user_stake.lock_duration
+                remaining_time = user_stake.start_time + lock_duration - current_time
+                if remaining_time > lock_duration + EPOCH_IN_SECONDS:
+                    statuses[i] = STATUS_INVALID_REMAINING_TIME
+                    continue
+                if remaining_time <= EPOCH_IN_SECONDS:
+                    statuses[i] = STATUS_STAKE_NEAR_END
+                    continue
+                remaining_epoch_num = remaining_time // EPOCH_IN_SECONDS
+                reward = lock_amount * remaining_epoch_num * reward_rate_per_epoch / 100
+                if keep_rows:
+                    keep_rows(address)
+                user_stake.lock_amount += lock_amount
+                user_stake.reward += reward
+                changes.append(
+                    (
+                        address,
+                        user_stake.start_time + lock_duration,
+                        lock_amount + reward,
+                        lock_amount,
+                        reward,
+                        lock_duration,
+                        False,
+                    )
+                )
+        if changes:
+            self._on_stakes_staked(changes)
+        return statuses
+
+    def unstake_many(self, addresses):  # returns (statuses, amounts withdrawn)
+        amounts = [0] * len(addresses)
+        if self.emergency_pause and not self.emergency_withdraw:
+            return array("b", [STATUS_EMERGENCY_PAUSE]) * len(addresses), amounts
+
+        statuses = array("b", bytes(len(addresses)))
+        emergency = self.emergency_pause and self.emergency_withdraw
+        current_time = self.block_timestamp.timestamp  # solidity: block.timestamp
+        max_multiplier_to_withdraw = self.max_multiplier_to_withdraw
+        stakes = self.stakes
+        keep_rows = self._keep_rows_in_forks if self._forks else None
+        changes = []  # derived state is updated once, after the loop
+
+        for i, address in enumerate(addresses):
+            if emergency:  # single lookup, the row is removed either way
+                if keep_rows:
+                    keep_rows(address)
+                user_stake = stakes.pop(address, None)
+                if user_stake is None:
+                    statuses[i] = STATUS_NO_STAKE
+                    continue
+                lock_amount = user_stake.lock_amount
+                reward = user_stake.reward
+                lock_duration = user_stake.lock_duration
+                changes.append(
+                    (
+                        address,
+                        user_stake.start_time + lock_duration,
+                        lock_amount + reward,
+                        lock_amount,
+                        reward,
+                        lock_duration,
+                    )
+                )
+                amounts[i] = lock_amount
+                continue
+            user_stake = stakes.get(address)
+            if user_stake is None:
+                statuses[i] = STATUS_NO_STAKE
+                continue
+            lock_amount = user_stake.lock_amount
+            lock_duration = user_stake.lock_duration
+            end_time = user_stake.start_time + lock_duration
+            if current_time <= end_time:
+                statuses[i] = STATUS_NOT_ENDED
+                continue
+            reward = user_stake.reward
+            amount_to_withdraw = lock_amount + reward
+            if amount_to_withdraw > lock_amount * max_multiplier_to_withdraw:
+                statuses[i] = STATUS_WITHDRAW_CAP
+                continue
+            if keep_rows:
+                keep_rows(address)
+            stakes.pop(address)
+            changes.append(
+                (
+                    address,
+                    end_time,
+                    amount_to_withdraw,
+                    lock_amount,
+                    reward,
+                    lock_duration,
+                )
+            )
+            amounts[i] = amount_to_withdraw
+        if changes:
+            self._on_stakes_removed(changes)
+        return statuses, amounts
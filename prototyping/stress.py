@@ -0,0 +1,126 @@
+"""
+Bank-run stress test of a Staking instance.
+
+A seeded sample of `fraction` of the stakers exits within one epoch, in
+blocks of `exits_per_block` withdrawals every `block_time` seconds, through
+unstake_many (regular withdrawals, or emergency withdrawals with both
+emergency flags set). The contract's token balance
+(getContractRewardTokenBalance() in utility_stacking.sol) is kept as a
+running total: it starts at the locked amount plus the `reward_reserve`
+funded by the owner, and every payout is booked against it, also when it
+cannot be covered, so the shortfall is reported as well.
+
+The run mutates the instance it is given; use a fork to keep the original:
+
+    result = bank_run(staking.fork(), fraction=0.3, emergency=True)
+"""
+
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+
+from prototyping.staking import STATUS_OK
+
+DEFAULT_BLOCK_TIME = 12  # seconds
+DEFAULT_EXITS_PER_BLOCK = 1000
+
+
+@dataclass
+class InsolvencyPoint:  # first withdrawal the balance cannot cover
+    time: int
+    exit_index: int  # position in the exit order
+    address: str
+    balance: int  # before the withdrawal
+    amount: int
+
+
+@dataclass
+class BankRunResult:
+    stakers: int = field(default=0)  # before the run
+    exits: int = field(default=0)  # withdrawal attempts
+    exits_paid: int = field(default=0)
+    rejections: Counter = field(default_factory=Counter)  # status -> count
+    total_paid: int = field(default=0)
+    balance_start: int = field(default=0)
+    balance_end: int = field(default=0)  # negative once insolvent
+    liability_end: int = field(default=0)  # lock amounts + rewards still owed
+    # seconds from the first exit block until the balance no longer covers
+    # what the stakers that stay can withdraw, None if it always does
+    time_to_drain: int = field(default=None)
+    first_insolvency: InsolvencyPoint = field(default=None)
+    shortfall: int = field(default=0)  # payouts the balance could not cover
+    # (time, balance) after every exit block
+    balance_curve: list = field(default_factory=list)
+
+
+def bank_run(
+    staking,
+    fraction=1.0,
+    emergency=False,
+    reward_reserve=0,
+    seed=0,
+    start_time=None,
+    block_time=DEFAULT_BLOCK_TIME,
+    exits_per_block=DEFAULT_EXITS_PER_BLOCK,
+    sweep_time=None,  # owner calls emergency() this many seconds into the run
+):
+    addresses = list(staking.stakes)
+    exit_count = round(len(addresses) * fraction)
+    exiting = random.Random(seed).sample(addresses, exit_count)
+    if emergency:
+        staking.set_emergency_pause(True)
+        staking.set_emergency_withdraw(True)
+    if start_time is None:
+        start_time = staking.block_timestamp.timestamp
+
+    stats = staking.stats()
+    balance = stats.total_locked + reward_reserve
+    result = BankRunResult(
+        stakers=stats.staker_count,
+        exits=len(exiting),
+        balance_start=balance,
+    )
+    swept = sweep_time is None
+    for block, first in enumerate(range(0, len(exiting), exits_per_block)):
+        time = start_time + block * block_time
+        if not swept and time >= start_time + sweep_time:
+            balance = min(balance, 0)  # emergency() transfers the whole balance
+            swept = True
+        staking.block_timestamp.set_timestamp(time)
+        batch = exiting[first : first + exits_per_block]
+        statuses, amounts = staking.unstake_many(batch)
+
+        paid = sum(amounts)
+        if result.first_insolvency is None and paid > balance:
+            # the first payout of the block that overdraws the balance
+            running = balance
+            for i, amount in enumerate(amounts):
+                if amount > running:
+                    result.first_insolvency = InsolvencyPoint(
+                        time, first + i, batch[i], running, amount
+                    )
+                    break
+                running -= amount
+        result.shortfall += min(paid, max(paid - balance, 0))
+        balance -= paid
+        result.total_paid += paid
+        counts = Counter(statuses)
+        result.exits_paid += counts.pop(STATUS_OK, 0)
+        result.rejections.update(counts)
+
+        if result.time_to_drain is None and balance < _liability(staking, emergency):
+            result.time_to_drain = time - start_time
+        result.balance_curve.append((time, balance))
+
+    result.balance_end = balance
+    result.liability_end = _liability(staking, emergency)
+    return result
+
+
+def _liability(staking, emergency):
+    # what the remaining stakers can withdraw, emergency withdrawals forfeit
+    # the rewards
+    stats = staking.stats()
+    if emergency:
+        return stats.total_locked
+    return stats.total_locked + stats.total_reward
@@ -0,0 +1,242 @@
+"""
+Parameter sweeps of Staking policies over a shared staker workload.
+
+The workload is stored once as flat columns in a multiprocessing shared memory
+block; every pool worker attaches to it when it starts and replays it through
+a Simulation for each scenario it is given, so only the (small) scenarios and
+results travel between processes.
+
+    workload = Workload.from_events(events)
+    rows = run_sweep(workload, grid(reward_rate_per_epoch=[2, 5, 10],
+                                    max_lock_duration=[26 * EPOCH_IN_SECONDS]))
+    write_csv(rows, "sweep.csv")
+"""
+
+import csv
+import itertools
+import multiprocessing
+from array import array
+from dataclasses import asdict, dataclass, field
+from multiprocessing import shared_memory
+
+from prototyping import events
+from prototyping.simulation import Simulation, StakeEvent, UnstakeEvent
+from prototyping.staking import (
+    MAX_LOCK_AMOUNT,
+    MAX_LOCK_DURATION,
+    MAX_MULTIPLIER_TO_WITHDRAW,
+    STATUS_AMOUNT_TOO_LARGE,
+    STATUS_DURATION_TOO_LONG,
+    STATUS_DURATION_TOO_SHORT,
+    STATUS_INVALID_AMOUNT,
+    STATUS_STAKE_NEAR_END,
+    STATUS_WITHDRAW_CAP,
+    BlockTimestamp,
+    Staking,
+)
+
+_STAKE = 0
+_UNSTAKE = 1
+_WORD_MASK = (1 << 64) - 1
+
+# rejection statuses reported as separate columns
+REJECTION_COLUMNS = {
+    STATUS_INVALID_AMOUNT: "rejected_invalid_amount",
+    STATUS_AMOUNT_TOO_LARGE: "rejected_amount_too_large",
+    STATUS_DURATION_TOO_SHORT: "rejected_duration_too_short",
+    STATUS_DURATION_TOO_LONG: "rejected_duration_too_long",
+    STATUS_STAKE_NEAR_END: "rejected_stake_near_end",
+    STATUS_WITHDRAW_CAP: "rejected_withdraw_cap",
+}
+
+
+@dataclass
+class Scenario:
+    reward_rate_per_epoch: int = field(default=10)
+    max_lock_duration: int = field(default=MAX_LOCK_DURATION)
+    max_lock_amount: int = field(default=MAX_LOCK_AMOUNT)
+    max_multiplier_to_withdraw: int = field(default=MAX_MULTIPLIER_TO_WITHDRAW)
+
+
+def grid(**values):
+    # cartesian product of Scenario fields, e.g. grid(reward_rate_per_epoch=[5, 10])
+    names = list(values)
+    return [
+        Scenario(**dict(zip(names, combination)))
+        for combination in itertools.product(*values.values())
+    ]
+
+
+class Workload:
+    """
+    Stake / unstake events as flat columns (kind, time, user, amount split
+    into two uint64 halves, lock duration). Users are integer ids, replayed
+    as "0x..." addresses.
+    """
+
+    _COLUMNS = [
+        ("kinds", "b"),
+        ("times", "q"),
+        ("users", "q"),
+        ("amounts_hi", "Q"),
+        ("amounts_lo", "Q"),
+        ("durations", "q"),
+    ]
+
+    def __init__(self, kinds, times, users, amounts_hi, amounts_lo, durations):
+        self.kinds = kinds
+        self.times = times
+        self.users = users
+        self.amounts_hi = amounts_hi
+        self.amounts_lo = amounts_lo
+        self.durations = durations
+
+    @classmethod
+    def from_events(cls, workload_events):
+        # StakeEvent / UnstakeEvent in time order, addresses are mapped to ids
+        columns = {name: array(typecode) for name, typecode in cls._COLUMNS}
+        user_ids = {}
+        for event in workload_events:
+            user = user_ids.setdefault(event.address, len(user_ids))
+            columns["times"].append(event.time)
+            columns["users"].append(user)
+            if isinstance(event, StakeEvent):
+                columns["kinds"].append(_STAKE)
+                columns["amounts_hi"].append(event.lock_amount >> 64)
+                columns["amounts_lo"].append(event.lock_amount & _WORD_MASK)
+                columns["durations"].append(event.lock_duration)
+            elif isinstance(event, UnstakeEvent):
+                columns["kinds"].append(_UNSTAKE)
+                columns["amounts_hi"].append(0)
+                columns["amounts_lo"].append(0)
+                columns["durations"].append(0)
+            else:
+                raise TypeError(f"Unsupported workload event: {event!r}")
+        return cls(**columns)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def events(self):
+        kinds, times, users = self.kinds, self.times, self.users
+        amounts_hi, amounts_lo = self.amounts_hi, self.amounts_lo
+        durations = self.durations
+        for i in range(len(kinds)):
+            address = f"0x{users[i]:040x}"
+            if kinds[i] == _STAKE:
+                yield StakeEvent(
+                    times[i],
+                    address,
+                    (amounts_hi[i] << 64) | amounts_lo[i],
+                    durations[i],
+                )
+            else:
+                yield UnstakeEvent(times[i], address)
+
+    # shared memory
+    def share(self):
+        # copies the columns into a new shared memory block, returns the block
+        # and the layout workers need to attach to it
+        layout = []
+        offset = 0
+        for name, typecode in self._COLUMNS:
+            column = getattr(self, name)
+            nbytes = len(column) * column.itemsize
+            layout.append((name, typecode, offset, nbytes))
+            offset += (nbytes + 7) & ~7
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, _, start, nbytes in layout:
+            data = memoryview(getattr(self, name)).cast("B")
+            block.buf[start : start + nbytes] = data
+        return block, layout
+
+    @classmethod
+    def attach(cls, block, layout):
+        # zero-copy view over a block written by share()
+        columns = {
+            name: block.buf[start : start + nbytes].cast(typecode)
+            for name, typecode, start, nbytes in layout
+        }
+        return cls(**columns)
+
+
+def run_scenario(workload, scenario):
+    # liability (lock amounts + rewards outstanding) is sampled at every epoch
+    # start and at the end of the run
+    start_time = workload.times[0] if len(workload) else 0
+    staking = Staking(
+        utility_token_addr="0x1111",
+        reward_rate_per_epoch=scenario.reward_rate_per_epoch,
+        block_timestamp=BlockTimestamp(start_time),
+        event_sink=events.NullSink(),
+        max_lock_duration=scenario.max_lock_duration,
+        max_lock_amount=scenario.max_lock_amount,
+        max_multiplier_to_withdraw=scenario.max_multiplier_to_withdraw,
+    )
+    liability_peak = 0
+
+    def track_liability(simulation, epoch_start_time):
+        nonlocal liability_peak
+        stats = staking.stats()
+        liability_peak = max(liability_peak, stats.total_locked + stats.total_reward)
+
+    simulation = Simulation(staking, workload.events())
+    simulation.on_epoch(track_liability)
+    result = simulation.run()
+    track_liability(simulation, result.end_time)
+    stats = staking.stats()
+
+    row = asdict(scenario)
+    row.update(
+        total_payout=result.total_withdrawn,
+        liability_peak=liability_peak,
+        liability_end=stats.total_locked + stats.total_reward,
+        stakers_end=stats.staker_count,
+        stakes_applied=result.stakes_applied,
+        stakes_rejected=result.stakes_rejected,
+        unstakes_applied=result.unstakes_applied,
+        unstakes_rejected=result.unstakes_rejected,
+    )
+    for status, column in REJECTION_COLUMNS.items():
+        row[column] = result.rejections[status]
+    return row
+
+
+# process pool
+_worker_block = None
+_worker_workload = None
+
+
+def _attach_worker(block_name, layout):
+    global _worker_block, _worker_workload
+    # pool workers share the parent's resource tracker, which unlinks the
+    # block if the parent dies before run_sweep() does
+    _worker_block = shared_memory.SharedMemory(name=block_name)
+    _worker_workload = Workload.attach(_worker_block, layout)
+
+
+def _run_in_worker(scenario):
+    return run_scenario(_worker_workload, scenario)
+
+
+def run_sweep(workload, scenarios, processes=None):
+    # one row per scenario, in scenario order; processes=1 runs in-process
+    if processes == 1:
+        return [run_scenario(workload, scenario) for scenario in scenarios]
+    block, layout = workload.share()
+    try:
+        with multiprocessing.Pool(
+            processes, initializer=_attach_worker, initargs=(block.name, layout)
+        ) as pool:
+            return pool.map(_run_in_worker, scenarios, chunksize=1)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def write_csv(rows, path):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+
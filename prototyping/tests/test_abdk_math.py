@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from prototyping import abdk_math
+
+
+def test_exact_values():
+    """
+    Test: Values with an exact 64.64 representation.
+
+    Expected: log_2(2^k) == k, ln(1) == 0, mul/div round like solidity
+    (mul rounds down, div rounds towards zero).
+    """
+    one = abdk_math.from_uint(1)
+    half = abdk_math.div(one, abdk_math.from_uint(2))
+
+    assert abdk_math.log_2(abdk_math.from_uint(8)) == 3 << 64
+    assert abdk_math.log_2(half) == -1 << 64
+    assert abdk_math.ln(one) == 0
+    assert abdk_math.add(one, half) == 3 << 63
+    assert abdk_math.mul(abdk_math.from_int(-3), half) == -3 << 63
+    assert abdk_math.div(-1, abdk_math.from_uint(2)) == 0
+    assert abdk_math.mul(-1, half) == -1
+
+
+def test_logarithms_close_to_float():
+    """
+    Test: log_2 and ln of integers and of a value below 1 (ln wraps around
+    in uint256 on chain).
+
+    Expected: Within 1e-15 of the float result.
+    """
+    for value in [3, 10, 12345, 2**40 + 7]:
+        x = abdk_math.from_uint(value)
+        assert abdk_math.log_2(x) / 2**64 == pytest.approx(math.log2(value), 1e-15)
+        assert abdk_math.ln(x) / 2**64 == pytest.approx(math.log(value), 1e-15)
+    third = abdk_math.div(abdk_math.from_uint(1), abdk_math.from_uint(3))
+    assert abdk_math.ln(third) / 2**64 == pytest.approx(math.log(1 / 3), 1e-15)
+
+
+def test_require_failures():
+    """
+    Test: Inputs that revert in solidity.
+
+    Expected: ArithmeticError.
+    """
+    with pytest.raises(ArithmeticError):
+        abdk_math.log_2(0)
+    with pytest.raises(ArithmeticError):
+        abdk_math.from_uint(2**63)
+    with pytest.raises(ArithmeticError):
+        abdk_math.div(1, 0)
+    with pytest.raises(ArithmeticError):
+        abdk_math.add(abdk_math.MAX_64x64, 1)
+
+
+def test_batch_matches_scalar():
+    """
+    Test: Batch log_2/ln and governance rewards over repeated inputs.
+
+    Expected: Identical to the scalar functions.
+    """
+    xs = [abdk_math.from_uint(v % 17 + 1) for v in range(100)] + [1, 5, 2**126]
+    assert abdk_math.log_2_many(xs) == [abdk_math.log_2(x) for x in xs]
+    assert abdk_math.ln_many(xs) == [abdk_math.ln(x) for x in xs]
+
+    staking_balances = [10**18 * v for v in range(10)]
+    reputation_balances = [0, 1, 9, 10, 99, 10**6, 10**18, 2**64, 2**100, 7]
+    assert abdk_math.governance_rewards(staking_balances, reputation_balances) == [
+        abdk_math.governance_reward(s, r)
+        for s, r in zip(staking_balances, reputation_balances)
+    ]
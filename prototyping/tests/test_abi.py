@@ -0,0 +1,55 @@
+import pytest
+
+from prototyping.abi import EventAbi, FunctionAbi, keccak256
+
+
+def test_keccak_and_event_round_trip():
+    """
+    Test: Hash known inputs, encode and decode an event with indexed and
+    data fields.
+
+    Expected: Known keccak-256 digests (the ERC-20 Transfer topic), decoded
+    values equal the encoded ones.
+    """
+    assert keccak256(b"").hex() == (
+        "c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470"
+    )
+    transfer = EventAbi(
+        "Transfer",
+        [
+            ("from", "address", True),
+            ("to", "address", True),
+            ("value", "uint256", False),
+        ],
+    )
+    assert transfer.topic == (
+        "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+    )
+    values = {"from": "0x" + "ab" * 20, "to": "0x" + "00" * 19 + "01", "value": 2**200}
+    topics, data = transfer.encode(values)
+    assert len(topics) == 3 and len(data) == 2 + 64
+    assert transfer.decode(topics, data) == values
+
+
+def test_function_call_round_trip():
+    """
+    Test: Encode and decode calls and return values of static-typed
+    functions, including bytes32 and a call to another function.
+
+    Expected: Known selectors (ERC-20 transfer), decoded arguments equal the
+    encoded ones; wrong selectors and short data raise ValueError.
+    """
+    transfer = FunctionAbi("transfer", ["address", "uint256"], ["bool"])
+    assert transfer.selector == "0xa9059cbb"
+    data = transfer.encode_call("0x" + "ab" * 20, 10**18)
+    assert len(data) == 2 + 8 + 2 * 64
+    assert transfer.decode_call(data) == ("0x" + "ab" * 20, 10**18)
+    assert transfer.decode_result("0x" + "00" * 31 + "01") == (True,)
+
+    grant = FunctionAbi("grantRole", ["bytes32", "address"])
+    role = "0x" + keccak256(b"MINTER_ROLE").hex()
+    assert grant.decode_call(grant.encode_call(role, "0x" + "00" * 20))[0] == role
+    with pytest.raises(ValueError):
+        transfer.decode_call(grant.encode_call(role, "0x" + "00" * 20))
+    with pytest.raises(ValueError):
+        transfer.decode_result("0x")
@@ -0,0 +1,126 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import (
+    BalanceProvider,
+    InMemoryBalanceProvider,
+    StakingBalanceProvider,
+    EpochCachedBalanceProvider,
+)
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import EPOCH_IN_SECONDS
+
+
+class CountingProvider(BalanceProvider):
+    def __init__(self, balances):
+        self.balances = balances
+        self.calls = 0
+
+    def balance_of(self, user_addr, token_addr):
+        self.calls += 1
+        return self.balances.get(user_addr, 0)
+
+
+def test_in_memory_provider():
+    """
+    Test: Known, unknown and negative balances.
+
+    Expected: Same values as the original BALANCES lookups (0.0 when missing,
+    never negative), scalar and bulk.
+    """
+    provider = InMemoryBalanceProvider({"0x1": {"0x222": 100.0, "0x333": -5.0}})
+
+    assert provider.balance_of("0x1", "0x222") == 100.0
+    assert provider.balance_of("0x1", "0x333") == 0.0
+    assert provider.balance_of("0x2", "0x222") == 0.0
+    assert provider.balances_of(["0x1", "0x2"], "0x222") == [100.0, 0.0]
+
+
+def test_incomplete_provider_fails_on_creation():
+    """
+    Test: Create a provider that only implements balances_of().
+
+    Expected: TypeError at creation, not at the first balance_of() call.
+    """
+
+    class BulkOnlyProvider(BalanceProvider):
+        def balances_of(self, user_addrs, token_addr):
+            return [0] * len(user_addrs)
+
+    with pytest.raises(TypeError):
+        BulkOnlyProvider()
+
+
+def test_epoch_cache(initial_time):
+    """
+    Test: Repeated bulk reads within an epoch, explicit invalidation and an
+    epoch change.
+
+    Expected: Each balance is fetched once per epoch unless invalidated.
+    """
+    now = [initial_time]
+    inner = CountingProvider({"0x1": 10, "0x2": 20})
+    provider = EpochCachedBalanceProvider(inner, clock=lambda: now[0])
+
+    assert provider.balances_of(["0x1", "0x2"], "0x222") == [10, 20]
+    assert provider.balances_of(["0x1", "0x2", "0x3"], "0x222") == [10, 20, 0]
+    assert inner.calls == 3
+
+    inner.balances["0x1"] = 11
+    provider.invalidate(["0x1"])
+    assert provider.balance_of("0x1", "0x222") == 11
+    assert inner.calls == 4
+
+    now[0] += EPOCH_IN_SECONDS
+    provider.balances_of(["0x1", "0x2"], "0x222")
+    assert inner.calls == 6
+
+
+def test_governance_reads_live_staking(
+    monkeypatch, block_timestamp, staking, initial_time
+):
+    """
+    Test: Governance reward wired to a Staking instance.
+    Staked amount = 1000, no reputation.
+
+    Expected: Reward = 1000 * (1 + log(0 + 1) / 100) = 1000
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x3333", 1000, EPOCH_IN_SECONDS * 4)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x1111",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        staking_balances=EpochCachedBalanceProvider(
+            StakingBalanceProvider(staking),
+            clock=lambda: governance_module.BLOCK_TIMESTAMP,
+        ),
+    )
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    governance.add_governance_reward("0x3333")
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", initial_time + EPOCH_IN_SECONDS
+    )
+    _, rewards = governance.distribute_epoch(["0x3333", "0x4444"])
+
+    assert rewards == [1000, 0.0]
+    assert governance.get_governer("0x3333").reward == 1000
+
+
+def test_staking_balances_of_fork_copy_nothing(block_timestamp, staking, initial_time):
+    """
+    Test: Read the staked amounts of a known and an unknown staker in bulk
+    from a fork of a Staking instance.
+
+    Expected: The parent's amounts; no row is copied into the fork's view.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x3333", 1000, EPOCH_IN_SECONDS * 4)
+    fork = staking.fork()
+
+    balances = StakingBalanceProvider(fork).balances_of(["0x3333", "0x4444"], None)
+
+    assert balances == [1000, 0]
+    assert fork.stakes.rows_copied() == 0
@@ -0,0 +1,55 @@
+import prototyping.governance as governance_module
+from prototyping.benchmarks import (
+    BENCHMARKS,
+    BenchmarkResult,
+    compare,
+    load_results,
+    run_suite,
+    save_results,
+)
+
+
+def test_run_suite_small(monkeypatch, tmp_path):
+    """
+    Test: Run every benchmark at a small size and save/load the results.
+
+    Expected: One result per benchmark (each checks its calls took the
+    expected path), memory metrics filled in, JSON round trip is lossless.
+    """
+    # the governance benchmarks move the module block timestamp
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", governance_module.BLOCK_TIMESTAMP
+    )
+    results = run_suite(sizes=[50], repeat=1)
+    assert [result.name for result in results] == list(BENCHMARKS)
+    assert all(result.ops_per_sec > 0 for result in results)
+    assert all(result.peak_memory is not None for result in results)
+
+    path = tmp_path / "bench.json"
+    save_results(results, path)
+    assert load_results(path) == results
+
+
+def test_compare_flags_regressions():
+    """
+    Test: Compare results that are slower, heavier, within tolerance,
+    without memory metrics or missing from the baseline.
+
+    Expected: Only the slower and heavier metrics are reported.
+    """
+    baseline = [
+        BenchmarkResult("stake_new", 1000, 0.01, 100_000.0, 10 * 2**20, 6.0),
+        BenchmarkResult("unstake", 1000, 0.01, 100_000.0, 2**20, -6.0),
+        BenchmarkResult("unstake_emergency", 1000, 0.01, 100_000.0, 2**20, -6.0),
+    ]
+    results = [
+        BenchmarkResult("stake_new", 1000, 0.02, 50_000.0, 20 * 2**20, 6.1),
+        BenchmarkResult("unstake", 1000, 0.01, 90_000.0, 2**20, -5.9),
+        BenchmarkResult("unstake_emergency", 1000, 0.01, 100_000.0),
+        BenchmarkResult("stake_top_up", 1000, 1.0, 1.0, 2**30, 100.0),
+    ]
+    regressions = compare(results, baseline, tolerance=0.2)
+    assert [(r.name, r.metric) for r in regressions] == [
+        ("stake_new", "ops_per_sec"),
+        ("stake_new", "peak_memory"),
+    ]
@@ -0,0 +1,197 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from prototyping import events
+from prototyping.concurrent_staking import ConcurrentStaking
+from prototyping.lru_cache import LruCache
+from prototyping.stake_book import ColumnarStakeBook
+from prototyping.staking import EPOCH_IN_SECONDS, Staking
+
+
+@pytest.fixture
+def concurrent_staking(block_timestamp, initial_time):
+    block_timestamp.set_timestamp(initial_time)
+    return ConcurrentStaking(
+        utility_token_addr="0x1111",
+        block_timestamp=block_timestamp,
+        event_sink=events.NullSink(),
+        lock_stripes=8,
+    )
+
+
+@pytest.fixture
+def fast_switching():
+    # switch threads as often as possible to interleave the calls
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def _run_threads(targets):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_stakes_top_ups_and_unstakes(
+    concurrent_staking, block_timestamp, first_epoch_start_time, fast_switching
+):
+    """
+    Test: 8 writer threads stake 1000 (4 epochs) on 32 shared addresses,
+    repeated calls are top-ups, while a reader checks get_stake and stats;
+    then the writers unstake everything after the end.
+    Every stake and top-up has reward = 40% of its amount.
+
+    Expected: Readers never see a half-applied top-up, totals match the
+    number of calls and a full recompute, everything is withdrawn.
+    """
+    addresses = [f"0x{i:02x}" for i in range(32)]
+    done = threading.Event()
+    torn_reads = []
+
+    def write(offset):
+        for i in range(200):
+            concurrent_staking.stake(
+                addresses[(offset + i) % 32], 1000, EPOCH_IN_SECONDS * 4
+            )
+
+    def read():
+        while not done.is_set():
+            for address in addresses:
+                user_stake = concurrent_staking.get_stake(address)
+                if user_stake.reward != user_stake.lock_amount * 40 / 100:
+                    torn_reads.append(user_stake)
+            stats = concurrent_staking.stats()
+            if stats.total_reward != stats.total_locked * 40 / 100:
+                torn_reads.append(stats)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    _run_threads([lambda offset=offset: write(offset) for offset in range(8)])
+    done.set()
+    reader.join()
+
+    assert torn_reads == []
+    concurrent_staking.check_stats()
+    stats = concurrent_staking.stats()
+    assert stats.staker_count == 32
+    assert stats.total_locked == 8 * 200 * 1000
+
+    block_timestamp.set_timestamp(first_epoch_start_time + EPOCH_IN_SECONDS * 4 + 1)
+    withdrawn = []
+    _run_threads(
+        [
+            lambda part=part: withdrawn.extend(
+                concurrent_staking.unstake(address) for address in addresses[part::4]
+            )
+            for part in range(4)
+        ]
+    )
+    assert sum(withdrawn) == 8 * 200 * 1400
+    assert concurrent_staking.stats().staker_count == 0
+    assert concurrent_staking.liability_schedule() == []
+
+
+def test_reader_waits_for_writer(concurrent_staking):
+    """
+    Test: Read a stake while its stripe is marked as being written.
+
+    Expected: get_stake() retries until the write is over and returns a
+    detached copy; other book types are rejected. A fork is a plain Staking
+    that later writes to the parent do not reach.
+    """
+    concurrent_staking.stake("0x123", 1000, EPOCH_IN_SECONDS * 4)
+    stripe = concurrent_staking._stripe_of("0x123")
+    concurrent_staking._versions[stripe] += 1  # writer in progress
+    results = []
+    reader = threading.Thread(
+        target=lambda: results.append(concurrent_staking.get_stake("0x123"))
+    )
+    reader.start()
+    reader.join(timeout=0.05)
+    assert results == []
+    concurrent_staking._versions[stripe] += 1
+    reader.join()
+
+    results[0].lock_amount = 0
+    assert concurrent_staking.get_stake("0x123").lock_amount == 1000
+    forked = concurrent_staking.fork()
+    assert type(forked) is Staking
+    concurrent_staking.stake("0x123", 500, EPOCH_IN_SECONDS * 4)
+    concurrent_staking.stake("0x456", 500, EPOCH_IN_SECONDS * 4)
+    assert concurrent_staking.get_stake("0x123").lock_amount == 1500
+    assert forked.get_stake("0x123").lock_amount == 1000
+    assert "0x456" not in forked.stakes
+    forked.check_stats()
+    with pytest.raises(ValueError):
+        ConcurrentStaking(utility_token_addr="0x1111", stakes=ColumnarStakeBook())
+
+
+def test_projections_follow_concurrent_top_ups(concurrent_staking, fast_switching):
+    """
+    Test: Writer threads top up shared addresses while a reader projects
+    their withdrawals.
+
+    Expected: Every projection is consistent (amount = 140% of the lock) and
+    the last ones match the final stakes.
+    """
+    addresses = [f"0x{i:02x}" for i in range(16)]
+    done = threading.Event()
+    projected = []
+
+    def write(offset):
+        for i in range(100):
+            concurrent_staking.stake(
+                addresses[(offset + i) % 16], 1000, EPOCH_IN_SECONDS * 4
+            )
+
+    def read():
+        while not done.is_set():
+            for address in addresses:
+                projected.append(concurrent_staking._withdrawal_projection(address))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    _run_threads([lambda offset=offset: write(offset) for offset in range(4)])
+    done.set()
+    reader.join()
+
+    assert all(p is None or p[2] == p[1] * 140 / 100 for p in projected)
+    for address in addresses:
+        user_stake = concurrent_staking.get_stake(address)
+        assert concurrent_staking._withdrawal_projection(address)[1:] == (
+            user_stake.lock_amount,
+            user_stake.lock_amount + user_stake.reward,
+        )
+
+
+
+def test_lru_cache_put_is_not_interleaved():
+    """
+    Test: Another thread pops a key while put() of the same key is between
+    its insert and its move to the end (the move waits up to 0.2 s for it).
+
+    Expected: The pop waits for put() to finish instead of making it fail;
+    the key is gone afterwards.
+    """
+    cache = LruCache(maxsize=4)
+
+    class PopInBetween(OrderedDict):
+        def move_to_end(self, key, last=True):
+            popper = threading.Thread(target=cache.pop, args=(key,))
+            popper.start()
+            popper.join(timeout=0.2)
+            self.popper = popper
+            super().move_to_end(key, last)
+
+    cache._entries = entries = PopInBetween()
+    cache.put("0x1", 1)
+    entries.popper.join()
+
+    assert "0x1" not in cache
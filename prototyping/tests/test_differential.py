@@ -0,0 +1,413 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.abi import FunctionAbi, encode_arguments
+from prototyping.balances import InMemoryBalanceProvider, StakingBalanceProvider
+from prototyping.differential import (
+    ADD_GOVERNANCE_REWARD,
+    GOV,
+    SET_MAX_LOCK_BY_AMOUNT,
+    SET_REWARD_RATE_PER_EPOCH,
+    STAKE,
+    STAKERS,
+    TOGGLE_EMERGENCY_STOP,
+    TOGGLE_EMERGENCY_WITHDRAW,
+    TRANSFER,
+    UNSTAKE,
+    DifferentialReplay,
+    JsonRpcClient,
+    deploy,
+    format_report,
+    main,
+)
+from prototyping.governance import STATUS_GOVERNER_ADDED, GovernanceRewarding
+from prototyping.governance import STATUS_OK as GOVERNANCE_STATUS_OK
+from prototyping.simulation import (
+    EmergencyEvent,
+    GovernanceClaimEvent,
+    GovernanceRewardEvent,
+    RewardRateChangeEvent,
+    StakeEvent,
+    TopUpEvent,
+    UnstakeEvent,
+)
+from prototyping.staking import EPOCH_IN_SECONDS, STATUS_OK, BlockTimestamp, Staking
+from prototyping.workload import WorkloadConfig, generate_events, write_trace
+
+OWNER = "0x" + "ee" * 20
+
+
+class StandInNode:
+    """
+    JSON-RPC node with just enough of Ganache for the replay harness: the
+    staking contract is played by a Staking model and, once
+    `governance_address` is set, the governance contract by a
+    GovernanceRewarding model; every other transaction succeeds.
+    Transactions of `revert_senders` revert, as a buggy contract.
+    """
+
+    def __init__(self, revert_senders=()):
+        self.chain = Staking(
+            utility_token_addr="0x1",
+            block_timestamp=BlockTimestamp(),
+            event_sink=events.NullSink(),
+        )
+        self.governance = GovernanceRewarding(
+            governance_token_addr="0x000",
+            staking_addr="0x222",
+            reputation_addr="0x333",
+            event_sink=events.NullSink(),
+            staking_balances=StakingBalanceProvider(self.chain),
+            reputation_balances=InMemoryBalanceProvider(),
+        )
+        self.governance_address = None
+        self.revert_senders = set(revert_senders)
+        self.transfers = []  # (recipient, amount) of token transfers
+        self.posts = 0
+        self.connections = 0
+        self.pending = []
+        self.receipts = {}
+        self.history = {}  # (contract, address) -> [(block, fields)]
+        self.block = 0
+        self.lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            disable_nagle_algorithm = True  # headers and body are separate writes
+
+            def setup(self):
+                super().setup()
+                with node.lock:
+                    node.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                request = json.loads(self.rfile.read(length))
+                with node.lock:
+                    node.posts += 1
+                    replies = [node.handle(call) for call in request]
+                body = json.dumps(replies).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, call):
+        method, params = call["method"], call["params"]
+        if method == "eth_accounts":
+            result = [OWNER]
+        elif method == "eth_getTransactionCount":
+            result = "0x0"
+        elif method == "eth_sendTransaction":
+            result = f"0x{len(self.receipts) + len(self.pending) + 1:064x}"
+            self.pending.append((result, params[0]))
+        elif method == "evm_mine":
+            self.mine(*params)
+            result = "0x0"
+        elif method == "eth_blockNumber":
+            result = hex(self.block)
+        elif method == "eth_getTransactionReceipt":
+            result = self.receipts.get(params[0])
+        elif method == "eth_call":
+            to, data = params[0]["to"], params[0]["data"]
+            getter = GOV if to == self.governance_address else STAKERS
+            (address,) = getter.decode_call(data)
+            block = int(params[1], 16)
+            history = self.history.get((to == self.governance_address, address), [])
+            fields = [f for b, f in history if b <= block]
+            fields = fields[-1] if fields else [0] * 4
+            result = encode_arguments(getter.outputs, fields)
+        else:  # miner_stop, evm_addAccount, personal_unlockAccount, ...
+            result = True
+        return {"jsonrpc": "2.0", "id": call["id"], "result": result}
+
+    def mine(self, timestamp=None):
+        self.block += 1
+        if timestamp is not None:
+            self.chain.block_timestamp.set_timestamp(timestamp)
+            governance_module.BLOCK_TIMESTAMP = timestamp
+        for tx_hash, transaction in self.pending:
+            status, gas = self.execute(transaction)
+            created = None if "to" in transaction else f"0x{self.block:040x}"
+            self.receipts[tx_hash] = {
+                "status": hex(status),
+                "gasUsed": hex(gas),
+                "blockNumber": hex(self.block),
+                "contractAddress": created,
+            }
+        self.pending = []
+
+    def execute(self, transaction):  # (status, gas used)
+        chain, sender, data = self.chain, transaction["from"], transaction["data"]
+        selector = FunctionAbi.selector.fget
+        to = transaction.get("to")
+        if to is not None and to == self.governance_address:
+            return self.execute_governance(sender, data)
+        staking_call = data.startswith((selector(STAKE), selector(UNSTAKE)))
+        if staking_call and sender in self.revert_senders:
+            return 0, 23_000
+        if data.startswith(selector(STAKE)):
+            amount, duration = STAKE.decode_call(data)
+            gas = 45_000 if sender in chain.stakes else 110_000
+            status = chain.stake_many([sender], [amount], [duration])[0]
+        elif data.startswith(selector(UNSTAKE)):
+            gas, status = 60_000, chain.unstake_many([sender])[0][0]
+        else:
+            gas, status = 30_000, STATUS_OK
+            if data.startswith(selector(SET_MAX_LOCK_BY_AMOUNT)):
+                (chain.max_lock_amount,) = SET_MAX_LOCK_BY_AMOUNT.decode_call(data)
+            elif data.startswith(selector(SET_REWARD_RATE_PER_EPOCH)):
+                (rate,) = SET_REWARD_RATE_PER_EPOCH.decode_call(data)
+                status = chain.set_reward_rate_per_epoch(rate)
+            elif data.startswith(selector(TOGGLE_EMERGENCY_STOP)):
+                chain.set_emergency_pause(not chain.emergency_pause)
+            elif data.startswith(selector(TOGGLE_EMERGENCY_WITHDRAW)):
+                chain.set_emergency_withdraw(not chain.emergency_withdraw)
+            elif data.startswith(selector(TRANSFER)):
+                self.transfers.append(TRANSFER.decode_call(data))
+        s = chain.get_stake(sender)
+        fields = (s.lock_amount, s.start_time, s.lock_duration, s.reward)
+        self.history.setdefault((False, sender), []).append((self.block, fields))
+        return int(status == STATUS_OK), gas
+
+    def execute_governance(self, sender, data):
+        if data.startswith(FunctionAbi.selector.fget(ADD_GOVERNANCE_REWARD)):
+            (address,) = ADD_GOVERNANCE_REWARD.decode_call(data)
+            (status,), _ = self.governance.distribute_epoch([address])
+        else:
+            address = sender
+            (status,), _ = self.governance.claim_many([address])
+        g = self.governance.get_governer(address)
+        fields = (g.init_time, int(g.reward), g.last_reward_time, g.last_claim_time)
+        self.history.setdefault((True, address), []).append((self.block, fields))
+        return int(status in (GOVERNANCE_STATUS_OK, STATUS_GOVERNER_ADDED)), 50_000
+
+
+@pytest.fixture
+def node():
+    node = StandInNode()
+    yield node
+    node.close()
+
+
+def test_replay_matches_model(node, tmp_path, initial_time):
+    """
+    Test: Deploy from Truffle artifacts to a stand-in node, then replay new
+    stakes, top-ups, an invalid stake, a valid and an invalid reward rate
+    change, a governance reward, an emergency withdrawal and regular
+    unstakes with a small pool and batch size.
+
+    Expected: No divergence; gas is reported per operation (new vs top-up);
+    transactions go out in batches over at most `pool_size` connections; the
+    governance reward is skipped, as nothing was deployed for it.
+    """
+    for name in ("MarketMachinaToken", "UtilityStaking"):
+        (tmp_path / f"{name}.json").write_text(json.dumps({"bytecode": "0x6000"}))
+    users = [f"0x{i:040x}" for i in range(1, 31)]
+    week = EPOCH_IN_SECONDS
+    trace = [StakeEvent(initial_time, user, 1000, 4 * week) for user in users]
+    trace += [StakeEvent(initial_time + 1, "0x" + "ab" * 20, 0, week)]
+    trace += [TopUpEvent(initial_time + week, user, 500, week) for user in users[:10]]
+    trace += [RewardRateChangeEvent(initial_time + week + 1, 5)]
+    trace += [RewardRateChangeEvent(initial_time + week + 1, 50)]  # above max
+    trace += [GovernanceRewardEvent(initial_time + week + 1, users[0])]
+    trace += [StakeEvent(initial_time + week + 2, users[0], 100, week)]  # top-up
+    trace += [
+        EmergencyEvent(initial_time + 2 * week, True, True),
+        UnstakeEvent(initial_time + 2 * week, users[-1]),
+        EmergencyEvent(initial_time + 2 * week + 1, False, False),
+    ]
+    trace += [UnstakeEvent(initial_time + 6 * week, user) for user in users[:-1]]
+
+    with JsonRpcClient(node.url, pool_size=2, max_batch=16) as client:
+        deployment = deploy(client, str(tmp_path), governance=False)
+        assert deployment.owner == OWNER and deployment.staking
+        staking = Staking(
+            utility_token_addr="0x1",
+            block_timestamp=BlockTimestamp(),
+            event_sink=events.NullSink(),
+        )
+        replay = DifferentialReplay(client, deployment, staking, pipeline_depth=3)
+        report = replay.replay(trace)
+
+    assert report.divergence_count == 0, report.divergences
+    gas = report.gas
+    assert (gas["stake[new]"].transactions, gas["stake[new]"].reverted) == (31, 1)
+    assert gas["stake[top_up]"].transactions == 11
+    assert gas["stake[top_up]"].max_gas < gas["stake[new]"].max_gas
+    assert gas["unstake[emergency]"].transactions == 1
+    assert gas["unstake"].transactions == 29 and gas["unstake"].reverted == 0
+    assert gas["set_reward_rate"].reverted == 1
+    assert report.skipped == 1 and "1 governance events skipped" in (
+        format_report(report)
+    )
+    # each emergency event: 2 toggles
+    assert report.transactions == len(trace) - report.skipped + 2
+    assert report.round_trips < report.transactions
+    assert node.connections <= 2
+    assert staking.get_stake(users[0]).lock_amount == 0
+
+
+def test_state_of_empty_block_is_read_at_its_block(node, tmp_path, initial_time):
+    """
+    Test: Replay a stake, a block holding only a (skipped) governance reward
+    for the same staker and then top-ups by that staker in the blocks after
+    it, with the blocks pipelined.
+
+    Expected: No divergence: the staker's state after the empty block is
+    read at that block, not at the later blocks mined in the meantime.
+    """
+    for name in ("MarketMachinaToken", "UtilityStaking"):
+        (tmp_path / f"{name}.json").write_text(json.dumps({"bytecode": "0x6000"}))
+    user = f"0x{1:040x}"
+    trace = [StakeEvent(initial_time, user, 1000, 4 * EPOCH_IN_SECONDS)]
+    trace += [GovernanceRewardEvent(initial_time + 1, user)]
+    trace += [StakeEvent(initial_time + t, user, 10, 0) for t in range(2, 6)]
+
+    with JsonRpcClient(node.url) as client:
+        deployment = deploy(client, str(tmp_path), governance=False)
+        staking = Staking(
+            utility_token_addr="0x1",
+            block_timestamp=BlockTimestamp(),
+            event_sink=events.NullSink(),
+        )
+        replay = DifferentialReplay(client, deployment, staking, pipeline_depth=4)
+        report = replay.replay(trace)
+
+    assert report.divergence_count == 0, report.divergences
+    assert report.blocks == 6 and report.skipped == 1
+
+
+def test_only_missing_tokens_are_funded(node, tmp_path, initial_time):
+    """
+    Test: Replay a stake, a stake above the max lock amount, the unstake
+    after it matured and a second, smaller stake by the same staker.
+
+    Expected: No divergence; the staker is sent tokens for the first stake
+    only: the rejected stake gets none and the second stake is paid from the
+    unstaked tokens.
+    """
+    for name in ("MarketMachinaToken", "UtilityStaking"):
+        (tmp_path / f"{name}.json").write_text(json.dumps({"bytecode": "0x6000"}))
+    user, week = f"0x{1:040x}", EPOCH_IN_SECONDS
+    trace = [
+        StakeEvent(initial_time, user, 1000, week),
+        StakeEvent(initial_time + 1, user, 10**30, week),  # above max
+        UnstakeEvent(initial_time + 2 * week, user),
+        StakeEvent(initial_time + 2 * week + 1, user, 600, week),
+    ]
+
+    with JsonRpcClient(node.url) as client:
+        deployment = deploy(client, str(tmp_path), governance=False)
+        staking = Staking(
+            utility_token_addr="0x1",
+            block_timestamp=BlockTimestamp(),
+            event_sink=events.NullSink(),
+        )
+        replay = DifferentialReplay(client, deployment, staking)
+        report = replay.replay(trace)
+
+    assert report.divergence_count == 0, report.divergences
+    assert report.gas["stake[top_up]"].reverted == 1
+    assert [amount for to, amount in node.transfers if to == user] == [1000]
+
+
+def test_divergences_are_reported(node, tmp_path, capsys):
+    """
+    Test: Run the command line replay of a generated trace (deployment
+    given as JSON) against a node on which one staker's transactions revert.
+
+    Expected: Exit status 1; status and state divergences for that staker
+    only.
+    """
+    config = WorkloadConfig(seed=2, epochs=4, stakes_per_epoch=20, max_lock_epochs=2)
+    config.governer_probability = 0.0
+    trace_events = list(generate_events(config))
+    write_trace(trace_events, tmp_path / "small.trace")
+    victim = next(e.address for e in trace_events if isinstance(e, StakeEvent))
+    node.revert_senders.add(victim)
+    token, staking = "0x" + "01" * 20, "0x" + "02" * 20
+    deployment = {"owner": OWNER, "token": token, "staking": staking}
+    (tmp_path / "deployment.json").write_text(json.dumps(deployment))
+
+    argv = [str(tmp_path / "small.trace"), "--url", node.url]
+    assert main(argv + ["--deployment", str(tmp_path / "deployment.json")]) == 1
+    output = capsys.readouterr().out
+    divergences = [line for line in output.splitlines() if line.startswith("  ")]
+    assert divergences and all(victim in line for line in divergences)
+    assert any(" status:" in line for line in divergences)
+    assert any("stakers" in line and " state:" in line for line in divergences)
+
+
+def test_governance_replay_matches_model(node, tmp_path, initial_time, monkeypatch):
+    """
+    Test: Deploy with governance to a stand-in node that also models the
+    governance contract, then replay stakes, governer registrations, an
+    early reward, rewards one epoch later, claims and a claim by an address
+    that is not a governer.
+
+    Expected: No divergence; the governance operations are replayed (none
+    skipped) and only the early reward and the unknown claim revert.
+    """
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    names = ("MarketMachinaToken", "UtilityStaking")
+    for name in names + ("GovernanceToken", "GovernanceRewarding"):
+        (tmp_path / f"{name}.json").write_text(json.dumps({"bytecode": "0x6000"}))
+    users = [f"0x{i:040x}" for i in range(1, 6)]
+    week = EPOCH_IN_SECONDS
+    trace = [
+        StakeEvent(initial_time, user, 1000 * i, 4 * week)
+        for i, user in enumerate(users, 1)
+    ]
+    trace += [GovernanceRewardEvent(initial_time, user) for user in users]
+    trace += [GovernanceRewardEvent(initial_time + 1, users[0])]  # too early
+    trace += [GovernanceRewardEvent(initial_time + week, user) for user in users]
+    trace += [GovernanceClaimEvent(initial_time + week + 1, user) for user in users]
+    trace += [GovernanceClaimEvent(initial_time + week + 1, "0x" + "ab" * 20)]
+
+    with JsonRpcClient(node.url, pool_size=2, max_batch=16) as client:
+        deployment = deploy(client, str(tmp_path), governance=True)
+        assert deployment.governance
+        node.governance_address = deployment.governance
+        staking = Staking(
+            utility_token_addr="0x1",
+            block_timestamp=BlockTimestamp(),
+            event_sink=events.NullSink(),
+        )
+        governance = GovernanceRewarding(
+            governance_token_addr="0x000",
+            staking_addr="0x222",
+            reputation_addr="0x333",
+            event_sink=events.NullSink(),
+            staking_balances=StakingBalanceProvider(staking),
+            reputation_balances=InMemoryBalanceProvider(),
+        )
+        replay = DifferentialReplay(client, deployment, staking, governance)
+        report = replay.replay(trace)
+
+    assert report.divergence_count == 0, report.divergences
+    assert report.skipped == 0
+    gas = report.gas
+    assert gas["add_governance_reward"].transactions == 11
+    assert gas["add_governance_reward"].reverted == 1
+    assert gas["claim_governance_reward"].transactions == 6
+    assert gas["claim_governance_reward"].reverted == 1
+    assert governance.get_governer(users[1]).last_claim_time == initial_time + week + 1
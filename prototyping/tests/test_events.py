@@ -0,0 +1,96 @@
+from prototyping import events
+from prototyping.staking import EPOCH_IN_SECONDS
+
+
+def test_ring_buffer_records_typed_events(block_timestamp, staking, initial_time):
+    """
+    Test: Stake, top-up, rejected top-up and rejected unstake with a ring buffer sink.
+
+    Expected: Typed events with raw field values, queryable after the run,
+    and per-event-type counters.
+    """
+    sink = events.RingBufferSink(maxlen=3)
+    staking.event_sink = sink
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x3333", 1000, EPOCH_IN_SECONDS * 4)
+    staking.stake("0x3333", 100, EPOCH_IN_SECONDS)
+    staking.stake("0x3333", 0, EPOCH_IN_SECONDS)
+    staking.unstake("0x3333")
+    staking.unstake("0x4444")
+
+    assert sink.count(events.StakeCreated) == 1
+    assert sink.count(events.InvalidStakeParams) == 1
+    assert sink.count(events.StakeNotEnded) == 1
+    assert len(sink.events()) == 3  # bounded
+    assert sink.events(events.NoStakeFound) == [events.NoStakeFound("0x4444")]
+    assert sink.events()[0].message() == "Error: Lock amount must be positive."
+
+
+def test_print_sink_keeps_original_messages(
+    block_timestamp, staking, initial_time, capsys
+):
+    """
+    Test: Default sink.
+
+    Expected: The same stdout lines as the original print() calls.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x3333", 1000, EPOCH_IN_SECONDS * 4)
+    staking.unstake("0x3333")
+
+    assert capsys.readouterr().out.splitlines() == [
+        "Stake for 0x3333 created: Stake(lock_amount=1000, start_time=1715212800, "
+        "lock_duration=2419200, reward=400.0)",
+        "Error: Cannot withdraw from stake that has not reached its end.",
+    ]
+
+
+def test_null_sink_is_silent(block_timestamp, staking, initial_time, capsys):
+    """
+    Test: Events disabled.
+
+    Expected: Nothing written to stdout, state changes as usual.
+    """
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x3333", 1000, EPOCH_IN_SECONDS * 4)
+    staking.set_reward_rate_per_epoch(11)
+
+    assert capsys.readouterr().out == ""
+    assert staking.get_stake("0x3333").reward == 400
+
+
+def test_messages_use_instance_limits(block_timestamp, staking, initial_time):
+    """
+    Test: Break the lock amount, reward rate and withdraw cap limits of an
+    instance with non-default limits.
+
+    Expected: The error messages state that instance's limits.
+    """
+    sink = events.RingBufferSink()
+    staking.event_sink = sink
+    staking.max_lock_amount = 5000
+    staking.max_reward_rate = 40
+    staking.max_multiplier_to_withdraw = 2
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x1", 6000, EPOCH_IN_SECONDS * 4)
+    staking.set_reward_rate_per_epoch(50)
+    staking.set_reward_rate_per_epoch(40)
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 4)  # reward 160% of lock
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 6)
+    staking.unstake("0x1")
+
+    messages = [
+        event.message()
+        for event_type in (
+            events.InvalidStakeParams,
+            events.InvalidRewardRate,
+            events.WithdrawCapExceeded,
+        )
+        for event in sink.events(event_type)
+    ]
+    assert messages == [
+        "Error: Lock amount must be less than or equal to 5000.",
+        "Error: Reward rate must be less than or equal to 40%.",
+        "Error: Cannot withdraw more than 200% of lock amount.",
+    ]
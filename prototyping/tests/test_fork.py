@@ -0,0 +1,174 @@
+import copy
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import EPOCH_IN_SECONDS
+
+
+def _populate(staking, block_timestamp, initial_time, size=20):
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake_many(
+        [f"0x{i:03x}" for i in range(size)],
+        [1000 + i for i in range(size)],
+        [EPOCH_IN_SECONDS * (1 + i % 4) for i in range(size)],
+    )
+
+
+def test_fork_isolates_changes(staking, block_timestamp, initial_time):
+    """
+    Test: Fork a populated Staking, change the reward rate, top up, add and
+    unstake stakes on the fork.
+
+    Expected: The parent's stakes, stats and liability schedule are
+    unchanged; the fork only holds the rows it touched.
+    """
+    _populate(staking, block_timestamp, initial_time)
+    stakes_before = {address: staking.get_stake(address) for address in staking.stakes}
+    stats_before = staking.stats()
+    schedule_before = staking.liability_schedule()
+
+    fork = staking.fork()
+    fork.set_reward_rate_per_epoch(5)
+    fork.stake("0x003", 500, EPOCH_IN_SECONDS)  # top-up
+    fork.stake("0xnew", 700, EPOCH_IN_SECONDS * 2)
+    fork.block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 3)
+    assert fork.unstake("0x000") == 1100
+    fork.check_stats()
+
+    assert staking.reward_rate_per_epoch == 10
+    assert staking.block_timestamp.timestamp == initial_time
+    assert {address: staking.get_stake(address) for address in staking.stakes} == (
+        stakes_before
+    )
+    assert staking.stats() == stats_before
+    assert staking.liability_schedule() == schedule_before
+
+    assert len(fork.stakes) == len(staking.stakes)  # +1 new, -1 unstaked
+    assert "0x000" not in fork.stakes and "0x000" in staking.stakes
+    assert fork.get_stake("0x003").lock_amount == 1503
+    assert fork.stakes.rows_copied() == 2  # top-up and new stake
+    assert fork.stakes.rows_deleted() == 1
+    assert fork.stats().staker_count == stats_before.staker_count
+
+
+def test_emergency_withdraw_what_if(staking, block_timestamp, initial_time):
+    """
+    Test: Evaluate an emergency withdraw of everyone on several forks
+    side by side, one of them a fork of a fork.
+
+    Expected: Each fork is emptied independently, the parent keeps all
+    stakes; the fork of a fork does not see the stake its parent adds later.
+    """
+    _populate(staking, block_timestamp, initial_time)
+    forks = [staking.fork() for _ in range(3)]
+    forks.append(forks[0].fork())
+    forks[0].stake("0xnew", 700, EPOCH_IN_SECONDS)
+    for fork in forks[1:]:
+        fork.set_emergency_pause(True)
+        fork.set_emergency_withdraw(True)
+        _, amounts = fork.unstake_many(list(fork.stakes))
+        assert sum(amounts) == staking.stats().total_locked
+        assert len(fork.stakes) == 0
+        assert fork.liability_schedule() == []
+
+    assert staking.emergency_withdraw is False
+    assert len(staking.stakes) == 20
+    assert len(forks[0].stakes) == 21
+
+
+def test_governance_fork(monkeypatch):
+    """
+    Test: Fork governance after a rewarded epoch and claim on the fork.
+
+    Expected: The parent's governers keep their rewards.
+    """
+    initial_time = 1714670000
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+    )
+    governance.distribute_epoch(["0x111", "0x444"])
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", initial_time + EPOCH_IN_SECONDS
+    )
+    _, rewards = governance.distribute_epoch(["0x111", "0x444"])
+
+    fork = governance.fork()
+    _, claimed = fork.claim_many(["0x111", "0x444"])
+    assert claimed == rewards
+    assert fork.get_governer("0x111").reward == 0.0
+    assert governance.get_governer("0x111").reward == rewards[0]
+    assert governance.get_governer("0x444").last_claim_time == 0.0
+
+
+def test_parent_changes_do_not_reach_fork(staking, block_timestamp, initial_time):
+    """
+    Test: Fork a populated Staking, then top up, add and emergency unstake
+    stakes on the parent only; read the fork through get_stake().
+
+    Expected: The fork still shows the stakes as they were at the fork and
+    passes check_stats(); reads copy no rows into the fork.
+    """
+    _populate(staking, block_timestamp, initial_time)
+    stakes_before = {
+        address: copy.copy(staking.get_stake(address)) for address in staking.stakes
+    }
+    stats_before = staking.stats()
+    fork = staking.fork()
+    for address in stakes_before:
+        assert fork.get_stake(address) == stakes_before[address]
+    assert fork.stakes.rows_copied() == 0
+
+    staking.stake("0x003", 500, EPOCH_IN_SECONDS)  # top-up
+    staking.stake_many(["0x004", "0xnew"], [500, 700], [EPOCH_IN_SECONDS] * 2)
+    staking.set_emergency_pause(True)
+    staking.set_emergency_withdraw(True)
+    staking.unstake("0x001")
+    staking.unstake_many(["0x002"])
+    assert staking.get_stake("0x003").lock_amount == 1503
+
+    assert {address: fork.get_stake(address) for address in fork.stakes} == (
+        stakes_before
+    )
+    assert "0xnew" not in fork.stakes and len(fork.stakes) == 20
+    assert fork.stats() == stats_before
+    fork.check_stats()
+    staking.check_stats()
+
+    del fork  # dead forks are dropped on the next change
+    staking.unstake("0x005")
+    assert staking._forks == []
+
+
+def test_parent_governer_changes_do_not_reach_fork(monkeypatch):
+    """
+    Test: Fork a GovernanceRewarding with rewarded governers, then claim on
+    the parent.
+
+    Expected: The fork keeps the unclaimed rewards.
+    """
+    initial_time = 1714670000
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+    )
+    governance.distribute_epoch(["0x111", "0x444"])
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", initial_time + EPOCH_IN_SECONDS
+    )
+    _, rewards = governance.distribute_epoch(["0x111", "0x444"])
+
+    fork = governance.fork()
+    governance.claim_many(["0x111"])
+    governance.claim_governance_reward("0x444")
+    assert governance.get_governer("0x111").reward == 0.0
+    assert [fork.get_governer(a).reward for a in ("0x111", "0x444")] == rewards
+    assert fork.governers.rows_copied() == 2
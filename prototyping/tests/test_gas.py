@@ -0,0 +1,170 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.gas import (
+    COLD_SLOAD_GAS,
+    PACKED_STAKING_LAYOUT,
+    SSTORE_SET_GAS,
+    TX_BASE_GAS,
+    instrument,
+)
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import EPOCH_IN_SECONDS, Staking
+
+
+def test_stake_lifecycle_gas(staking, block_timestamp, initial_time):
+    """
+    Test: New stake, top-up and unstake on an instrumented Staking.
+
+    Expected: The new stake sets all 4 struct slots, the top-up changes
+    2 of them, the unstake clears all 4 and gets a capped refund; state
+    ends up the same as without instrumentation.
+    """
+    staking.event_sink = events.NullSink()
+    meter = instrument(staking)
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x123", 1000, EPOCH_IN_SECONDS * 4)
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS)
+    staking.stake("0x123", 500, EPOCH_IN_SECONDS)
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 6)
+    assert staking.unstake("0x123") == 1500 + 400 + 150
+
+    created, topped_up, withdrawn = meter.calls
+    assert [call.function for call in meter.calls] == ["stake", "stake", "unstake"]
+    assert created.sstores_set == 4
+    assert created.gas > TX_BASE_GAS + 4 * (SSTORE_SET_GAS + COLD_SLOAD_GAS)
+    assert topped_up.field_writes == 2
+    assert topped_up.sstores_set == 0
+    assert topped_up.gas < created.gas
+    assert withdrawn.field_writes == 4
+    assert 0 < withdrawn.refund <= (withdrawn.gas + withdrawn.refund) // 5
+    assert len(staking.stakes) == 0
+    assert staking.stats().staker_count == 0
+
+
+def test_views_and_batches_are_not_metered(staking, block_timestamp, initial_time):
+    """
+    Test: Call getters, queries and batch functions on an instrumented Staking.
+
+    Expected: No transactions recorded.
+    """
+    staking.event_sink = events.NullSink()
+    meter = instrument(staking)
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake_many(["0x1", "0x2"], [1000, 2000], [EPOCH_IN_SECONDS] * 2)
+    staking.get_stake("0x1")
+    staking.stats()
+    staking.liability_schedule()
+    assert meter.calls == []
+    with pytest.raises(ValueError):
+        instrument(staking)
+
+
+def test_packed_layout_is_cheaper(block_timestamp, initial_time):
+    """
+    Test: The same new stake with the default and the packed Stake layout.
+
+    Expected: The packed layout sets 2 slots instead of 4.
+    """
+    gas = {}
+    for name, layout in [("default", None), ("packed", PACKED_STAKING_LAYOUT)]:
+        block_timestamp.set_timestamp(initial_time)
+        staking = Staking(
+            utility_token_addr="0x1111",
+            block_timestamp=block_timestamp,
+            event_sink=events.NullSink(),
+        )
+        meter = instrument(staking, layout=layout)
+        staking.stake("0x123", 1000, EPOCH_IN_SECONDS * 4)
+        gas[name] = meter.calls[0]
+    assert gas["default"].sstores_set == 4
+    assert gas["packed"].sstores_set == 2
+    assert gas["default"].gas - gas["packed"].gas == 2 * (
+        SSTORE_SET_GAS + COLD_SLOAD_GAS
+    )
+
+
+def test_governance_merged_add_and_claim(monkeypatch):
+    """
+    Test: Reward and claim as two transactions, then as one merged
+    transaction, over two epochs.
+
+    Expected: The merged transaction is cheaper (one intrinsic cost, warm
+    slots) and per_operation / per_epoch roll the calls up.
+    """
+    initial_time = 1714670000
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+    )
+    meter = instrument(governance)
+    governance.add_governance_reward("0x111")  # registers
+
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", initial_time + EPOCH_IN_SECONDS
+    )
+    governance.add_governance_reward("0x111")
+    governance.claim_governance_reward("0x111")
+    separate = sum(call.gas for call in meter.calls[1:])
+
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", initial_time + 2 * EPOCH_IN_SECONDS
+    )
+    with meter.transaction("add_and_claim", initial_time + 2 * EPOCH_IN_SECONDS):
+        governance.add_governance_reward("0x111")
+        governance.claim_governance_reward("0x111")
+    merged = meter.calls[-1]
+    assert governance.get_governer("0x111").reward == 0.0
+    assert merged.gas < separate - TX_BASE_GAS
+
+    operations = meter.per_operation()
+    assert operations["add_governance_reward"].calls == 2
+    assert operations["claim_governance_reward"].calls == 1
+    assert operations["add_and_claim"].calls == 1
+    epochs = meter.per_epoch()
+    assert [usage.calls for usage in epochs.values()] == [1, 2, 1]
+    assert sum(usage.gas for usage in epochs.values()) == sum(
+        call.gas for call in meter.calls
+    )
+
+
+def test_governance_scratch_variables_are_metered(monkeypatch):
+    """
+    Test: Register a governer, then reward and claim in two later epochs,
+    one transaction per call.
+
+    Expected: Every call also pays for the current_time / reward state
+    variables it writes and the EPOCH_IN_SECONDS variable it reads, which
+    pins the per-call totals.
+    """
+    initial_time = 1714670000
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+    )
+    meter = instrument(governance)
+    governance.add_governance_reward("0x111")
+    for epoch in (1, 2):
+        current_time = initial_time + epoch * EPOCH_IN_SECONDS
+        monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", current_time)
+        governance.add_governance_reward("0x111")
+        governance.claim_governance_reward("0x111")
+
+    assert [call.gas for call in meter.calls] == [
+        96184,  # register: current_time 0 -> now
+        88368,  # first reward: reward 0 -> reward
+        54610,  # claim: current_time and reward already hold these values
+        68468,
+        37510,
+    ]
+    register, reward = meter.calls[:2]
+    assert register.sstores_set == 3 and register.cold_sloads == 3
+    assert reward.sstores_set == 2 and reward.sstores_reset == 2
+    assert reward.cold_sloads == 7  # incl. EPOCH_IN_SECONDS
@@ -0,0 +1,132 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.governance import (
+    GovernanceRewarding,
+    EPOCH_IN_SECONDS,
+    STATUS_OK,
+    STATUS_EMERGENCY_PAUSE,
+    STATUS_GOVERNER_ADDED,
+    STATUS_REWARD_ALREADY_GIVEN,
+    STATUS_GOVERNER_NOT_FOUND,
+    STATUS_REWARD_ALREADY_CLAIMED,
+    STATUS_NO_REWARD,
+)
+
+INITIAL_TIME = 1714670000
+
+
+def _governance():
+    return GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+    )
+
+
+@pytest.fixture
+def block_time(monkeypatch):
+    def set_block_time(timestamp):
+        monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", timestamp)
+
+    set_block_time(INITIAL_TIME)
+    return set_block_time
+
+
+def test_distribute_epoch_matches_scalar_path(block_time):
+    """
+    Test: Two weekly runs over known, unknown and repeated addresses,
+    once through distribute_epoch and once through add_governance_reward.
+
+    Expected: Same governers; the first run only registers, the second
+    rewards everyone once.
+    """
+    addresses = ["0x111", "0x444", "0x555", "0x111"]
+    batch, scalar = _governance(), _governance()
+
+    statuses, rewards = batch.distribute_epoch(addresses)
+    for address in addresses:
+        scalar.add_governance_reward(address)
+    assert list(statuses) == [STATUS_GOVERNER_ADDED] * 3 + [
+        STATUS_REWARD_ALREADY_GIVEN
+    ]
+    assert rewards == [0.0] * 4
+
+    block_time(INITIAL_TIME + EPOCH_IN_SECONDS)
+    statuses, rewards = batch.distribute_epoch(addresses)
+    for address in addresses:
+        scalar.add_governance_reward(address)
+    assert list(statuses) == [STATUS_OK] * 3 + [STATUS_REWARD_ALREADY_GIVEN]
+    assert rewards[2] == 0.0  # no balance
+    assert batch.governers == scalar.governers
+    assert rewards[0] == scalar.get_governer("0x111").reward
+
+
+def test_claim_many(block_time):
+    """
+    Test: Claim after one rewarded epoch, then claim again in the same epoch.
+
+    Expected: Rewards paid once, then reported by status.
+    """
+    governance = _governance()
+    governance.distribute_epoch(["0x111", "0x555"])
+    block_time(INITIAL_TIME + EPOCH_IN_SECONDS)
+    _, given = governance.distribute_epoch(["0x111", "0x555"])
+
+    statuses, rewards = governance.claim_many(["0x111", "0x555", "0x999"])
+    assert list(statuses) == [STATUS_OK, STATUS_NO_REWARD, STATUS_GOVERNER_NOT_FOUND]
+    assert rewards == [given[0], 0.0, 0.0]
+
+    statuses, _ = governance.claim_many(["0x111"])
+    assert list(statuses) == [STATUS_REWARD_ALREADY_CLAIMED]
+
+    governance.set_emergency_pause(True)
+    statuses, _ = governance.distribute_epoch(["0x111"])
+    assert list(statuses) == [STATUS_EMERGENCY_PAUSE]
+
+
+def test_fixed_point_rewards(block_time):
+    """
+    Test: Rewards computed with ABDKMath64x64 as in governance_rewarding.sol.
+    Staking balance = 100, reputation balance = 50.
+
+    Expected: count = 1 + log_2(51) / log_2(10) / 100 = 1 on the raw int128
+    values, so reward = 100 (scalar and batch).
+    """
+    batch, scalar = _governance(), _governance()
+    batch.fixed_point = scalar.fixed_point = True
+    batch.distribute_epoch(["0x111"])
+    scalar.add_governance_reward("0x111")
+    block_time(INITIAL_TIME + EPOCH_IN_SECONDS)
+    _, rewards = batch.distribute_epoch(["0x111"])
+    scalar.add_governance_reward("0x111")
+
+    assert rewards == [100]
+    assert scalar.get_governer("0x111").reward == 100
+
+
+def test_batch_paths_use_instance_epoch(block_time):
+    """
+    Test: Shorten epoch_in_seconds to an hour on the instances, then reward,
+    project and claim one hour later through the batch and scalar paths.
+
+    Expected: Same governers and statuses on both paths; the hour counts as
+    a full epoch for distribute_epoch, claim_many and the projection.
+    """
+    batch, scalar = _governance(), _governance()
+    batch.epoch_in_seconds = scalar.epoch_in_seconds = 3600
+    batch.distribute_epoch(["0x111"])
+    scalar.add_governance_reward("0x111")
+
+    block_time(INITIAL_TIME + 3600)
+    assert batch.project_governance_reward("0x111")[0] == STATUS_OK
+    statuses, _ = batch.distribute_epoch(["0x111"])
+    scalar.add_governance_reward("0x111")
+    assert list(statuses) == [STATUS_OK]
+    assert batch.governers == scalar.governers
+
+    block_time(INITIAL_TIME + 7200)
+    statuses, _ = batch.claim_many(["0x111"])
+    assert list(statuses) == [STATUS_OK]
@@ -0,0 +1,74 @@
+from prototyping.staking import Staking, EPOCH_IN_SECONDS
+
+
+def test_maturing_between(
+    block_timestamp, staking, initial_time, first_epoch_start_time
+):
+    """
+    Test: Three stakes created in the same epoch with 2, 4 and 4 epoch locks.
+
+    Expected: Each stake is reported from its end time on, and the stakes
+    that can be unstaked at a timestamp are maturing_between(0, timestamp).
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)
+    staking.stake("0x2", 1000, EPOCH_IN_SECONDS * 4)
+    staking.stake("0x3", 500, EPOCH_IN_SECONDS * 4)
+    end_2 = first_epoch_start_time + EPOCH_IN_SECONDS * 2
+    end_4 = first_epoch_start_time + EPOCH_IN_SECONDS * 4
+
+    assert staking.maturing_between(0, end_2) == []
+    assert staking.maturing_between(0, end_2 + 1) == ["0x1"]
+    assert sorted(staking.maturing_between(end_2 + 1, end_4 + 1)) == ["0x2", "0x3"]
+
+    block_timestamp.set_timestamp(end_2 + 1)
+    for address in staking.maturing_between(0, end_2 + 1):
+        assert staking.unstake(address) == 1200
+    assert staking.maturing_between(0, end_4 + 1) == ["0x2", "0x3"]
+
+
+def test_liability_schedule(
+    block_timestamp, staking, initial_time, first_epoch_start_time
+):
+    """
+    Test: Liabilities per epoch through stake, top-up, regular and emergency
+    unstake.
+
+    Expected: Each epoch bucket holds lock_amount + reward of the stakes ending
+    in it, and empty buckets are dropped.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)  # 1000 + 200
+    staking.stake("0x2", 1000, EPOCH_IN_SECONDS * 4)  # 1000 + 400
+    staking.stake("0x2", 100, EPOCH_IN_SECONDS)  # top-up: 100 + 40
+    end_2 = first_epoch_start_time + EPOCH_IN_SECONDS * 2
+    end_4 = first_epoch_start_time + EPOCH_IN_SECONDS * 4
+
+    assert staking.liability_schedule() == [(end_2, 1200), (end_4, 1540)]
+    assert staking.maturity_index.liability_due(end_4) == 1540
+
+    block_timestamp.set_timestamp(end_2 + 1)
+    staking.unstake_many(["0x1"])
+    assert staking.liability_schedule() == [(end_4, 1540)]
+
+    staking.set_emergency_pause(True)
+    staking.set_emergency_withdraw(True)
+    staking.unstake("0x2")
+    assert staking.liability_schedule() == []
+    assert len(staking.maturity_index) == 0
+
+
+def test_index_rebuilt_from_existing_stakes(block_timestamp, initial_stake):
+    """
+    Test: Staking constructed over an existing book.
+
+    Expected: The maturity index covers the existing stakes.
+    """
+    staking = Staking(
+        utility_token_addr="0x1111",
+        block_timestamp=block_timestamp,
+        stakes={"0x3333": initial_stake},
+    )
+    end = initial_stake.start_time + initial_stake.lock_duration
+
+    assert staking.liability_schedule() == [(end, 1400)]
@@ -0,0 +1,228 @@
+import asyncio
+import json
+
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.governance import GovernanceRewarding
+from prototyping.mirror import (
+    GOVERNANCE_TOKEN_CLAIM,
+    REWARD_ADDED,
+    STAKE_EMERGENCY_WITHDRAWN,
+    STAKE_INITIATED,
+    STAKE_UPDATED,
+    ChainMirror,
+    JsonLinesSource,
+    Log,
+    LogBatch,
+    PollingSource,
+)
+from prototyping.staking import EPOCH_IN_SECONDS, Stake
+
+STAKING_ADDR = "0x" + "11" * 20
+GOVERNANCE_ADDR = "0x" + "22" * 20
+USERS = ["0x" + f"{i:040x}" for i in range(1, 4)]
+
+
+def _governance():
+    return GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+    )
+
+
+def _logs(initial_time, first_epoch_start_time):
+    lock = EPOCH_IN_SECONDS * 4
+    staking_log = dict(address=STAKING_ADDR)
+    return [
+        Log.for_event(
+            STAKE_INITIATED,
+            dict(
+                owner=user,
+                amount=1000,
+                nextEpoch=first_epoch_start_time,
+                epochNum=lock,
+                reward=400,
+            ),
+            block_number=10,
+            block_timestamp=initial_time,
+            log_index=i,
+            **staking_log,
+        )
+        for i, user in enumerate(USERS)
+    ] + [
+        Log.for_event(
+            STAKE_UPDATED,
+            dict(owner=USERS[0], amount=1500, epoch=550),
+            11,
+            initial_time + 12,
+            **staking_log,
+        ),
+        Log.for_event(  # same event from another contract
+            STAKE_UPDATED,
+            dict(owner=USERS[1], amount=9999, epoch=9999),
+            11,
+            initial_time + 12,
+            log_index=1,
+        ),
+        Log.for_event(
+            STAKE_EMERGENCY_WITHDRAWN,
+            dict(owner=USERS[2], amount=1000),
+            12,
+            initial_time + 24,
+            address=GOVERNANCE_ADDR,  # not the staking contract, ignored
+        ),
+        Log.for_event(
+            STAKE_EMERGENCY_WITHDRAWN,
+            dict(owner=USERS[2], amount=1000),
+            13,
+            initial_time + 36,
+            **staking_log,
+        ),
+        Log.for_event(
+            REWARD_ADDED,
+            dict(owner=USERS[0], amount=77),
+            14,
+            initial_time + EPOCH_IN_SECONDS,
+            address=GOVERNANCE_ADDR,
+        ),
+        Log.for_event(
+            GOVERNANCE_TOKEN_CLAIM,
+            dict(owner=USERS[0], amount=77),
+            15,
+            initial_time + EPOCH_IN_SECONDS + 12,
+            address=GOVERNANCE_ADDR,
+        ),
+    ]
+
+
+def test_mirror_from_json_lines_with_checkpoint(
+    monkeypatch, staking, initial_time, first_epoch_start_time, tmp_path
+):
+    """
+    Test: Mirror stake, top-up, withdraw, reward and claim logs from a
+    JSON-lines file in batches of 2 logs, then resume from the checkpoint.
+
+    Expected: Stakes, running stats and governers match the logs, logs of
+    other contracts are ignored, the checkpoint is the last block and a
+    resumed mirror applies only the newer blocks.
+    """
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", governance_module.BLOCK_TIMESTAMP
+    )
+    staking.event_sink = events.NullSink()
+    logs = _logs(initial_time, first_epoch_start_time)
+    path = tmp_path / "logs.jsonl"
+    path.write_text("".join(json.dumps(log.to_json()) + "\n" for log in logs[:-1]))
+    checkpoint_path = tmp_path / "mirror.json"
+    governance = _governance()
+
+    mirror = ChainMirror(
+        staking,
+        governance,
+        staking_address=STAKING_ADDR,
+        governance_address=GOVERNANCE_ADDR.upper().replace("0X", "0x"),
+        checkpoint_path=checkpoint_path,
+    )
+    stats = asyncio.run(mirror.run(JsonLinesSource(path, batch_size=2)))
+    assert stats.logs_applied == 6
+    assert stats.logs_ignored == 2
+    assert stats.batches == 4  # blocks 10 | 11 | 12, 13 | 14, whole blocks only
+    assert staking.get_stake(USERS[0]) == Stake(
+        1500, first_epoch_start_time, EPOCH_IN_SECONDS * 4, 550
+    )
+    assert USERS[2] not in staking.stakes
+    staking.check_stats()
+    assert staking.stats().total_locked == 2500
+    assert governance.get_governer(USERS[0]).reward == 77
+    assert json.loads(checkpoint_path.read_text()) == {"block": 14}
+
+    with path.open("a") as file:
+        file.write(json.dumps(logs[-1].to_json()) + "\n")
+    resumed = ChainMirror(
+        staking,
+        governance,
+        staking_address=STAKING_ADDR,
+        governance_address=GOVERNANCE_ADDR,
+        checkpoint_path=checkpoint_path,
+    )
+    assert resumed.checkpoint == 14
+    stats = asyncio.run(resumed.run(JsonLinesSource(path)))
+    assert stats.logs_applied == 1
+    governer = governance.get_governer(USERS[0])
+    assert governer.reward == 0.0
+    assert governer.last_claim_time == initial_time + EPOCH_IN_SECONDS + 12
+    resumed.apply_batch(LogBatch(15, logs))  # replayed logs are skipped
+    assert resumed.stats.logs_skipped == len(logs)
+
+
+class StandInNode:
+    """
+    Local stand-in for a node: a burst of blocks with many stakes each,
+    served through block_number() / get_logs().
+    """
+
+    def __init__(self, blocks, initial_time, first_epoch_start_time, fail_at=None):
+        self.head = blocks - 1
+        self.fail_at = fail_at
+        self.calls = 0
+        self.logs = [
+            Log.for_event(
+                STAKE_INITIATED,
+                dict(
+                    owner=f"0x{block * 1000 + i:040x}",
+                    amount=1000,
+                    nextEpoch=first_epoch_start_time,
+                    epochNum=EPOCH_IN_SECONDS,
+                    reward=100,
+                ),
+                block,
+                initial_time + block * 12,
+                log_index=i,
+            ).to_json()
+            for block in range(blocks)
+            for i in range(50 if block % 10 == 0 else 1)  # bursty blocks
+        ]
+
+    async def block_number(self):
+        return self.head
+
+    async def get_logs(self, from_block, to_block):
+        self.calls += 1
+        if self.fail_at is not None and from_block >= self.fail_at:
+            raise ConnectionError("node went away")
+        await asyncio.sleep(0)
+        return [
+            entry
+            for entry in self.logs
+            if from_block <= int(entry["blockNumber"], 16) <= to_block
+        ]
+
+
+def test_polling_source_backpressure(staking, initial_time, first_epoch_start_time):
+    """
+    Test: Mirror 100 bursty blocks from a stand-in node in ranges of 5 blocks
+    with a queue of 2 batches; then a node that fails half way.
+
+    Expected: Every stake is applied, the queue never holds more than 2
+    batches, the checkpoint is the head; the node error reaches run().
+    """
+    staking.event_sink = events.NullSink()
+    node = StandInNode(100, initial_time, first_epoch_start_time)
+    mirror = ChainMirror(staking, queue_size=2)
+    source = PollingSource(node, max_blocks=5, until_block=node.head)
+    stats = asyncio.run(mirror.run(source))
+    assert stats.logs_applied == len(node.logs) == 10 * 50 + 90
+    assert stats.max_queue_depth <= 2
+    assert node.calls == 20
+    assert mirror.checkpoint == 99
+    assert staking.stats().staker_count == len(node.logs)
+
+    failing = StandInNode(100, initial_time, first_epoch_start_time, fail_at=50)
+    mirror = ChainMirror(staking.fork(), queue_size=2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(mirror.run(PollingSource(failing, max_blocks=5)))
+    assert mirror.checkpoint == 49
@@ -0,0 +1,203 @@
+import random
+
+import pytest
+
+from prototyping import events
+from prototyping.presale import (
+    STATUS_BLACKLISTED,
+    STATUS_INSUFFICIENT_TOKENS,
+    STATUS_INVALID_AMOUNT,
+    STATUS_INVALID_PRESALE_ID,
+    STATUS_NOT_ACTIVE,
+    STATUS_NOT_PARTICIPANT,
+    STATUS_NOTHING_TO_CLAIM,
+    STATUS_OK,
+    STATUS_PAUSED,
+    Presale,
+    PresaleOrder,
+    StubPriceFeed,
+    UserData,
+    generate_orders,
+    run_launch,
+)
+
+TOKEN = 10**18
+USDC = 10**6
+ETH_USD = 3000 * 10**8  # aggregator answer, 8 decimals
+
+
+@pytest.fixture
+def presale(block_timestamp, initial_time):
+    block_timestamp.set_timestamp(initial_time)
+    return Presale(
+        StubPriceFeed(ETH_USD),
+        usdc_addr="0x2",
+        sale_token_addr="0x3",
+        block_timestamp=block_timestamp,
+        event_sink=events.RingBufferSink(),
+    )
+
+
+def test_buy_and_claim(presale):
+    """
+    Test: Buy with USDC and ETH before and during a stage, while paused,
+    blacklisted and for nothing, then claim before and after claims are
+    enabled and funded, and move a claim to a new wallet.
+
+    Expected: Token amounts follow usdcToTokens / ethToTokens, rejected
+    calls change nothing, a claim pays once; revert reasons are emitted.
+    """
+    assert presale.buy_with_usdc("0xa", 100 * USDC) == 0  # no stage yet
+    presale.create_presale(50 * TOKEN)  # 50 tokens per USDC
+    presale.create_presale(40 * TOKEN)
+    presale.set_presale_stage(1)
+
+    assert presale.buy_with_usdc("0xa", 100 * USDC) == 5000 * TOKEN
+    assert presale.buy_with_usdc("0xa", 20 * USDC) == 1000 * TOKEN
+    assert presale.buy_with_eth("0xb", TOKEN // 1000) == 150 * TOKEN  # $3
+    assert presale.buy_with_usdc("0xb", 0) == 0
+    assert presale.user_claim_data("0xa", 1) == UserData(120 * USDC, 0, 6000 * TOKEN)
+    assert (presale.unique_buyers, presale.overall_raised) == (2, 123 * USDC)
+    assert presale.received_wei == TOKEN // 1000
+
+    presale.blacklist_user("0xb", True)
+    presale.pause_presale(1)
+    assert presale.buy_with_usdc("0xc", USDC) == 0
+    reverted = presale.event_sink.events(events.PresaleCallReverted)
+    assert [event.reason for event in reverted] == [
+        "Invalid presale id",
+        "Invalid sale amount",
+        "Presale paused",
+    ]
+    presale.unpause_presale(1)
+    presale.set_presale_stage(2)
+    assert presale.presale[1].end_time == presale.presale[2].start_time
+    assert presale.buy_with_usdc("0xa", USDC) == 40 * TOKEN
+
+    assert presale.claim_amount("0xc", 1) == 0  # never bought
+    assert presale.claim_amount("0xa", 1) == 0  # not enabled, not funded
+    presale.enable_claim(1, True)
+    presale.sale_token_balance = 10**6 * TOKEN
+    assert presale.claim_amount("0xa", 1) == 6000 * TOKEN
+    assert presale.claim_amount("0xa", 1) == 0
+    assert presale.claim_amount("0xb", 1) == 0  # blacklisted
+    assert presale.claimable_amount("0xa", 2) == 40 * TOKEN
+
+    presale.change_claim_address("0xa", "0xd")  # moves stage 1 only, as on chain
+    assert not presale.is_exist("0xa") and presale.is_exist("0xd")
+    assert presale.claimable_amount("0xd", 2) == 0
+    assert presale.claimable_amount("0xa", 2) == 40 * TOKEN
+    statuses, claimed = presale.claim_many(["0xa", "0xd", "0xb"], 1)
+    assert list(statuses) == [
+        STATUS_NOT_PARTICIPANT,
+        STATUS_NOTHING_TO_CLAIM,
+        STATUS_BLACKLISTED,
+    ]
+    presale.sale_token_balance = 0
+    presale.blacklist_user("0xb", False)
+    assert list(presale.claim_many(["0xb"], 1)[0]) == [STATUS_INSUFFICIENT_TOKENS]
+    presale.sale_token_balance = TOKEN * 10**6
+    assert list(presale.claim_many(["0xb"], 2)[0]) == [STATUS_NOTHING_TO_CLAIM]
+    statuses, claimed = presale.claim_many(["0xb"], 1)
+    assert (list(statuses), claimed) == ([STATUS_OK], [150 * TOKEN])
+
+
+def test_buy_many_matches_scalar_path(block_timestamp, initial_time):
+    """
+    Test: Apply the same random USDC / ETH orders, some blacklisted, zero or
+    paused, through buy_many and through the scalar buys, with capped stages
+    that roll over in the middle of the batch.
+
+    Expected: Same statuses, tokens, stage accounting and per-buyer claim
+    data; the last stage closes once sold out.
+    """
+    rng = random.Random(5)
+    addresses = [f"0x{rng.randrange(50):x}" for _ in range(400)]
+    with_eth = [rng.random() < 0.4 for _ in range(400)]
+    amounts = [  # wei or USDC units, zero and dust included
+        rng.choice([0, 10**9, 3 * 10**17] if eth else [0, 1, 10**8, 10**9])
+        for eth in with_eth
+    ]
+
+    presales = []
+    for _ in range(2):
+        block_timestamp.set_timestamp(initial_time)
+        presale = Presale(
+            StubPriceFeed(ETH_USD),
+            "0x2",
+            "0x3",
+            block_timestamp=block_timestamp,
+            event_sink=events.NullSink(),
+        )
+        for price, cap in [(50, 10**6), (40, 2 * 10**6), (30, 10**6)]:
+            presale.create_presale(price * TOKEN, tokens_to_sell=cap * TOKEN)
+        presale.set_presale_stage(1)
+        presale.blacklist_user("0x7", True)
+        presales.append(presale)
+    batch, scalar = presales
+
+    statuses, bought, expected = [], [], []
+    segments = [(range(150), False), (range(150, 170), True), (range(170, 400), False)]
+    for rows, paused in segments:
+        if paused:
+            for presale in presales:
+                presale.pause_presale(presale.current_sale)
+        part = batch.buy_many(
+            [addresses[i] for i in rows],
+            [amounts[i] for i in rows],
+            [with_eth[i] for i in rows],
+        )
+        statuses += part[0]
+        bought += part[1]
+        for i in rows:
+            buy = scalar.buy_with_eth if with_eth[i] else scalar.buy_with_usdc
+            expected.append(buy(addresses[i], amounts[i]))
+        if paused:
+            for presale in presales:
+                presale.unpause_presale(presale.current_sale)
+
+    assert bought == expected
+    assert set(statuses) == {
+        STATUS_OK,
+        STATUS_INVALID_AMOUNT,
+        STATUS_BLACKLISTED,
+        STATUS_PAUSED,
+        STATUS_NOT_ACTIVE,  # after the last stage sold out
+    }
+    assert batch.presale == scalar.presale
+    assert not batch.presale[3].active and batch.presale[3].end_time
+    for address in set(addresses):
+        for presale_id in (1, 2, 3):
+            assert batch.user_claim_data(
+                address, presale_id
+            ) == scalar.user_claim_data(address, presale_id)
+    for name in ("overall_raised", "unique_buyers", "received_wei", "received_usdc"):
+        assert getattr(batch, name) == getattr(scalar, name)
+
+
+def test_launch_replay(presale, initial_time):
+    """
+    Test: Replay a generated launch over two capped stages, with orders
+    before the first stage is set.
+
+    Expected: Both stages sell out in order and the totals add up; orders
+    without an active stage are rejected.
+    """
+    presale.event_sink = events.NullSink()
+    presale.create_presale(50 * TOKEN, tokens_to_sell=20 * 10**6 * TOKEN)
+    presale.create_presale(40 * TOKEN, tokens_to_sell=20 * 10**6 * TOKEN)
+    early = [PresaleOrder(initial_time, "0x1", 100 * USDC)]
+    assert run_launch(presale, early).rejections == {STATUS_INVALID_PRESALE_ID: 1}
+
+    presale.set_presale_stage(1)
+    orders = generate_orders(
+        buyers=500, orders=2000, start_time=initial_time, orders_per_block=100
+    )
+    result = run_launch(presale, orders)
+    assert result.orders == 2000
+    assert result.unique_buyers == 500
+    (_, start_1, end_1), (_, start_2, end_2) = result.stage_times
+    assert start_1 < end_1 == start_2 < end_2
+    assert result.tokens_sold == presale.presale[1].sold + presale.presale[2].sold
+    assert result.usdc_raised == presale.overall_raised
+    assert result.orders_filled + sum(result.rejections.values()) == 2000
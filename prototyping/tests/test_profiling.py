@@ -0,0 +1,147 @@
+from prototyping import events
+from prototyping.profiling import Profiler, main, profile_trace
+from prototyping.staking import EPOCH_IN_SECONDS
+from prototyping.workload import WorkloadConfig, generate_events, write_trace
+
+
+def test_probes_count_branches_and_detach(staking, block_timestamp, initial_time):
+    """
+    Test: Attach a profiler, stake new and top-up through stake() and
+    stake_many(), unstake, then detach.
+
+    Expected: Calls are counted per branch, nested calls become stack paths
+    with self time, and detaching leaves no probe on the instance.
+    """
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    profiler = Profiler()
+    profiler.attach(staking)
+
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)
+    staking.stake("0x1", 500, EPOCH_IN_SECONDS * 2)
+    staking.stake("0x2", 0, EPOCH_IN_SECONDS * 2)  # invalid, still validated
+    staking.stake_many(["0x3", "0x1"], [100, 100], [EPOCH_IN_SECONDS * 2] * 2)
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 4)
+    staking.unstake("0x1")
+
+    calls = {stats.name: stats.calls for stats in profiler.summary()}
+    assert calls["Staking.stake"] == 3
+    assert calls["Staking.stake[new]"] == 2
+    assert calls["Staking.stake[top_up]"] == 1
+    assert calls["Staking._validate_stake_params"] == 3
+    assert calls["Staking._on_stake_created"] == 1
+    assert calls["Staking._on_stake_topped_up"] == 1
+    assert calls["Staking._on_stakes_staked"] == 1  # 0x3 and 0x1 in one batch
+    assert calls["Staking.unstake[regular]"] == 1
+    assert "Staking.stake;Staking.stake[new];Staking._validate_stake_params" in (
+        profiler.stacks
+    )
+    assert "Staking.stake_many;Staking._on_stakes_staked" in profiler.stacks
+    for stats in profiler.summary():
+        assert 0 <= stats.self_ns <= stats.total_ns
+
+    profiler.detach()
+    assert "stake" not in vars(staking) and "_on_stake_created" not in vars(staking)
+    staking.stake("0x4", 1000, EPOCH_IN_SECONDS * 2)
+    assert profiler.stats["Staking.stake"].calls == 3
+
+
+def test_unstake_branches_follow_emergency_flags(
+    staking, block_timestamp, initial_time
+):
+    """
+    Test: Unstake under emergency pause without and with emergency withdraw.
+
+    Expected: The paused call is labelled as rejected ("paused"), only the
+    call with both flags set as "emergency".
+    """
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)
+    profiler = Profiler()
+    profiler.attach(staking)
+
+    staking.set_emergency_pause(True)
+    staking.unstake("0x1")
+    staking.unstake_many(["0x1"])
+    staking.set_emergency_withdraw(True)
+    staking.unstake("0x1")
+    profiler.detach()
+
+    calls = {stats.name: stats.calls for stats in profiler.summary()}
+    assert calls["Staking.unstake[paused]"] == 1
+    assert calls["Staking.unstake_many[paused]"] == 1
+    assert calls["Staking.unstake[emergency]"] == 1
+    assert "0x1" not in staking.stakes
+
+
+def test_profile_trace_cli(tmp_path, capsys):
+    """
+    Test: Run the profiling CLI on a small generated trace with memory
+    snapshots and a collapsed stack file.
+
+    Expected: The summary lists the batch paths, one memory sample per epoch
+    boundary and a snapshot file each; every stack line ends in a count.
+    """
+    config = WorkloadConfig(seed=3, epochs=3, stakes_per_epoch=40, max_lock_epochs=2)
+    trace = tmp_path / "small.trace"
+    write_trace(generate_events(config), trace)
+    stacks = tmp_path / "small.folded"
+    snapshots = tmp_path / "snapshots"
+    snapshots.mkdir()
+
+    argv = [str(trace), "--memory", "--stacks", str(stacks)]
+    assert main(argv + ["--snapshot-dir", str(snapshots), "--top", "3"]) == 0
+    output = capsys.readouterr().out
+    assert "Staking.stake_many" in output
+    assert "GovernanceRewarding.distribute_epoch" in output
+    assert output.count("MiB traced") == len(list(snapshots.iterdir())) >= 3
+    lines = stacks.read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profile_trace_row_branches(tmp_path):
+    """
+    Test: Profile a generated trace with top-ups, unstakes, governance
+    rewards and claims, all replayed through the batch functions.
+
+    Expected: The batch hooks are split into per-row branch frames whose
+    calls add up to the rows of the batches, and each branch shows up in the
+    collapsed stacks below its batch frame.
+    """
+    config = WorkloadConfig(
+        seed=3,
+        epochs=8,
+        stakes_per_epoch=40,
+        max_lock_epochs=4,
+        top_up_probability=0.5,
+        claim_every_epochs=2,
+    )
+    trace = tmp_path / "rows.trace"
+    write_trace(generate_events(config), trace)
+
+    result, profiler = profile_trace(trace)
+
+    calls = {stats.name: stats.calls for stats in profiler.summary()}
+    for frame in (
+        "Staking._on_stakes_staked[new]",
+        "Staking._on_stakes_staked[top_up]",
+        "Staking._on_stakes_removed[regular]",
+        "Staking._validate_stake_params_many[valid]",
+        "GovernanceRewarding.distribute_epoch[register]",
+        "GovernanceRewarding.distribute_epoch[reward]",
+        "GovernanceRewarding.claim_many[claim]",
+    ):
+        assert calls[frame] > 0, frame
+    assert (
+        calls["Staking._on_stakes_staked[new]"]
+        + calls["Staking._on_stakes_staked[top_up]"]
+        == result.stakes_applied
+    )
+    assert calls["Staking._on_stakes_removed[regular]"] == result.unstakes_applied
+    assert (
+        "Staking.stake_many;Staking._on_stakes_staked;"
+        "Staking._on_stakes_staked[top_up]"
+    ) in profiler.stacks
+    for stats in profiler.summary():
+        assert 0 <= stats.self_ns <= stats.total_ns
@@ -0,0 +1,137 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import InMemoryBalanceProvider, StakingBalanceProvider
+from prototyping.governance import GovernanceRewarding
+from prototyping.staking import (
+    EPOCH_IN_SECONDS,
+    STATUS_EMERGENCY_PAUSE,
+    STATUS_NO_STAKE,
+    STATUS_NOT_ENDED,
+    STATUS_OK,
+    STATUS_WITHDRAW_CAP,
+)
+
+
+def test_project_withdrawal_matches_unstake(staking, block_timestamp, initial_time):
+    """
+    Test: Project withdrawals before and after the stakes end, after a top-up,
+    under the withdraw cap and during an emergency pause, and compare with
+    unstake_many on a fork.
+
+    Expected: Same (status, amount) as unstake without changing the stakes;
+    a top-up is projected right away.
+    """
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)
+    staking.stake("0x2", 500, EPOCH_IN_SECONDS * 4)
+    addresses = ["0x1", "0x2", "0x3"]
+
+    def projected(at_time=None):
+        return [staking.project_withdrawal(a, at_time) for a in addresses]
+
+    assert projected() == [(STATUS_NOT_ENDED, 0)] * 2 + [(STATUS_NO_STAKE, 0)]
+    after = initial_time + EPOCH_IN_SECONDS * 6
+    assert projected(after)[0] == (STATUS_OK, 1000 + staking.get_stake("0x1").reward)
+
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)  # top-up
+    block_timestamp.set_timestamp(after)
+    statuses, amounts = staking.fork().unstake_many(addresses)
+    assert projected() == list(zip(statuses, amounts))
+    assert staking.get_stake("0x1").lock_amount == 2000
+
+    staking.max_multiplier_to_withdraw = 1
+    assert staking.project_withdrawal("0x2")[0] == STATUS_WITHDRAW_CAP
+    staking.set_emergency_pause(True)
+    assert staking.project_withdrawal("0x2") == (STATUS_EMERGENCY_PAUSE, 0)
+    staking.set_emergency_withdraw(True)
+    assert staking.project_withdrawal("0x2") == (STATUS_OK, 500)
+
+
+def test_project_governance_reward(monkeypatch):
+    """
+    Test: Project the reward of a governer, change its balances, project
+    again and cross an epoch.
+
+    Expected: Same reward add_governance_reward gives; the memoized reward
+    is reused while the balances stay the same and follows a balance change
+    within the epoch.
+    """
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", 1714670000)
+    ledger = {"0x111": {"0x222": 100.0, "0x333": 50.0}}
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        staking_balances=InMemoryBalanceProvider(ledger),
+        reputation_balances=InMemoryBalanceProvider(ledger),
+    )
+    assert governance.project_governance_reward("0x111") == (
+        governance_module.STATUS_GOVERNER_ADDED,
+        0.0,
+    )
+    governance.add_governance_reward("0x111")
+    assert governance.project_governance_reward("0x111")[0] == (
+        governance_module.STATUS_REWARD_ALREADY_GIVEN
+    )
+    next_epoch = 1714670000 + EPOCH_IN_SECONDS
+    status, reward = governance.project_governance_reward("0x111", next_epoch)
+    assert status == governance_module.STATUS_OK
+
+    assert governance.project_governance_reward("0x111", next_epoch)[1] == reward
+    assert len(governance.projections) == 1
+
+    ledger["0x111"]["0x222"] = 200.0
+    status, doubled = governance.project_governance_reward("0x111", next_epoch)
+    assert doubled == pytest.approx(2 * reward)
+
+    ledger["0x111"]["0x222"] = 300.0
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", next_epoch)
+    status, reward = governance.project_governance_reward("0x111")
+    governance.add_governance_reward("0x111")
+    assert reward == governance.get_governer("0x111").reward
+    assert reward == pytest.approx(3 * doubled / 2)
+
+    governance.set_emergency_pause(True)
+    assert governance.project_governance_reward("0x111") == (
+        governance_module.STATUS_EMERGENCY_PAUSE,
+        0.0,
+    )
+
+
+def test_project_governance_reward_follows_stakes(
+    staking, block_timestamp, initial_time, monkeypatch
+):
+    """
+    Test: Project the reward of a governer staked through Staking, top up
+    the stake in the same epoch, project again and add the reward.
+
+    Expected: The second projection is the reward add_governance_reward
+    pays, not the one memoized before the top-up.
+    """
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", initial_time)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        staking_balances=StakingBalanceProvider(staking),
+        reputation_balances=InMemoryBalanceProvider(),
+    )
+    staking.stake("0x111", 1000, EPOCH_IN_SECONDS * 4)
+    governance.add_governance_reward("0x111")
+    next_epoch = initial_time + EPOCH_IN_SECONDS
+    block_timestamp.set_timestamp(next_epoch)
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", next_epoch)
+    assert governance.project_governance_reward("0x111") == (STATUS_OK, 1000)
+
+    staking.stake("0x111", 5000, EPOCH_IN_SECONDS * 2)
+    projected = governance.project_governance_reward("0x111")
+    governance.add_governance_reward("0x111")
+    assert projected == (STATUS_OK, governance.get_governer("0x111").reward)
+    assert projected[1] == 6000
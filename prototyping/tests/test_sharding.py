@@ -0,0 +1,86 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import StakingBalanceProvider
+from prototyping.governance import GovernanceRewarding
+from prototyping.sharding import GovernanceTotals, ShardedLedger
+from prototyping.staking import EPOCH_IN_SECONDS, BlockTimestamp, Staking
+
+INITIAL_TIME = 1714670000
+STAKING_KWARGS = {"utility_token_addr": "0x1111", "reward_rate_per_epoch": 10}
+GOVERNANCE_KWARGS = {
+    "governance_token_addr": "0x000",
+    "staking_addr": "0x222",
+    "reputation_addr": "0x333",
+}
+
+
+def test_sharded_ledger_matches_single_process(monkeypatch):
+    """
+    Test: Run stakes, top-ups, governance rewards, claims and unstakes for
+    60 addresses through a 3-shard ledger and through one Staking /
+    GovernanceRewarding pair.
+
+    Expected: Same per-row outcomes in input order, same stats, liability
+    schedule, maturing stakes and governance totals; worker errors are
+    raised by the front end.
+    """
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", INITIAL_TIME)
+    staking = Staking(
+        block_timestamp=BlockTimestamp(INITIAL_TIME),
+        event_sink=events.NullSink(),
+        **STAKING_KWARGS,
+    )
+    governance = GovernanceRewarding(
+        event_sink=events.NullSink(),
+        staking_balances=StakingBalanceProvider(staking),
+        **GOVERNANCE_KWARGS,
+    )
+
+    def set_timestamp(timestamp):
+        staking.block_timestamp.set_timestamp(timestamp)
+        governance_module.BLOCK_TIMESTAMP = timestamp
+
+    addresses = [f"0x{i:03x}" for i in range(60)]
+    amounts = [1000 * (i + 1) for i in range(60)]
+    durations = [EPOCH_IN_SECONDS * (2 + i % 5) for i in range(60)]
+    with ShardedLedger(
+        STAKING_KWARGS, GOVERNANCE_KWARGS, shards=3, initial_time=INITIAL_TIME
+    ) as ledger:
+        assert len({ledger.shard_of(address) for address in addresses}) == 3
+        steps = [
+            (INITIAL_TIME, "stake_many", (addresses, amounts, durations)),
+            (INITIAL_TIME, "distribute_epoch", (addresses,)),
+            (INITIAL_TIME + 1, "stake_many", (addresses, amounts, durations)),
+            (INITIAL_TIME + EPOCH_IN_SECONDS, "distribute_epoch", (addresses,)),
+            (INITIAL_TIME + 2 * EPOCH_IN_SECONDS, "claim_many", (addresses[:30],)),
+            (INITIAL_TIME + 5 * EPOCH_IN_SECONDS, "unstake_many", (addresses,)),
+        ]
+        for timestamp, name, args in steps:
+            set_timestamp(timestamp)
+            ledger.set_timestamp(timestamp)
+            target = staking if hasattr(staking, name) else governance
+            expected = getattr(target, name)(*args)
+            assert getattr(ledger, name)(*args) == expected
+
+        assert ledger.stats() == staking.stats()
+        assert ledger.liability_schedule() == staking.liability_schedule()
+        t1 = INITIAL_TIME + 8 * EPOCH_IN_SECONDS
+        assert sorted(ledger.maturing_between(0, t1)) == sorted(
+            staking.maturing_between(0, t1)
+        )
+        assert ledger.governance_totals() == GovernanceTotals(
+            governer_count=len(governance.governers),
+            total_reward=pytest.approx(
+                sum(governer.reward for governer in governance.governers.values())
+            ),
+        )
+        assert ledger.get_stake(addresses[-1]) == staking.get_stake(addresses[-1])
+        assert ledger.unstake(addresses[-1]) == staking.unstake(addresses[-1])
+        assert ledger.get_governer(addresses[0]) == governance.get_governer(
+            addresses[0]
+        )
+        with pytest.raises(TypeError):
+            ledger.maturing_between(None, None)
+        assert ledger.stats() == staking.stats()  # still serving
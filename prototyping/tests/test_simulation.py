@@ -0,0 +1,111 @@
+import pytest
+
+from prototyping.staking import EPOCH_IN_SECONDS
+from prototyping.simulation import (
+    Simulation,
+    StakeEvent,
+    TopUpEvent,
+    UnstakeEvent,
+    RewardRateChangeEvent,
+    EmergencyEvent,
+)
+
+
+def test_simulation_matches_manual_steps(
+    block_timestamp, staking, initial_time, first_epoch_start_time
+):
+    """
+    Test: Stream of stake, top-up, rate change and unstake events.
+    Initial stake: amount = 1000, duration = 4 epochs, rate = 10% => reward 400
+    Top-up one epoch after start at rate 1%: amount = 100 => reward 100 * 1% * 3
+
+    Expected: Withdraw amount = 1100 + 403, the other stake is still locked.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    events = [
+        StakeEvent(initial_time, "0x3333", 1000, EPOCH_IN_SECONDS * 4),
+        StakeEvent(initial_time, "0x4444", 1000, EPOCH_IN_SECONDS * 8),
+        RewardRateChangeEvent(initial_time + EPOCH_IN_SECONDS, 1),
+        TopUpEvent(initial_time + EPOCH_IN_SECONDS, "0x3333", 100, EPOCH_IN_SECONDS),
+        UnstakeEvent(first_epoch_start_time + EPOCH_IN_SECONDS * 4 + 1, "0x3333"),
+        UnstakeEvent(first_epoch_start_time + EPOCH_IN_SECONDS * 4 + 1, "0x4444"),
+    ]
+    result = Simulation(staking, events).run()
+
+    assert result.events_applied == 6
+    assert result.stakes_applied == 3
+    assert result.unstakes_applied == 1
+    assert result.unstakes_rejected == 1
+    assert result.total_withdrawn == 1100 + 403
+    assert list(staking.stakes) == ["0x4444"]
+    assert result.end_time == first_epoch_start_time + EPOCH_IN_SECONDS * 4 + 1
+
+
+def test_scheduled_events_merge_with_stream(block_timestamp, staking, initial_time):
+    """
+    Test: Emergency episode scheduled on top of a stream of stakes and unstakes.
+
+    Expected: Stakes during the pause are rejected and unstakes during the
+    emergency withdraw return the lock amount only.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    stream = [
+        StakeEvent(initial_time, "0x1", 1000, EPOCH_IN_SECONDS * 4),
+        StakeEvent(initial_time + 20, "0x2", 1000, EPOCH_IN_SECONDS * 4),
+        UnstakeEvent(initial_time + 40, "0x1"),
+    ]
+    simulation = Simulation(staking, stream)
+    simulation.schedule(EmergencyEvent(initial_time + 10, emergency_pause=True))
+    simulation.schedule(EmergencyEvent(initial_time + 30, emergency_withdraw=True))
+    result = simulation.run()
+
+    assert result.stakes_rejected == 1
+    assert result.total_withdrawn == 1000
+    assert len(staking.stakes) == 0
+
+
+def test_run_until_and_epoch_callbacks(
+    block_timestamp, staking, initial_time, first_epoch_start_time
+):
+    """
+    Test: Epoch callback that schedules the unstake of every matured stake.
+
+    Expected: The clock stops at each epoch start up to `until`, and stakes are
+    withdrawn in the epoch after they mature.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    simulation = Simulation(staking)
+    simulation.schedule(StakeEvent(initial_time, "0x1", 1000, EPOCH_IN_SECONDS))
+    simulation.schedule(StakeEvent(initial_time, "0x2", 1000, EPOCH_IN_SECONDS * 2))
+    epochs = []
+
+    def unstake_matured(simulation, epoch_start_time):
+        epochs.append(epoch_start_time)
+        for address in staking.maturing_between(0, epoch_start_time):
+            simulation.schedule(UnstakeEvent(epoch_start_time + 1, address))
+
+    simulation.on_epoch(unstake_matured)
+    until = first_epoch_start_time + EPOCH_IN_SECONDS * 3 + 1
+    result = simulation.run(until=until)
+
+    assert epochs == [first_epoch_start_time + EPOCH_IN_SECONDS * i for i in range(4)]
+    assert result.unstakes_applied == 2
+    assert result.total_withdrawn == 1100 + 1200
+    assert result.end_time == until
+
+
+def test_rejects_out_of_order_events(block_timestamp, staking, initial_time):
+    """
+    Test: Unordered stream and an event scheduled in the past.
+
+    Expected: ValueError.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    simulation = Simulation(
+        staking,
+        [UnstakeEvent(initial_time + 10, "0x1"), UnstakeEvent(initial_time, "0x1")],
+    )
+    with pytest.raises(ValueError):
+        simulation.run()
+    with pytest.raises(ValueError):
+        simulation.schedule(UnstakeEvent(initial_time - 1, "0x1"))
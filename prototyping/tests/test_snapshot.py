@@ -0,0 +1,155 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import StakingBalanceProvider
+from prototyping.governance import GovernanceRewarding
+from prototyping.snapshot import MappedBook, load_snapshot, save_delta, save_snapshot
+from prototyping.staking import EPOCH_IN_SECONDS
+
+INITIAL_TIME = 1714670000
+
+
+def _stake_population(staking, block_timestamp, first_epoch_start_time):
+    block_timestamp.set_timestamp(first_epoch_start_time - 100)
+    staking.stake_many(
+        [f"0x{i:04x}" for i in range(50)],
+        [1000 + i for i in range(49)] + [10**24],  # above 2**64
+        [EPOCH_IN_SECONDS * (1 + i % 5) for i in range(50)],
+    )
+
+
+def test_staking_round_trip(staking, block_timestamp, first_epoch_start_time, tmp_path):
+    """
+    Test: Save a staking population (including an amount above 2**64)
+    and load it back.
+
+    Expected: Same stakes, scalar state, stats and liability schedule.
+    """
+    staking.event_sink = events.NullSink()
+    _stake_population(staking, block_timestamp, first_epoch_start_time)
+    path = tmp_path / "staking.snap"
+    save_snapshot(staking, path)
+
+    loaded = load_snapshot(path, event_sink=events.NullSink())
+    assert isinstance(loaded.stakes, MappedBook)
+    assert len(loaded.stakes) == 50
+    assert dict(loaded.stakes.items()) == {
+        address: staking.get_stake(address) for address in staking.stakes
+    }
+    assert loaded.get_stake("0x0031").lock_amount == 10**24
+    assert loaded.block_timestamp.timestamp == block_timestamp.timestamp
+    assert loaded.reward_rate_per_epoch == staking.reward_rate_per_epoch
+    assert loaded.stats() == staking.stats()
+    assert loaded.liability_schedule() == staking.liability_schedule()
+
+
+def test_staking_deltas(staking, block_timestamp, first_epoch_start_time, tmp_path):
+    """
+    Test: Load a snapshot, top up, unstake and add stakes, append two deltas
+    and reload snapshot + deltas.
+
+    Expected: The reloaded state matches the live one, rows written
+    back unchanged are not part of a delta.
+    """
+    staking.event_sink = events.NullSink()
+    _stake_population(staking, block_timestamp, first_epoch_start_time)
+    path, deltas = tmp_path / "staking.snap", tmp_path / "staking.delta"
+    save_snapshot(staking, path)
+    live = load_snapshot(path, event_sink=events.NullSink(), debug=True)
+
+    live.stake("0x0001", 500, EPOCH_IN_SECONDS)  # top-up
+    live.stake("0xnew1", 700, EPOCH_IN_SECONDS * 2)
+    live.get_stake("0x0002")  # read only
+    assert save_delta(live, deltas) == (2, 0)
+
+    live.block_timestamp.set_timestamp(first_epoch_start_time + EPOCH_IN_SECONDS + 1)
+    live.unstake("0x0000")
+    live.unstake("0xnew1")  # not ended yet
+    live.set_reward_rate_per_epoch(5)
+    assert save_delta(live, deltas) == (0, 1)
+
+    reloaded = load_snapshot(path, deltas=deltas, event_sink=events.NullSink())
+    assert dict(reloaded.stakes.items()) == dict(live.stakes.items())
+    assert "0x0000" not in reloaded.stakes
+    assert reloaded.reward_rate_per_epoch == 5
+    assert reloaded.stats() == live.stats()
+    assert reloaded.liability_schedule() == live.liability_schedule()
+
+
+def test_reads_copy_no_rows(staking, block_timestamp, first_epoch_start_time, tmp_path):
+    """
+    Test: Load a snapshot, read stakes, project a withdrawal and read the
+    staked balances in bulk, then top up one stake.
+
+    Expected: The reads copy no row into memory and leave nothing for a
+    delta; the top-up copies and writes its row only.
+    """
+    staking.event_sink = events.NullSink()
+    _stake_population(staking, block_timestamp, first_epoch_start_time)
+    path, deltas = tmp_path / "staking.snap", tmp_path / "staking.delta"
+    save_snapshot(staking, path)
+    live = load_snapshot(path, event_sink=events.NullSink())
+
+    assert live.get_stake("0x0002").lock_amount == 1002
+    live.project_withdrawal("0x0003")
+    addresses = ["0x0004", "0x0005", "0xnone"]
+    assert StakingBalanceProvider(live).balances_of(addresses, None) == [1004, 1005, 0]
+    assert live.stakes.rows_copied() == 0
+    assert save_delta(live, deltas) == (0, 0)
+
+    live.stake("0x0001", 500, EPOCH_IN_SECONDS)
+    assert live.stakes.rows_copied() == 1
+    assert save_delta(live, deltas) == (1, 0)
+
+
+def test_save_snapshot_over_mapped_file(staking, tmp_path):
+    """
+    Test: Save a loaded snapshot over the file it is mapped from.
+
+    Expected: ValueError, file left intact.
+    """
+    path = tmp_path / "staking.snap"
+    save_snapshot(staking, path)
+    loaded = load_snapshot(path, event_sink=events.NullSink())
+    with pytest.raises(ValueError):
+        save_snapshot(loaded, path)
+    assert len(load_snapshot(path, event_sink=events.NullSink()).stakes) == 0
+
+
+@pytest.mark.parametrize("fixed_point", [False, True])
+def test_governance_round_trip(monkeypatch, tmp_path, fixed_point):
+    """
+    Test: Save governers after one rewarded epoch, load, claim, save a delta
+    and reload.
+
+    Expected: Governers and scalar state survive both round trips; reading
+    a governer copies no row.
+    """
+    monkeypatch.setattr(governance_module, "BLOCK_TIMESTAMP", INITIAL_TIME)
+    governance = GovernanceRewarding(
+        governance_token_addr="0x000",
+        staking_addr="0x222",
+        reputation_addr="0x333",
+        event_sink=events.NullSink(),
+        fixed_point=fixed_point,
+    )
+    governance.distribute_epoch(["0x111", "0x444"])
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", INITIAL_TIME + EPOCH_IN_SECONDS
+    )
+    governance.distribute_epoch(["0x111", "0x444"])
+    path, deltas = tmp_path / "governance.snap", tmp_path / "governance.delta"
+    save_snapshot(governance, path)
+
+    loaded = load_snapshot(path, event_sink=events.NullSink())
+    assert loaded.fixed_point == fixed_point
+    assert dict(loaded.governers.items()) == governance.governers
+    assert loaded.get_governer("0x444") == governance.get_governer("0x444")
+    assert loaded.governers.rows_copied() == 0  # reads copy nothing
+
+    loaded.claim_many(["0x111"])
+    save_delta(loaded, deltas)
+    reloaded = load_snapshot(path, deltas=deltas, event_sink=events.NullSink())
+    assert dict(reloaded.governers.items()) == dict(loaded.governers.items())
+    assert reloaded.get_governer("0x111").reward == 0
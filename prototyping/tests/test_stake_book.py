@@ -0,0 +1,131 @@
+import pickle
+import random
+
+import pytest
+
+from prototyping.staking import Stake, EPOCH_IN_SECONDS, MAX_LOCK_AMOUNT
+from prototyping.stake_book import ColumnarStakeBook
+
+
+def test_row_round_trip_with_large_amount():
+    """
+    Test: Store a stake with a lock amount above 2**64 (wei) and read it back.
+
+    Expected: All fields are returned unchanged.
+    """
+    book = ColumnarStakeBook()
+    stake = Stake(
+        lock_amount=MAX_LOCK_AMOUNT * 3 + 7,
+        start_time=1715212800,
+        lock_duration=EPOCH_IN_SECONDS * 4,
+        reward=400.0,
+    )
+    book["0x3333"] = stake
+
+    assert "0x3333" in book
+    assert book["0x3333"] == stake
+    assert book["0x3333"].to_stake() == stake
+
+
+def test_row_view_writes_through():
+    """
+    Test: Top-up through the row view (as Staking.stake does).
+
+    Expected: The columns are updated in place.
+    """
+    book = ColumnarStakeBook()
+    book["0x3333"] = Stake(1000, 1715212800, EPOCH_IN_SECONDS * 4, 400)
+    book["0x3333"].lock_amount += 2**70
+    book["0x3333"].reward += 40
+
+    assert book["0x3333"].lock_amount == 1000 + 2**70
+    assert book["0x3333"].reward == 440
+    assert book.total_lock_amount() == 1000 + 2**70
+
+
+def test_pop_reuses_free_row():
+    """
+    Test: Unstake one address and stake another.
+
+    Expected: The freed row is reused, the popped stake is returned as a Stake
+    and full-book totals only include live rows.
+    """
+    book = ColumnarStakeBook()
+    book["0x1111"] = Stake(1000, 1715212800, EPOCH_IN_SECONDS * 4, 400)
+    book["0x2222"] = Stake(500, 1715212800, EPOCH_IN_SECONDS * 2, 100)
+    row = book.row_of("0x1111")
+
+    popped = book.pop("0x1111")
+    book["0x3333"] = Stake(200, 1715817600, EPOCH_IN_SECONDS, 20)
+
+    assert popped == Stake(1000, 1715212800, EPOCH_IN_SECONDS * 4, 400)
+    assert book.row_of("0x3333") == row
+    assert book.capacity == 2
+    assert len(book) == 2
+    assert book.total_lock_amount() == 700
+    assert book.total_reward() == 120
+    assert book.pop("0x1111", None) is None
+
+
+def test_address_index_matches_dict():
+    """
+    Test: Random inserts, overwrites and pops across several index resizes,
+    mirrored on a plain dict, then a pickle round trip.
+
+    Expected: Same membership, stakes and column scans as the dict, and every
+    live address has its own row.
+    """
+    rng = random.Random(11)
+    book, expected = ColumnarStakeBook(), {}
+    for i in range(5000):
+        address = f"0x{rng.randrange(1500):04x}"
+        if rng.random() < 0.3:
+            assert book.pop(address, None) == expected.pop(address, None)
+        else:
+            stake = Stake(i + 1, 1715212800, EPOCH_IN_SECONDS * (1 + i % 4), i / 10)
+            book[address] = expected[address] = stake
+
+    assert len(book) == len(expected)
+    assert sorted(book) == sorted(expected)
+    assert all(book[address] == stake for address, stake in expected.items())
+    assert len({book.row_of(address) for address in expected}) == len(expected)
+    assert book.row_of("0xffff") == -1 and "0xffff" not in book
+    restored = pickle.loads(pickle.dumps(book))
+    assert all(restored[address] == stake for address, stake in expected.items())
+    assert book.scan_totals() == (
+        sum(stake.lock_amount for stake in expected.values()),
+        pytest.approx(sum(stake.reward for stake in expected.values())),
+        len(expected),
+        sum(stake.lock_amount * stake.lock_duration for stake in expected.values()),
+    )
+    assert sorted(book.maturity_entries()) == sorted(
+        (
+            address,
+            stake.start_time + stake.lock_duration,
+            stake.lock_amount + stake.reward,
+        )
+        for address, stake in expected.items()
+    )
+
+
+def test_integer_rewards_stay_exact():
+    """
+    Test: Store integer (wei) rewards above 2**53 and a float reward, add to
+    them through the row views and free one row.
+
+    Expected: Integers come back exact and as int, floats unchanged and as
+    float; the total sums both; a negative integer reward is refused.
+    """
+    book = ColumnarStakeBook()
+    book["0x1111"] = Stake(1000, 1715212800, EPOCH_IN_SECONDS, 2**70 + 1)
+    book["0x2222"] = Stake(1000, 1715212800, EPOCH_IN_SECONDS, 0.1)
+    book["0x3333"] = Stake(1000, 1715212800, EPOCH_IN_SECONDS, 2**53 + 1)
+    book["0x3333"].reward += 2
+
+    assert book["0x1111"].reward == 2**70 + 1
+    assert book["0x3333"].reward == 2**53 + 3
+    assert isinstance(book["0x3333"].reward, int)
+    assert book["0x2222"].reward == 0.1 and book.pop("0x2222").reward == 0.1
+    assert book.total_reward() == float(2**70 + 2**53 + 4)  # a float, as on a dict
+    with pytest.raises(ValueError):
+        book["0x1111"].reward = -1
@@ -0,0 +1,201 @@
+import random
+
+from prototyping.staking import (
+    Staking,
+    BlockTimestamp,
+    EPOCH_IN_SECONDS,
+    MAX_LOCK_AMOUNT,
+    MAX_LOCK_DURATION,
+    STATUS_OK,
+    STATUS_INVALID_AMOUNT,
+    STATUS_AMOUNT_TOO_LARGE,
+    STATUS_DURATION_TOO_SHORT,
+    STATUS_DURATION_TOO_LONG,
+    STATUS_STAKE_NEAR_END,
+    STATUS_NO_STAKE,
+    STATUS_NOT_ENDED,
+    STATUS_EMERGENCY_PAUSE,
+    STATUS_WITHDRAW_CAP,
+)
+
+
+def _scalar_twin(staking):
+    return Staking(
+        utility_token_addr=staking.utility_token_addr,
+        reward_rate_per_epoch=staking.reward_rate_per_epoch,
+        block_timestamp=BlockTimestamp(staking.block_timestamp.timestamp),
+        stakes=type(staking.stakes)(),
+    )
+
+
+def _random_batch(rng, size):
+    addresses = [f"0x{rng.randrange(size // 2):04x}" for _ in range(size)]
+    amount_choices = [0, 1, 1000, MAX_LOCK_AMOUNT, MAX_LOCK_AMOUNT + 1]
+    duration_choices = [
+        0,
+        EPOCH_IN_SECONDS,
+        EPOCH_IN_SECONDS * 5 + 17,
+        MAX_LOCK_DURATION,
+        MAX_LOCK_DURATION + 1,
+    ]
+    lock_amounts = [rng.choice(amount_choices) for _ in range(size)]
+    lock_durations = [rng.choice(duration_choices) for _ in range(size)]
+    return addresses, lock_amounts, lock_durations
+
+
+def test_stake_many_validation(block_timestamp, staking, initial_time):
+    """
+    Test: Batch stake with one invalid parameter per row.
+
+    Expected: Per-row statuses in the same order of checks as stake().
+    """
+    block_timestamp.set_timestamp(initial_time)
+    statuses = staking.stake_many(
+        ["0x1", "0x2", "0x3", "0x4", "0x5"],
+        [0, MAX_LOCK_AMOUNT + 1, 1000, 1000, 1000],
+        [
+            EPOCH_IN_SECONDS,
+            EPOCH_IN_SECONDS,
+            EPOCH_IN_SECONDS - 1,
+            MAX_LOCK_DURATION + 1,
+            EPOCH_IN_SECONDS * 4,
+        ],
+    )
+
+    assert list(statuses) == [
+        STATUS_INVALID_AMOUNT,
+        STATUS_AMOUNT_TOO_LARGE,
+        STATUS_DURATION_TOO_SHORT,
+        STATUS_DURATION_TOO_LONG,
+        STATUS_OK,
+    ]
+    assert list(staking.stakes) == ["0x5"]
+    assert staking.get_stake("0x5").reward == 400
+
+
+def test_stake_many_matches_scalar_path(block_timestamp, staking, initial_time):
+    """
+    Test: Replay the same random batches (new stakes, top-ups, invalid rows,
+    repeated addresses) through stake_many and through stake() in a loop,
+    moving one epoch forward between batches.
+
+    Each epoch also stakes an all-valid batch and unstakes a random sample
+    through unstake_many and through unstake().
+
+    Expected: Identical stakes, stats and liability schedule after every batch.
+    """
+    rng = random.Random(7)
+    scalar = _scalar_twin(staking)
+    for epoch in range(6):
+        block_timestamp.set_timestamp(initial_time + epoch * EPOCH_IN_SECONDS)
+        scalar.block_timestamp.set_timestamp(initial_time + epoch * EPOCH_IN_SECONDS)
+        if epoch == 3:
+            staking.set_reward_rate_per_epoch(1)
+            scalar.set_reward_rate_per_epoch(1)
+        addresses, lock_amounts, lock_durations = _random_batch(rng, 200)
+        valid = [
+            (address, lock_amount, lock_duration)
+            for address, lock_amount, lock_duration in zip(
+                addresses, lock_amounts, lock_durations
+            )
+            if 0 < lock_amount <= MAX_LOCK_AMOUNT
+            and EPOCH_IN_SECONDS <= lock_duration <= MAX_LOCK_DURATION
+        ]
+        withdrawals = rng.sample(sorted(scalar.stakes), len(scalar.stakes) // 2)
+
+        staking.stake_many(addresses, lock_amounts, lock_durations)
+        staking.stake_many(*map(list, zip(*valid)))
+        staking.unstake_many(withdrawals)
+        for row in list(zip(addresses, lock_amounts, lock_durations)) + valid:
+            scalar.stake(*row)
+        for address in withdrawals:
+            scalar.unstake(address)
+
+        assert sorted(staking.stakes) == sorted(scalar.stakes)
+        for address in scalar.stakes:
+            assert staking.get_stake(address) == scalar.get_stake(address)
+        assert staking.stats() == scalar.stats()
+        assert staking.liability_schedule() == scalar.liability_schedule()
+        staking.check_stats()
+
+
+def test_stake_many_top_up_near_end(
+    block_timestamp, staking, initial_time, initial_stake
+):
+    """
+    Test: Batch top-up of a stake in its last epoch.
+
+    Expected: Row rejected, stake unchanged.
+    """
+    staking.stakes["0x3333"] = initial_stake
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 4)
+    statuses = staking.stake_many(["0x3333"], [100], [EPOCH_IN_SECONDS])
+
+    assert list(statuses) == [STATUS_STAKE_NEAR_END]
+    assert staking.get_stake("0x3333").lock_amount == 1000
+
+
+def test_unstake_many(block_timestamp, staking, initial_time):
+    """
+    Test: Batch unstake of matured, unmatured and unknown addresses,
+    then an emergency batch unstake.
+
+    Expected: Matured stakes return lock amount + reward, the rest are
+    reported by status; emergency withdraw returns the lock amount only.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake_many(
+        ["0x1", "0x2", "0x3"],
+        [1000, 1000, 500],
+        [EPOCH_IN_SECONDS * 4, EPOCH_IN_SECONDS * 8, EPOCH_IN_SECONDS * 8],
+    )
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 5)
+    statuses, amounts = staking.unstake_many(["0x1", "0x2", "0x9"])
+
+    assert list(statuses) == [STATUS_OK, STATUS_NOT_ENDED, STATUS_NO_STAKE]
+    assert amounts == [1400, 0, 0]
+
+    staking.set_emergency_pause(True)
+    statuses, amounts = staking.unstake_many(["0x2"])
+    assert list(statuses) == [STATUS_EMERGENCY_PAUSE]
+
+    staking.set_emergency_withdraw(True)
+    statuses, amounts = staking.unstake_many(["0x2", "0x3"])
+    assert list(statuses) == [STATUS_OK, STATUS_OK]
+    assert amounts == [1000, 500]
+    assert len(staking.stakes) == 0
+
+
+def test_per_instance_limits(block_timestamp, initial_time, capsys):
+    """
+    Test: Staking with a lower max lock duration, max lock amount and
+    withdraw multiplier than the module defaults.
+
+    Expected: Scalar and batch paths both apply the instance limits.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    staking = Staking(
+        utility_token_addr="0x1111",
+        reward_rate_per_epoch=10,
+        block_timestamp=block_timestamp,
+        max_lock_duration=EPOCH_IN_SECONDS * 8,
+        max_lock_amount=5000,
+        max_multiplier_to_withdraw=1.2,
+    )
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 9)
+    assert "less than or equal to 8 epochs" in capsys.readouterr().out
+    statuses = staking.stake_many(
+        ["0x1", "0x2", "0x3"],
+        [1000, 5001, 1000],
+        [EPOCH_IN_SECONDS * 9, EPOCH_IN_SECONDS, EPOCH_IN_SECONDS * 4],
+    )
+    assert list(statuses) == [
+        STATUS_DURATION_TOO_LONG,
+        STATUS_AMOUNT_TOO_LARGE,
+        STATUS_OK,
+    ]
+
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 6)
+    statuses, _ = staking.unstake_many(["0x3"])  # 1000 + 400 > 1.2 * 1000
+    assert list(statuses) == [STATUS_WITHDRAW_CAP]
+    assert staking.unstake("0x3") == 0
@@ -0,0 +1,74 @@
+import pytest
+
+from prototyping.staking import EPOCH_IN_SECONDS, StakingStats
+
+
+def test_stats_follow_every_branch(block_timestamp, staking, initial_time):
+    """
+    Test: Running aggregates through new stakes, a top-up, a regular unstake
+    and an emergency unstake.
+
+    Expected: stats() matches the hand-computed values and a full recompute
+    after every step.
+    """
+    staking.debug = True
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake("0x1", 1000, EPOCH_IN_SECONDS * 2)  # reward 200
+    staking.stake("0x2", 3000, EPOCH_IN_SECONDS * 4)  # reward 1200
+    assert staking.stats() == StakingStats(
+        total_locked=4000,
+        total_reward=1400,
+        staker_count=2,
+        average_lock_duration=EPOCH_IN_SECONDS * 3.5,
+    )
+
+    staking.stake("0x2", 1000, EPOCH_IN_SECONDS)  # top-up, reward 400
+    assert staking.stats().total_locked == 5000
+    assert staking.stats().total_reward == 1800
+
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 3)
+    staking.unstake("0x1")
+    assert staking.stats() == StakingStats(
+        total_locked=4000,
+        total_reward=1600,
+        staker_count=1,
+        average_lock_duration=EPOCH_IN_SECONDS * 4,
+    )
+
+    staking.set_emergency_pause(True)
+    staking.set_emergency_withdraw(True)
+    staking.unstake("0x2")
+    assert staking.stats() == StakingStats()
+
+
+def test_stats_with_batch_functions(block_timestamp, staking, initial_time):
+    """
+    Test: Running aggregates through stake_many and unstake_many.
+
+    Expected: The debug consistency check passes.
+    """
+    block_timestamp.set_timestamp(initial_time)
+    addresses = [f"0x{i:x}" for i in range(50)]
+    staking.stake_many(
+        addresses, [1000 + i for i in range(50)], [EPOCH_IN_SECONDS * 2] * 50
+    )
+    staking.stake_many(addresses[::2], [10] * 25, [EPOCH_IN_SECONDS] * 25)
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 3)
+    staking.unstake_many(addresses[::3])
+
+    staking.check_stats()
+    assert staking.stats().staker_count == 33
+
+
+def test_check_stats_detects_untracked_stake(block_timestamp, staking, initial_stake):
+    """
+    Test: Write a stake straight into the book, bypassing stake().
+
+    Expected: The debug check fails until the derived state is rebuilt.
+    """
+    staking.stakes["0x3333"] = initial_stake
+
+    with pytest.raises(AssertionError):
+        staking.check_stats()
+    staking.rebuild_derived_state()
+    assert staking.stats().total_locked == 1000
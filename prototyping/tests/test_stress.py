@@ -0,0 +1,72 @@
+from prototyping import events
+from prototyping.staking import EPOCH_IN_SECONDS, STATUS_NOT_ENDED
+from prototyping.stress import bank_run
+
+
+def _populate(staking, block_timestamp, initial_time, size=100):
+    # 1000 each, half of the stakes end after 2 epochs, the others after 8
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(initial_time)
+    staking.stake_many(
+        [f"0x{i:03x}" for i in range(size)],
+        [1000] * size,
+        [EPOCH_IN_SECONDS * (2 if i % 2 else 8) for i in range(size)],
+    )
+
+
+def test_emergency_bank_run_with_sweep(staking, block_timestamp, initial_time):
+    """
+    Test: Emergency withdrawal of 60% of 100 stakers, 10 per block, the owner
+    calls emergency() 24 seconds (2 blocks) into the run.
+
+    Expected: The first 2 blocks are paid from the locked amounts, the first
+    withdrawal after the sweep is the insolvency point; the parent of the
+    fork is unchanged.
+    """
+    _populate(staking, block_timestamp, initial_time)
+    result = bank_run(
+        staking.fork(),
+        fraction=0.6,
+        emergency=True,
+        exits_per_block=10,
+        sweep_time=24,
+    )
+    assert result.stakers == 100
+    assert result.exits == result.exits_paid == 60
+    assert result.balance_start == 100_000
+    assert result.total_paid == 60_000
+    assert result.balance_end == -40_000
+    assert result.shortfall == 40_000
+    assert result.first_insolvency.exit_index == 20
+    assert result.first_insolvency.time == initial_time + 24
+    assert result.first_insolvency.balance == 0
+    assert result.time_to_drain == 24
+    assert result.liability_end == 40_000
+    balances = [balance for _, balance in result.balance_curve]
+    assert balances[:3] == [90_000, 80_000, -10_000]
+    assert len(staking.stakes) == 100
+    assert staking.emergency_withdraw is False
+
+
+def test_regular_bank_run_reward_reserve(staking, block_timestamp, initial_time):
+    """
+    Test: Everyone tries a regular withdrawal after the short stakes ended,
+    with a reward reserve covering only part of the rewards.
+    Short stake: 1000 + 2 epochs * 10% => 1200
+
+    Expected: Only short stakes are paid, long ones are rejected as not ended;
+    the balance cannot cover what the stakers are owed from the start, but
+    the rewards paid (50 * 200) stay within the reserve, so no insolvency.
+    """
+    _populate(staking, block_timestamp, initial_time)
+    block_timestamp.set_timestamp(initial_time + EPOCH_IN_SECONDS * 4)
+    result = bank_run(staking, reward_reserve=10_000)
+    assert result.exits == 100
+    assert result.exits_paid == 50
+    assert result.rejections == {STATUS_NOT_ENDED: 50}
+    assert result.total_paid == 50 * 1200
+    assert result.balance_end == 110_000 - 60_000
+    assert result.first_insolvency is None
+    assert result.shortfall == 0
+    assert result.time_to_drain == 0
+    assert len(staking.stakes) == 50
@@ -0,0 +1,78 @@
+from prototyping.simulation import StakeEvent, UnstakeEvent
+from prototyping.staking import EPOCH_IN_SECONDS
+from prototyping.sweep import Scenario, Workload, grid, run_sweep, write_csv
+
+INITIAL_TIME = 1714670000
+
+
+def _workload():
+    workload_events = []
+    for user in range(40):
+        time = INITIAL_TIME + user * 3600
+        duration = EPOCH_IN_SECONDS * (1 + user % 12)
+        address = f"0x{user:03x}"
+        workload_events.append(StakeEvent(time, address, 1000 + user, duration))
+        workload_events.append(
+            UnstakeEvent(time + duration + EPOCH_IN_SECONDS + 1, address)
+        )
+    # above MAX_LOCK_AMOUNT and 2**64
+    workload_events.append(StakeEvent(INITIAL_TIME, "0xbig", 2**90, EPOCH_IN_SECONDS))
+    workload_events.sort(key=lambda event: event.time)
+    return Workload.from_events(workload_events)
+
+
+def test_workload_round_trip():
+    """
+    Test: Encode events into workload columns, share them and attach.
+
+    Expected: The attached workload replays the same events, including an
+    amount above 2**64.
+    """
+    workload = _workload()
+    block, layout = workload.share()
+    try:
+        attached = Workload.attach(block, layout)
+        assert list(attached.events()) == list(workload.events())
+        amounts = [
+            event.lock_amount
+            for event in attached.events()
+            if isinstance(event, StakeEvent)
+        ]
+        assert max(amounts) == 2**90
+        del attached
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_sweep_in_pool_matches_in_process(tmp_path):
+    """
+    Test: Sweep reward rate x max lock duration over a process pool and
+    in-process.
+
+    Expected: Same table in scenario order; shorter max lock durations and
+    the default max lock amount reject stakes; higher rates pay more.
+    """
+    workload = _workload()
+    scenarios = grid(
+        reward_rate_per_epoch=[2, 10],
+        max_lock_duration=[EPOCH_IN_SECONDS * 6, EPOCH_IN_SECONDS * 52],
+    )
+    rows = run_sweep(workload, scenarios, processes=2)
+    assert rows == run_sweep(workload, scenarios, processes=1)
+
+    assert [
+        Scenario(row["reward_rate_per_epoch"], row["max_lock_duration"])
+        for row in rows
+    ] == scenarios
+    short, full = rows[0], rows[1]
+    assert short["rejected_duration_too_long"] == 18
+    assert full["rejected_duration_too_long"] == 0
+    assert full["rejected_amount_too_large"] == 1
+    assert full["stakes_applied"] == 40
+    assert rows[3]["total_payout"] > full["total_payout"]
+    assert full["liability_peak"] > 0
+
+    path = tmp_path / "sweep.csv"
+    write_csv(rows, path)
+    assert len(path.read_text().splitlines()) == 5
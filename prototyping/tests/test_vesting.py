@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+from prototyping import events
+from prototyping.staking import DAY_IN_SECONDS
+from prototyping.vesting import TokenVesting, VestingSchedules
+
+START = 1715212800
+MONTH = 30 * DAY_IN_SECONDS
+
+
+def _vesting(block_timestamp, **kwargs):
+    params = dict(
+        token_addr="0x1111",
+        beneficiary="0x2222",
+        start=START,
+        period_duration=MONTH,
+        total_amount=1000,
+        total_periods=3,
+        block_timestamp=block_timestamp,
+        event_sink=events.RingBufferSink(),
+    )
+    params.update(kwargs)
+    return TokenVesting(**params)
+
+
+def test_vesting_contract(block_timestamp):
+    """
+    Test: Query and release a 1000 token, 3 period vesting before the start,
+    inside the periods and after the end.
+
+    Expected: Steps of 1000 * p // 3, releases pay the difference once,
+    time_until_next_release is 0 whenever nothing is releasable; invalid
+    deployments raise ValueError.
+    """
+    vesting = _vesting(block_timestamp)
+    block_timestamp.set_timestamp(START - 1)
+    assert (vesting.vested_amount(), vesting.time_until_next_release()) == (0, 0)
+    assert vesting.release() == 0
+    assert vesting.event_sink.count(events.NoTokensToRelease) == 1
+
+    block_timestamp.set_timestamp(START + MONTH + 10)
+    assert vesting.vested_amount() == 333
+    assert vesting.time_until_next_release() == MONTH - 10
+    assert vesting.release() == 333
+    assert vesting.time_until_next_release() == 0
+    block_timestamp.set_timestamp(START + 2 * MONTH)
+    assert vesting.releasable_amount() == 333
+    block_timestamp.set_timestamp(START + 10 * MONTH)
+    assert vesting.release() == 667
+    assert vesting.released == 1000
+    assert vesting.event_sink.count(events.TokensReleased) == 2
+
+    for invalid in [
+        {"token_addr": "0x0"},
+        {"beneficiary": None},
+        {"total_amount": 0},
+        {"total_periods": 0},
+        {"period_duration": 0},
+    ]:
+        with pytest.raises(ValueError):
+            _vesting(block_timestamp, **invalid)
+
+
+def test_schedules_match_contracts(block_timestamp):
+    """
+    Test: Evaluate 300 random contracts in a few cohorts at many timestamps,
+    through VestingSchedules and through every contract.
+
+    Expected: Same vested and releasable amounts per contract; the unlock
+    curve is their sum and the unlock steps add up to the total amount.
+    """
+    rng = random.Random(1)
+    contracts = [
+        _vesting(
+            block_timestamp,
+            beneficiary=f"0x{i + 1:x}",
+            start=START + rng.choice([0, MONTH]),
+            period_duration=rng.choice([MONTH, 7 * DAY_IN_SECONDS]),
+            total_amount=rng.randrange(1, 10**24),
+            total_periods=rng.choice([1, 7, 24]),
+        )
+        for i in range(300)
+    ]
+    block_timestamp.set_timestamp(START + 5 * MONTH)
+    for contract in contracts[::3]:
+        contract.release()
+    schedules = VestingSchedules.from_contracts(contracts)
+    times = [START - 1] + list(range(START, START + 26 * MONTH, 5 * DAY_IN_SECONDS))
+
+    vested = schedules.vested_at(times)
+    releasable = schedules.releasable_at(times)
+    for t, vested_row, releasable_row in zip(times[::9], vested[::9], releasable[::9]):
+        block_timestamp.set_timestamp(t)
+        assert vested_row == [contract.vested_amount() for contract in contracts]
+        assert releasable_row == [
+            contract.releasable_amount() for contract in contracts
+        ]
+    assert schedules.unlock_curve(times) == [sum(row) for row in vested]
+
+    steps = schedules.unlock_steps()
+    total = sum(contract.total_amount for contract in contracts)
+    assert sum(amount for _, amount in steps) == total
+    assert [t for t, _ in steps] == sorted(t for t, _ in steps)
+    assert schedules.unlock_curve([steps[-1][0]]) == [total]
+
+    before = schedules.unlock_curve([START + MONTH])[0]
+    schedules.add("0x9999", START, MONTH, 10, 1)  # steps are rebuilt
+    assert schedules.unlock_curve([START + MONTH]) == [before + 10]
+    with pytest.raises(ValueError):
+        schedules.add("0x0", START, MONTH, 10, 1)
@@ -0,0 +1,127 @@
+import pytest
+
+import prototyping.governance as governance_module
+from prototyping import events
+from prototyping.balances import StakingBalanceProvider
+from prototyping.governance import GovernanceRewarding
+from prototyping.simulation import (
+    EmergencyEvent,
+    GovernanceClaimEvent,
+    GovernanceRewardEvent,
+    RewardRateChangeEvent,
+    Simulation,
+    StakeEvent,
+    TopUpEvent,
+    UnstakeEvent,
+)
+from prototyping.staking import EPOCH_IN_SECONDS
+from prototyping.workload import (
+    WorkloadConfig,
+    generate_events,
+    read_chunks,
+    read_trace,
+    write_trace,
+)
+
+CONFIG = WorkloadConfig(
+    seed=7,
+    epochs=12,
+    stakes_per_epoch=50,
+    max_lock_epochs=8,
+    rate_change_probability=0.5,
+    emergency_probability=0.3,
+    emergency_withdraw_probability=1.0,
+)
+
+
+def test_generated_events_are_seeded_and_ordered():
+    """
+    Test: Generate the same workload twice, with another seed and capped.
+
+    Expected: Same seed => same events, in time order inside the window,
+    every event kind shows up; another seed differs; max_events caps it.
+    """
+    generated = list(generate_events(CONFIG))
+    assert generated == list(generate_events(CONFIG))
+    assert generated != list(generate_events(WorkloadConfig(seed=8, epochs=12)))
+    assert list(generate_events(CONFIG, max_events=10)) == generated[:10]
+
+    times = [event.time for event in generated]
+    assert times == sorted(times)
+    assert CONFIG.start_time <= times[0]
+    assert times[-1] < CONFIG.start_time + CONFIG.epochs * EPOCH_IN_SECONDS
+    assert {type(event) for event in generated} == {
+        StakeEvent,
+        TopUpEvent,
+        UnstakeEvent,
+        RewardRateChangeEvent,
+        EmergencyEvent,
+        GovernanceRewardEvent,
+        GovernanceClaimEvent,
+    }
+
+
+def test_trace_round_trip_in_chunks(tmp_path):
+    """
+    Test: Write a generated workload with a small chunk size and read it back.
+
+    Expected: Fixed-size chunks (last one shorter), the events are identical
+    and the file is much smaller than the events' text form.
+    """
+    path = tmp_path / "workload.trace"
+    generated = list(generate_events(CONFIG))
+    assert write_trace(iter(generated), path, chunk_size=100) == len(generated)
+
+    sizes = [len(chunk) for chunk in read_chunks(path)]
+    assert sizes[:-1] == [100] * (len(sizes) - 1)
+    assert 0 < sizes[-1] <= 100
+    assert list(read_trace(path)) == generated
+    assert path.stat().st_size * 5 < len("".join(map(repr, generated)))
+
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(ValueError):
+        list(read_trace(path))
+    path.write_bytes(b"not a trace")
+    with pytest.raises(ValueError):
+        list(read_chunks(path))
+
+
+def test_replay_trace_with_governance(monkeypatch, staking, block_timestamp, tmp_path):
+    """
+    Test: Replay a trace through a Simulation with a GovernanceRewarding
+    that reads balances from the Staking instance.
+
+    Expected: Same result as replaying the generator directly; governance
+    rewards are given and claimed. Without governance the replay fails.
+    """
+    monkeypatch.setattr(
+        governance_module, "BLOCK_TIMESTAMP", governance_module.BLOCK_TIMESTAMP
+    )
+    config = WorkloadConfig(seed=3, epochs=10, stakes_per_epoch=30)
+    path = tmp_path / "workload.trace"
+    write_trace(generate_events(config), path, chunk_size=64)
+    staking.event_sink = events.NullSink()
+    block_timestamp.set_timestamp(config.start_time)
+    fresh = staking.fork()  # forked before any stake, replayed first
+
+    results = []
+    for replayed, trace_events in [
+        (fresh, read_trace(path)),
+        (staking, generate_events(config)),
+    ]:
+        governance = GovernanceRewarding(
+            governance_token_addr="0x000",
+            staking_addr="0x222",
+            reputation_addr="0x333",
+            event_sink=events.NullSink(),
+            staking_balances=StakingBalanceProvider(replayed),
+        )
+        results.append(Simulation(replayed, trace_events, governance).run())
+    assert results[0] == results[1]
+    assert results[0].governance_applied > 0
+    assert results[0].total_claimed > 0
+    assert results[0].rejections
+
+    with pytest.raises(ValueError):
+        claim = GovernanceClaimEvent(config.start_time, "0x1")
+        Simulation(staking.fork(), [claim]).run()
@@ -0,0 +1,255 @@
+"""
+Token vesting (contracts/vesting.sol) and unlock forecasts over many vesting
+contracts.
+
+TokenVesting mirrors one deployed contract: `total_amount` unlocks in
+`total_periods` equal steps, one at the end of every `period_duration`
+seconds after `start`, rounded down like the solidity integer division.
+
+VestingSchedules keeps the parameters of many contracts in columns and
+evaluates them at many timestamps without calling release(). Contracts with
+the same (start, period_duration, total_periods) form a cohort whose vested
+total only changes at its release times, so the unlock curve of the whole
+population is a step function with one step per cohort and release time:
+
+    schedules = VestingSchedules.from_contracts(contracts)
+    supply = schedules.unlock_curve(range(t0, t1, DAY_IN_SECONDS))
+"""
+
+import time
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+
+from prototyping import events
+from prototyping.staking import BlockTimestamp
+
+
+def _is_zero_address(address):
+    return not address or int(address, 16) == 0
+
+
+def _validate(token_addr, beneficiary, period_duration, total_amount, total_periods):
+    # the constructor's require()s, a failing deployment raises ValueError
+    if _is_zero_address(token_addr):
+        raise ValueError("Invalid token address")
+    if _is_zero_address(beneficiary):
+        raise ValueError("Invalid beneficiary address")
+    if total_amount <= 0:
+        raise ValueError("Total amount must be > 0")
+    if total_periods <= 0:
+        raise ValueError("Total periods must be > 0")
+    if period_duration <= 0:
+        raise ValueError("Period duration must be > 0")
+
+
+def _periods_passed(current_time, start, period_duration, total_periods):
+    if current_time < start:
+        return 0
+    return min((current_time - start) // period_duration, total_periods)
+
+
+class TokenVesting:
+
+    # deployer functions
+    def __init__(
+        self,
+        token_addr,
+        beneficiary,
+        start,
+        period_duration,  # seconds, e.g. 30 days
+        total_amount,
+        total_periods,
+        released=0,  # e.g. when loaded from a deployed contract
+        block_timestamp=None,  # for testing purposes only
+        event_sink=None,  # see prototyping.events (defaults to printing to stdout)
+    ):
+        _validate(token_addr, beneficiary, period_duration, total_amount, total_periods)
+        self.token_addr = token_addr
+        self.beneficiary = beneficiary
+        self.start = start
+        self.period_duration = period_duration
+        self.total_amount = total_amount
+        self.total_periods = total_periods
+        self.released = released
+        self.event_sink = event_sink if event_sink is not None else events.PrintSink()
+        self.block_timestamp = block_timestamp or BlockTimestamp(
+            int(time.time())
+        )  # for testing purposes only (not needed in actual implementation)
+
+    # getter functions (view functions in solidity)
+    def time_until_next_release(self):
+        # 0 while nothing is releasable, also before the start (as on chain)
+        if self.releasable_amount() == 0:
+            return 0
+        current_time = self.block_timestamp.timestamp  # solidity: block.timestamp
+        if current_time < self.start:
+            return self.start - current_time
+        current_period = (current_time - self.start) // self.period_duration
+        if current_period >= self.total_periods:
+            return 0
+        next_release_time = self.start + (current_period + 1) * self.period_duration
+        return next_release_time - current_time
+
+    def releasable_amount(self):
+        return self.vested_amount() - self.released
+
+    def vested_amount(self):
+        periods_passed = _periods_passed(
+            self.block_timestamp.timestamp,  # solidity: block.timestamp
+            self.start,
+            self.period_duration,
+            self.total_periods,
+        )
+        return self.total_amount * periods_passed // self.total_periods
+
+    # main functions (public functions in solidity)
+    def release(self):
+        # returns the released amount. Token balances are not modelled (as in
+        # Staking), so the solidity token.transfer(beneficiary, amount) has no
+        # counterpart here: the TokensReleased event and the return value carry
+        # the amount that would be sent.
+        amount = self.releasable_amount()
+        if amount <= 0:
+            self.event_sink.emit(events.NoTokensToRelease, self.beneficiary)
+            return 0
+        self.released += amount
+        self.event_sink.emit(events.TokensReleased, self.beneficiary, amount)
+        return amount
+
+
+class VestingSchedules:
+    """
+    Parameters of many vesting contracts in columns, one row per contract.
+    Amounts are uint256 in solidity and kept in plain lists; times, durations
+    and period counts are 64-bit array columns. The unlock steps are built on
+    the first forecast and rebuilt after rows are added.
+    """
+
+    def __init__(self):
+        self.beneficiaries = []
+        self.starts = array("q")
+        self.period_durations = array("q")
+        self.total_periods = array("q")
+        self.total_amounts = []
+        self.released = []
+        self._steps = None  # (sorted release times, vested total after each)
+
+    def __len__(self):
+        return len(self.beneficiaries)
+
+    def add(
+        self,
+        beneficiary,
+        start,
+        period_duration,
+        total_amount,
+        total_periods,
+        released=0,
+        token_addr="0x1",  # checked like the constructor, not stored
+    ):  # returns the row
+        _validate(token_addr, beneficiary, period_duration, total_amount, total_periods)
+        self.beneficiaries.append(beneficiary)
+        self.starts.append(start)
+        self.period_durations.append(period_duration)
+        self.total_periods.append(total_periods)
+        self.total_amounts.append(total_amount)
+        self.released.append(released)
+        self._steps = None
+        return len(self.beneficiaries) - 1
+
+    @classmethod
+    def from_contracts(cls, contracts):  # TokenVesting instances
+        schedules = cls()
+        for contract in contracts:
+            schedules.add(
+                contract.beneficiary,
+                contract.start,
+                contract.period_duration,
+                contract.total_amount,
+                contract.total_periods,
+                contract.released,
+                contract.token_addr,
+            )
+        return schedules
+
+    # per-contract schedules: one list of rows per timestamp
+    def vested_at(self, times):
+        rows = list(
+            zip(
+                self.starts,
+                self.period_durations,
+                self.total_periods,
+                self.total_amounts,
+            )
+        )
+        return [
+            [
+                total_amount * _periods_passed(t, start, duration, periods) // periods
+                for start, duration, periods, total_amount in rows
+            ]
+            for t in times
+        ]
+
+    def releasable_at(self, times):  # before any further release() call
+        released = self.released
+        return [
+            [vested - done for vested, done in zip(row, released)]
+            for row in self.vested_at(times)
+        ]
+
+    # population forecasts
+    def unlock_steps(self):
+        # [(release time, amount unlocked at that time)] in time order
+        times, vested = self._unlock_steps()
+        previous = [0] + vested[:-1]
+        return [(t, v - p) for t, v, p in zip(times, vested, previous)]
+
+    def unlock_curve(self, times):
+        # vested total of all contracts at each timestamp (circulating supply
+        # from vesting); subtract sum(self.released) for what is releasable
+        step_times, vested = self._unlock_steps()
+        curve = []
+        for t in times:
+            i = bisect_right(step_times, t)
+            curve.append(vested[i - 1] if i else 0)
+        return curve
+
+    def _unlock_steps(self):
+        if self._steps is None:
+            self._steps = self._build_steps()
+        return self._steps
+
+    def _build_steps(self):
+        # cohort (start, period_duration, total_periods) -> Counter of amounts
+        cohorts = defaultdict(Counter)
+        for start, duration, periods, total_amount in zip(
+            self.starts, self.period_durations, self.total_periods, self.total_amounts
+        ):
+            cohorts[start, duration, periods][total_amount] += 1
+
+        unlocked = Counter()  # release time -> amount unlocked
+        for (start, duration, periods), amounts in cohorts.items():
+            # sum(a * p // n) = (A * p - sum((a % n) * p % n)) // n, so only
+            # the distinct residues a % n are visited for every period p
+            cohort_total = sum(amount * count for amount, count in amounts.items())
+            residues = Counter()
+            for amount, count in amounts.items():
+                residues[amount % periods] += count
+            previous = 0
+            for p in range(1, periods + 1):
+                remainder = sum(
+                    count * (residue * p % periods)
+                    for residue, count in residues.items()
+                )
+                vested = (cohort_total * p - remainder) // periods
+                unlocked[start + p * duration] += vested - previous
+                previous = vested
+
+        times = sorted(unlocked)
+        vested = []
+        running = 0
+        for t in times:
+            running += unlocked[t]
+            vested.append(running)
+        return times, vested
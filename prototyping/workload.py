@@ -0,0 +1,324 @@
+"""
+Seeded synthetic activity for Staking / GovernanceRewarding and a compact
+binary trace format to store it.
+
+generate_events() yields simulation events lazily and in time order: new
+stakes (Poisson arrivals), top-ups late in the lock window, early unstake
+attempts, unstakes after the lock end, governance reward / claim cadence,
+reward rate changes and emergency episodes. Only the follow-up events of
+stakes that are still active are kept in memory, never the trace itself.
+
+A trace file is a header followed by chunks of up to `chunk_size` events;
+each chunk stores its events as flat columns (kind, time delta, amount split
+into two uint64 halves, an int64 argument, addresses) and is zlib compressed.
+Readers decode one chunk at a time, so traces of any length replay with flat
+memory:
+
+    write_trace(generate_events(WorkloadConfig(seed=1)), "week.trace")
+    Simulation(staking, read_trace("week.trace"), governance=governance).run()
+"""
+
+import heapq
+import itertools
+import random
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from math import log
+
+from prototyping.simulation import (
+    EmergencyEvent,
+    GovernanceClaimEvent,
+    GovernanceRewardEvent,
+    RewardRateChangeEvent,
+    StakeEvent,
+    TopUpEvent,
+    UnstakeEvent,
+)
+from prototyping.staking import (
+    DAY_IN_SECONDS,
+    EPOCH_IN_SECONDS,
+    MAX_LOCK_AMOUNT,
+    MAX_REWARD_RATE,
+)
+
+HOUR_IN_SECONDS = 60 * 60
+
+
+@dataclass
+class WorkloadConfig:
+    seed: int = field(default=0)
+    start_time: int = field(default=1714670000)
+    epochs: int = field(default=52)  # length of the trace
+    stakes_per_epoch: float = field(default=1000.0)  # mean new stakes
+    mean_lock_tokens: float = field(default=1000.0)  # log-normal, in whole tokens
+    lock_tokens_sigma: float = field(default=1.5)
+    max_lock_epochs: int = field(default=52)
+    top_up_probability: float = field(default=0.2)  # per stake
+    top_up_window: float = field(default=0.3)  # last fraction of the lock
+    early_unstake_probability: float = field(default=0.1)  # per stake
+    governer_probability: float = field(default=0.3)  # per stake
+    claim_every_epochs: int = field(default=4)
+    rate_change_probability: float = field(default=0.05)  # per epoch
+    emergency_probability: float = field(default=0.02)  # per epoch
+    emergency_withdraw_probability: float = field(default=0.5)  # per episode
+    emergency_hours: int = field(default=48)
+
+
+# event generation
+_TICK = object()  # epoch boundary, not emitted
+
+
+def generate_events(config=None, max_events=None):
+    # time-ordered events in [start_time, start_time + epochs * EPOCH_IN_SECONDS)
+    config = config or WorkloadConfig()
+    rng = random.Random(config.seed)
+    end_time = config.start_time + config.epochs * EPOCH_IN_SECONDS
+    arrival_rate = config.stakes_per_epoch / EPOCH_IN_SECONDS
+    lock_mu = _log_normal_mu(config.mean_lock_tokens, config.lock_tokens_sigma)
+    pending = []  # (time, seq, event)
+    seq = itertools.count()
+    users = itertools.count()
+    governer_ends = {}  # address -> lock end, while it gets governance rewards
+
+    def push(time, event):
+        if time < end_time:
+            heapq.heappush(pending, (time, next(seq), event))
+
+    def new_stake(time):
+        address = f"0x{next(users):040x}"
+        tokens = rng.lognormvariate(lock_mu, config.lock_tokens_sigma)
+        lock_amount = min(max(int(tokens * 10**18), 1), MAX_LOCK_AMOUNT)
+        epochs = rng.randint(1, config.max_lock_epochs)
+        start = (time // EPOCH_IN_SECONDS + 1) * EPOCH_IN_SECONDS
+        end = start + epochs * EPOCH_IN_SECONDS
+        push(time, StakeEvent(time, address, lock_amount, epochs * EPOCH_IN_SECONDS))
+        if rng.random() < config.top_up_probability:
+            # late in the lock window, the last epoch gets rejected as near end
+            window = max(int((end - start) * config.top_up_window), 1)
+            top_up_time = end - rng.randrange(window)
+            top_up_amount = max(lock_amount // rng.randint(2, 10), 1)
+            push(
+                top_up_time,
+                TopUpEvent(top_up_time, address, top_up_amount, EPOCH_IN_SECONDS),
+            )
+        if rng.random() < config.early_unstake_probability:
+            early_time = rng.randrange(time, end)
+            push(early_time, UnstakeEvent(early_time, address))
+        unstake_time = end + 1 + int(rng.expovariate(1 / DAY_IN_SECONDS))
+        push(unstake_time, UnstakeEvent(unstake_time, address))
+        if rng.random() < config.governer_probability:
+            # the operator rewards every epoch while the stake is locked
+            reward_time = start + rng.randrange(HOUR_IN_SECONDS)
+            push(reward_time, GovernanceRewardEvent(reward_time, address))
+            claim_time = start + config.claim_every_epochs * EPOCH_IN_SECONDS
+            claim_time += rng.randrange(DAY_IN_SECONDS)
+            if claim_time < end:
+                push(claim_time, GovernanceClaimEvent(claim_time, address))
+            governer_ends[address] = end
+
+    def epoch_tick(time):
+        push(time + EPOCH_IN_SECONDS, _TICK)
+        if rng.random() < config.rate_change_probability:
+            rate_time = time + rng.randrange(EPOCH_IN_SECONDS)
+            rate = rng.randint(1, MAX_REWARD_RATE)
+            push(rate_time, RewardRateChangeEvent(rate_time, rate))
+        if rng.random() < config.emergency_probability:
+            pause_time = time + rng.randrange(EPOCH_IN_SECONDS)
+            push(pause_time, EmergencyEvent(pause_time, emergency_pause=True))
+            resume_time = pause_time + config.emergency_hours * HOUR_IN_SECONDS
+            if rng.random() < config.emergency_withdraw_probability:
+                withdraw_time = pause_time + HOUR_IN_SECONDS
+                push(
+                    withdraw_time,
+                    EmergencyEvent(withdraw_time, emergency_withdraw=True),
+                )
+            resume = EmergencyEvent(
+                resume_time, emergency_pause=False, emergency_withdraw=False
+            )
+            push(resume_time, resume)
+
+    next_arrival = config.start_time + rng.expovariate(arrival_rate)
+    push((config.start_time // EPOCH_IN_SECONDS + 1) * EPOCH_IN_SECONDS, _TICK)
+    emitted = 0
+    while max_events is None or emitted < max_events:
+        if pending and pending[0][0] <= next_arrival:
+            time, _, event = heapq.heappop(pending)
+        elif next_arrival < end_time:
+            time = int(next_arrival)
+            next_arrival += rng.expovariate(arrival_rate)
+            new_stake(time)
+            continue
+        else:
+            break
+        if event is _TICK:
+            epoch_tick(time)
+            continue
+        if isinstance(event, GovernanceRewardEvent):
+            end = governer_ends[event.address]
+            next_time = time + EPOCH_IN_SECONDS
+            if next_time < end:
+                push(next_time, GovernanceRewardEvent(next_time, event.address))
+            else:
+                del governer_ends[event.address]
+        elif isinstance(event, GovernanceClaimEvent):
+            next_time = time + config.claim_every_epochs * EPOCH_IN_SECONDS
+            if next_time < governer_ends.get(event.address, 0):
+                push(next_time, GovernanceClaimEvent(next_time, event.address))
+        yield event
+        emitted += 1
+
+
+def _log_normal_mu(mean, sigma):
+    # mu of the underlying normal for a log-normal with the given mean
+    return log(mean) - sigma * sigma / 2
+
+
+# trace files
+TRACE_MAGIC = b"MMBFPTR1"
+DEFAULT_CHUNK_SIZE = 1 << 16
+_CHUNK_HEADER = struct.Struct("<II")  # event count, compressed size
+_WORD_MASK = (1 << 64) - 1
+
+# event kinds by their code in the trace (append only)
+_EVENT_KINDS = [
+    StakeEvent,  # amount = lock_amount, argument = lock_duration
+    TopUpEvent,  # same as StakeEvent
+    UnstakeEvent,
+    RewardRateChangeEvent,  # argument = reward_rate_per_epoch
+    EmergencyEvent,  # argument = pause + 3 * withdraw, see _FLAG_CODES
+    GovernanceRewardEvent,
+    GovernanceClaimEvent,
+]
+_KIND_CODES = {kind: code for code, kind in enumerate(_EVENT_KINDS)}
+_FLAG_CODES = {None: 0, False: 1, True: 2}  # emergency flag, None keeps it
+_FLAGS = [None, False, True]
+_COLUMNS = [
+    ("kinds", "B"),
+    ("time_deltas", "q"),  # from the previous event, the first one from 0
+    ("amounts_hi", "Q"),
+    ("amounts_lo", "Q"),
+    ("arguments", "q"),
+    ("address_ends", "I"),  # end offsets into the address blob
+]
+
+
+def write_trace(trace_events, path, chunk_size=DEFAULT_CHUNK_SIZE, level=6):
+    # consumes the events lazily, returns the number of events written
+    count = 0
+    with open(path, "wb") as file:
+        file.write(TRACE_MAGIC)
+        chunk = []
+        for event in trace_events:
+            chunk.append(event)
+            if len(chunk) == chunk_size:
+                _write_chunk(file, chunk, level)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            _write_chunk(file, chunk, level)
+            count += len(chunk)
+    return count
+
+
+def read_chunks(path):
+    # one list of at most chunk_size events per chunk, decoded on demand
+    with open(path, "rb") as file:
+        if file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"Not a trace file: {path}")
+        while True:
+            header = file.read(_CHUNK_HEADER.size)
+            if not header:
+                return
+            if len(header) != _CHUNK_HEADER.size:
+                raise ValueError(f"Truncated trace file: {path}")
+            count, size = _CHUNK_HEADER.unpack(header)
+            payload = file.read(size)
+            if len(payload) != size:
+                raise ValueError(f"Truncated trace file: {path}")
+            yield _decode_chunk(zlib.decompress(payload), count)
+
+
+def read_trace(path):
+    for chunk in read_chunks(path):
+        yield from chunk
+
+
+def _write_chunk(file, chunk, level):
+    columns = {name: array(typecode) for name, typecode in _COLUMNS}
+    addresses = bytearray()
+    previous_time = 0
+    for event in chunk:
+        kind = _KIND_CODES.get(type(event))
+        if kind is None:
+            raise TypeError(f"Unsupported trace event: {event!r}")
+        amount = 0
+        argument = 0
+        if isinstance(event, StakeEvent):
+            amount = event.lock_amount
+            argument = event.lock_duration
+        elif isinstance(event, RewardRateChangeEvent):
+            argument = event.reward_rate_per_epoch
+        elif isinstance(event, EmergencyEvent):
+            argument = _FLAG_CODES[event.emergency_pause]
+            argument += 3 * _FLAG_CODES[event.emergency_withdraw]
+        address = getattr(event, "address", None)
+        if address is not None:
+            addresses += address.encode()
+        columns["kinds"].append(kind)
+        columns["time_deltas"].append(event.time - previous_time)
+        columns["amounts_hi"].append(amount >> 64)
+        columns["amounts_lo"].append(amount & _WORD_MASK)
+        columns["arguments"].append(argument)
+        columns["address_ends"].append(len(addresses))
+        previous_time = event.time
+
+    payload = bytearray()
+    for name, _ in _COLUMNS:
+        column = columns[name]
+        if sys.byteorder != "little":
+            column.byteswap()
+        payload += column.tobytes()
+    payload += addresses
+    compressed = zlib.compress(payload, level)
+    file.write(_CHUNK_HEADER.pack(len(chunk), len(compressed)))
+    file.write(compressed)
+
+
+def _decode_chunk(payload, count):
+    columns = {}
+    offset = 0
+    for name, typecode in _COLUMNS:
+        column = array(typecode)
+        end = offset + count * column.itemsize
+        column.frombytes(payload[offset:end])
+        if sys.byteorder != "little":
+            column.byteswap()
+        columns[name] = column
+        offset = end
+    addresses = payload[offset:]
+
+    chunk = []
+    time = 0
+    address_start = 0
+    kinds, arguments = columns["kinds"], columns["arguments"]
+    time_deltas, address_ends = columns["time_deltas"], columns["address_ends"]
+    amounts_hi, amounts_lo = columns["amounts_hi"], columns["amounts_lo"]
+    for i in range(count):
+        time += time_deltas[i]
+        kind = _EVENT_KINDS[kinds[i]]
+        address = addresses[address_start : address_ends[i]].decode()
+        address_start = address_ends[i]
+        if kind is StakeEvent or kind is TopUpEvent:
+            amount = (amounts_hi[i] << 64) | amounts_lo[i]
+            chunk.append(kind(time, address, amount, arguments[i]))
+        elif kind is RewardRateChangeEvent:
+            chunk.append(kind(time, arguments[i]))
+        elif kind is EmergencyEvent:
+            pause, withdraw = divmod(arguments[i], 3)[::-1]
+            chunk.append(kind(time, _FLAGS[pause], _FLAGS[withdraw]))
+        else:
+            chunk.append(kind(time, address))
+    return chunk